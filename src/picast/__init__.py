@@ -0,0 +1,69 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+    Copyright (C) 2018 Hsun-Wei Cho
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+The package is split so that the control plane can be used without the
+GUI and media stack:
+
+    rtsp        RTSP message codec
+    video       WFD capability tables
+    wpactrl     wpa_supplicant control socket client and event monitor
+    wpacli      wpa_cli style commands on top of wpactrl
+    wifip2p     P2P group, DHCP and WPS bring-up
+    p2pstate    persistent P2P group and known sources
+    dhcpd       DHCP server for the P2P group
+    rtspserver  RTSP sessions and session manager
+    metrics     Prometheus text rendering and HTTP endpoint
+    decoder     decoder probing and ranking, needs gi
+    player      GStreamer pipeline, needs gi
+    startup     startup orchestrator
+    bench       headless benchmark with a fake source, python3 -m picast.bench
+    capture     session capture files and replay, python3 -m picast.capture
+    __main__    the Gtk application
+
+Names below are resolved on first access, so `import picast` loads nothing.
+"""
+
+_exports = {
+    'Settings': 'settings',
+    'PiCastException': 'exceptions',
+    'Dhcpd': 'dhcpd',
+    'DhcpServer': 'dhcpd',
+    'Res': 'video',
+    'ResolutionCatalog': 'video',
+    'WfdVideoParameters': 'video',
+    'WpaCli': 'wpacli',
+    'WifiP2PServer': 'wifip2p',
+    'PiCast': 'rtspserver',
+    'RtspSession': 'rtspserver',
+    'GstPlayer': 'player',
+    'Startup': 'startup',
+    'MetricsServer': 'metrics',
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    from importlib import import_module
+    value = getattr(import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+    Copyright (C) 2018 Hsun-Wei Cho
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Übersicht
+PiCast ist eine Software, die einen Raspberry Pi in einen Miracast-kompatiblen drahtlosen Display-Empfänger verwandelt. Dies ermöglicht es, Bildschirminhalte von unterstützten 
+Geräten (wie Smartphones, Tablets oder Laptops) drahtlos auf einen mit dem Raspberry Pi verbundenen Monitor zu übertragen.
+Funktionsprinzip
+PiCast nutzt den WiFi Direct (P2P) Standard, um eine direkte Verbindung zwischen dem sendenden Gerät und dem Raspberry Pi herzustellen, ohne dass ein Router oder Access Point 
+benötigt wird. Für die Übertragung des Bildschirminhalts wird das Miracast-Protokoll verwendet, das auf RTSP (Real-Time Streaming Protocol) für die Aushandlung 
+und RTP (Real-time Transport Protocol) für die eigentliche Übertragung des Videoinhalts basiert.
+"""
+
+"""
+Systemanforderungen
+
+Raspberry Pi (getestet auf Raspberry Pi 3B+ und neueren Modellen)
+Kompatible WLAN-Karte mit WiFi Direct Unterstützung
+Betriebssystem: Raspberry Pi OS (ehemals Raspbian)
+Python 3
+Abhängigkeiten: GStreamer, GTK, verschiedene Python-Bibliotheken
+
+# Benötigte Pakete installieren
+sudo apt-get update
+sudo apt-get install -y python3-gi gstreamer1.0-plugins-base gstreamer1.0-plugins-good \
+  gstreamer1.0-plugins-bad gstreamer1.0-plugins-ugly gstreamer1.0-omx gstreamer1.0-tools \
+  wpasupplicant
+
+# PiCast herunterladen und installieren
+git clone https://github.com/username/picast.git
+cd picast
+
+Verwendung
+# PiCast starten
+cd src
+sudo python3 -m picast
+"""
+
+import os # operating system dependent functionality
+import subprocess # spawn new processes, connect to their input/output/error pipes
+import threading # Thread-based parallelism
+from logging import DEBUG, StreamHandler, getLogger
+
+import gi # GObject Introspection
+
+os.putenv('DISPLAY', ':0')  # noqa: E402 # isort:skip
+gi.require_version('Gtk', '3.0')  # noqa: E402 # isort:skip
+gi.require_version('GstVideo', '1.0')  # noqa: E402 # isort:skip
+gi.require_version('GdkX11', '3.0')  # noqa: E402 # isort:skip
+from gi.repository import GLib, Gtk  # noqa: E402 # isort:skip
+
+from .player import GstPlayer  # noqa: E402
+from .rtspserver import PiCast  # noqa: E402
+from .settings import Settings  # noqa: E402
+from .startup import Startup  # noqa: E402
+from .wifip2p import WifiP2PServer  # noqa: E402
+
+
+def get_display_resolutions():
+    """Modes of the connected display as (width, height, refresh), the preferred one first."""
+    try:
+        output = subprocess.Popen(['xrandr'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).communicate()[0]
+    except OSError:
+        return []
+    modes = []
+    preferred = None
+    for line in output.decode('utf-8', 'replace').splitlines():
+        fields = line.split()
+        if not line.startswith(' ') or not fields or 'x' not in fields[0]:
+            continue
+        try:
+            width, height = (int(n) for n in fields[0].rstrip('i').split('x'))
+        except ValueError:
+            continue
+        mode = None
+        for rate in fields[1:]:
+            if rate.strip('*+') and rate[0].isdigit():
+                mode = (width, height, round(float(rate.rstrip('*+'))))
+                if mode not in modes:
+                    modes.append(mode)
+            if '+' in rate and mode is not None:
+                preferred = mode  # '+' may also follow the rate as a separate field
+    if preferred is not None:
+        if preferred in modes:
+            modes.remove(preferred)
+        modes.insert(0, preferred)
+    return modes
+
+
+def detect_display():
+    Settings.display_modes = tuple(get_display_resolutions())
+    getLogger("PiCast").info("display modes: {}".format(Settings.display_modes[:8]))
+
+
+def setup_logger():
+    logger = getLogger("PiCast")
+    handler = StreamHandler()
+    handler.setLevel(DEBUG)
+    logger.setLevel(DEBUG)
+    logger.addHandler(handler)
+    logger.propagate = True
+
+
+def app_main():
+    setup_logger()
+
+    def on_startup_done(startup):
+        if startup.failed:
+            GLib.idle_add(Gtk.main_quit)
+
+    startup = Startup(on_done=on_startup_done, report_path=Settings.startup_report)
+    p2p = WifiP2PServer()
+    window = Gtk.Window()
+    picast = PiCast(window)
+    # before dhcpd starts, so no lease of an early source is missed
+    p2p.on_lease(picast.on_lease)
+
+    def picast_target():
+        picast.run()
+        Gtk.main_quit()
+
+    def start_picast():
+        thread = threading.Thread(target=picast_target)
+        thread.daemon = True
+        thread.start()
+
+    startup.add('wpa monitor', p2p.start_monitor)
+    startup.add('p2p interface', p2p.set_p2p_interface, after=['wpa monitor'])
+    startup.add('dhcpd', p2p.start_dhcpd, after=['p2p interface'])
+    startup.add('wps', p2p.start_wps, after=['p2p interface'])
+    startup.add('gstreamer', GstPlayer.preload)
+    startup.add('display', detect_display)
+    startup.add('rtsp server', start_picast, after=['gstreamer', 'display', 'p2p interface'])
+    startup.start()
+
+    with startup.measure('window'):
+        window.set_name('PiCast')
+        window.connect('destroy', Gtk.main_quit)
+        window.show_all()
+
+
+def main():
+    app_main()
+    Gtk.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Headless benchmark with a local fake source.
+
+The receiver runs in this process with fake sinks. FakeSource speaks the
+source side of M1-M7 and the keepalives over loopback; its RTP stream
+(MPEG2-TS from videotestsrc and an encoder, or a recorded TS file) is sent
+by a gst-launch-1.0 child process, so CPU and RSS of this process are
+those of the receiver.
+
+    cd src
+    python3 -m picast.bench --width 1280 --height 720 --fps 30 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from logging import INFO, StreamHandler, getLogger
+from time import monotonic
+
+import gi  # GObject Introspection
+
+gi.require_version('Gst', '1.0')  # noqa: E402 # isort:skip
+from gi.repository import GLib, Gst  # noqa: E402 # isort:skip
+
+from .exceptions import PiCastException  # noqa: E402
+from .rtsp import RtspConnection  # noqa: E402
+from .rtspserver import PiCast  # noqa: E402
+from .settings import Settings  # noqa: E402
+from .video import CATALOG  # noqa: E402
+
+ENCODERS = {
+    'h264': 'x264enc tune=zerolatency speed-preset=ultrafast key-int-max={fps} bitrate={bitrate} '
+            '! video/x-h264, profile=constrained-baseline ! h264parse config-interval=-1',
+    'h265': 'x265enc tune=zerolatency speed-preset=ultrafast key-int-max={fps} bitrate={bitrate} '
+            '! h265parse config-interval=-1',
+}
+
+
+def rss_kb():
+    """Resident set size of this process in kB."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class FakeSource:
+    """Source side of the WFD session over loopback."""
+
+    def __init__(self, host, port, res, codec='h264', ts_file=None, bitrate=4000, keepalive=5):
+        self.logger = getLogger("PiCast.bench.source")
+        self.host = host
+        self.port = port
+        self.res = res
+        self.codec = codec
+        self.ts_file = ts_file
+        self.bitrate = bitrate
+        self.keepalive = keepalive
+        self.conn = None
+        self.rtp_port = None
+        self.sender = None
+        self.idr_requests = 0
+        self.negotiation_time = None
+
+    async def recv_response(self):
+        """Next response; requests of the sink arriving in between are answered."""
+        while True:
+            msg = await self.conn.recv()
+            if msg is None:
+                raise PiCastException("Sink closed the connection.")
+            if not msg.is_request:
+                if msg.status != 200:
+                    raise PiCastException("Sink answered {}".format(msg))
+                return msg
+            await self.answer(msg)
+
+    async def recv_request(self, method):
+        msg = await self.conn.recv()
+        if msg is None or not msg.is_request or msg.method != method:
+            raise PiCastException("Expected {} from sink but got {}".format(method, msg))
+        return msg
+
+    async def answer(self, msg):
+        if 'wfd_idr_request' in msg.parameters or 'wfd-idr-request' in msg.parameters:
+            self.idr_requests += 1
+        await self.conn.respond(msg)
+
+    def m4_body(self, m3):
+        formats = m3.get('wfd2_video_formats' if self.codec == 'h265' else 'wfd_video_formats')
+        if not formats:
+            raise PiCastException("Sink does not offer {}".format(self.codec))
+        fields = formats.split()
+        offset = 3 if self.codec == 'h265' else 2  # wfd2_video_formats has a codec field first
+        cea, vesa, hh = (int(field, 16) for field in fields[offset + 2:offset + 5])
+        masks = [0, 0, 0]
+        masks[self.res.table] = 1 << self.res.id
+        if not (cea, vesa, hh)[self.res.table] & masks[self.res.table]:
+            raise PiCastException("Sink does not offer {}".format(self.res))
+        if self.codec == 'h265':
+            video = 'wfd2_video_formats: 00 00 02 01 {} {:08X} {:08X} {:08X} 00 0000 0000 00\r\n'.format(
+                fields[offset + 1], *masks)
+        else:
+            video = 'wfd_video_formats: 00 00 01 {} {:08X} {:08X} {:08X} 00 0000 0000 00 none none\r\n'.format(
+                fields[offset + 1], *masks)
+        return video + 'wfd_presentation_URL: rtsp://{}/wfd1.0/streamid=0 none\r\n' \
+                       'wfd_client_rtp_ports: RTP/AVP/UDP;unicast {} 0 mode=play\r\n'.format(self.host, self.rtp_port)
+
+    async def negotiate(self):
+        start = monotonic()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.conn = RtspConnection(reader, writer, cseq=1)
+        # M1, M2
+        await self.conn.request('OPTIONS', '*', headers=[('Require', 'org.wfa.wfd1.0'),
+                                                         ('User-Agent', 'picast-bench')])
+        await self.recv_response()
+        req = await self.recv_request('OPTIONS')
+        await self.conn.respond(req, headers=[('Public', 'org.wfa.wfd1.0, SETUP, TEARDOWN, PLAY, PAUSE, '
+                                                         'GET_PARAMETER, SET_PARAMETER')])
+        # M3
+        await self.conn.request('GET_PARAMETER', 'rtsp://localhost/wfd1.0',
+                                headers=[('Content-Type', 'text/parameters')],
+                                body='wfd_video_formats\r\nwfd2_video_formats\r\nwfd_audio_codecs\r\n'
+                                     'wfd_client_rtp_ports\r\n')
+        m3 = (await self.recv_response()).parameters
+        self.rtp_port = int(m3['wfd_client_rtp_ports'].split()[1])
+        # M4, M5
+        await self.conn.request('SET_PARAMETER', 'rtsp://localhost/wfd1.0',
+                                headers=[('Content-Type', 'text/parameters')], body=self.m4_body(m3))
+        await self.recv_response()
+        await self.conn.request('SET_PARAMETER', 'rtsp://localhost/wfd1.0',
+                                headers=[('Content-Type', 'text/parameters')], body='wfd_trigger_method: SETUP\r\n')
+        await self.recv_response()
+        # M6, M7
+        req = await self.recv_request('SETUP')
+        await self.conn.respond(req, headers=[('Session', 'bench;timeout=30'),
+                                              ('Transport', 'RTP/AVP/UDP;unicast;client_port={};server_port=19000'
+                                               .format(self.rtp_port))])
+        req = await self.recv_request('PLAY')
+        await self.conn.respond(req, headers=[('Session', 'bench')])
+        self.negotiation_time = monotonic() - start
+
+    def sender_pipeline(self):
+        sink = 'rtpmp2tpay ! udpsink host={} port={:d}'.format(self.host, self.rtp_port)
+        if self.ts_file is not None:
+            return 'filesrc location={} ! tsparse set-timestamps=true ! {}'.format(shlex.quote(self.ts_file), sink)
+        fps = self.res.refresh
+        encoder = ENCODERS[self.codec].format(fps=fps, bitrate=self.bitrate)
+        return 'videotestsrc is-live=true ! video/x-raw, width={:d}, height={:d}, framerate={:d}/1 ! {} ' \
+               '! mpegtsmux alignment=7 ! {}'.format(self.res.width, self.res.height, fps, encoder, sink)
+
+    def start_stream(self):
+        launch = shutil.which('gst-launch-1.0')
+        if launch is None:
+            raise PiCastException("gst-launch-1.0 is needed to send the stream.")
+        command = [launch, '-q'] + shlex.split(self.sender_pipeline())
+        self.logger.debug("sender: {}".format(' '.join(command)))
+        self.sender = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    async def serve(self, duration):
+        """Send keepalives and answer the sink for duration seconds."""
+        end = monotonic() + duration
+        while monotonic() < end:
+            try:
+                msg = await asyncio.wait_for(self.conn.recv(), min(self.keepalive, max(end - monotonic(), 0.01)))
+            except asyncio.TimeoutError:
+                await self.conn.request('GET_PARAMETER', 'rtsp://localhost/wfd1.0')
+                continue
+            if msg is None:
+                raise PiCastException("Sink closed the connection.")
+            if msg.is_request:
+                await self.answer(msg)
+
+    async def teardown(self):
+        if self.sender is not None:
+            self.sender.terminate()
+            self.sender.wait()
+        if self.conn is not None:
+            await self.conn.request('SET_PARAMETER', 'rtsp://localhost/wfd1.0',
+                                    headers=[('Content-Type', 'text/parameters')],
+                                    body='wfd_trigger_method: TEARDOWN\r\n')
+            self.conn.writer.close()
+
+
+async def wait_for(predicate, timeout, interval=0.01):
+    end = monotonic() + timeout
+    while not predicate():
+        if monotonic() > end:
+            return False
+        await asyncio.sleep(interval)
+    return True
+
+
+async def benchmark(res, codec='h264', duration=10.0, ts_file=None, bitrate=4000):
+    """Negotiate and stream once; returns the report as a dict."""
+    picast = PiCast(None)
+    server = asyncio.ensure_future(picast.serve())
+    source = FakeSource('127.0.0.1', Settings.rtsp_port, res, codec, ts_file, bitrate)
+    try:
+        await asyncio.sleep(0.1)
+        await source.negotiate()
+        session = picast.sessions.get(source.rtp_port)
+        if session is None:
+            raise PiCastException("Sink has no session for RTP port {}".format(source.rtp_port))
+        source.start_stream()
+        if not await wait_for(lambda: session.player.ttff is not None, 10):
+            raise PiCastException("No frame within 10 s.")
+        first = session.player.stats()
+        cpu, wall = time.process_time(), monotonic()
+        await source.serve(duration)
+        cpu, wall = time.process_time() - cpu, monotonic() - wall
+        stats = session.player.stats()
+        fps = bitrate = None
+        if first['frames_rendered'] is not None and stats['frames_rendered'] is not None:
+            fps = (stats['frames_rendered'] - first['frames_rendered']) / wall
+        if first['bytes_received'] is not None and stats['bytes_received'] is not None:
+            bitrate = (stats['bytes_received'] - first['bytes_received']) * 8 / wall
+        return {
+            'mode': str(res),
+            'codec': codec,
+            'decoder': session.player.decoder_name,
+            'negotiation_ms': source.negotiation_time * 1000,
+            'negotiation_steps_ms': {step: {'peer': peer * 1000, 'sink': own * 1000}
+                                     for step, peer, own in session.timings},
+            'ttff_ms': session.player.ttff * 1000,
+            'fps': fps,
+            'frames_dropped': stats['frames_dropped'],
+            'packets_lost': stats['packets_lost'],
+            'bitrate_kbps': bitrate / 1000 if bitrate is not None else None,
+            'idr_requests': source.idr_requests,
+            'cpu_percent': cpu / wall * 100,
+            'rss_kb': rss_kb(),
+        }
+    finally:
+        await source.teardown()
+        await asyncio.sleep(0.1)
+        server.cancel()
+
+
+def headless():
+    """Receiver settings for a machine without display, audio or Wi-Fi Direct."""
+    Settings.myaddress = '127.0.0.1'
+    Settings.video_sink = 'fakesink sync=true'
+    Settings.audio_sink = 'fakesink sync=true'
+    Settings.metrics_port = None
+    Settings.display_modes = ()
+    Gst.init(None)
+    loop = GLib.MainLoop()
+    thread = threading.Thread(target=loop.run)
+    thread.daemon = True
+    thread.start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m picast.bench', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--codec', choices=sorted(ENCODERS), default='h264')
+    parser.add_argument('--bitrate', type=int, default=4000, help='encoder bitrate in kbit/s')
+    parser.add_argument('--ts', dest='ts_file', help='send this MPEG2-TS recording instead of a test pattern')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to measure after the first frame')
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--port', type=int, default=17236, help='RTSP port of the receiver')
+    parser.add_argument('--json', action='store_true', help='print one JSON report per run')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logger = getLogger("PiCast")
+    logger.addHandler(StreamHandler())
+    logger.setLevel(INFO if args.verbose else INFO + 10)
+    res = CATALOG.find(args.width, args.height, args.fps)
+    if res is None:
+        parser.error("{}x{}p{} is not a WFD mode".format(args.width, args.height, args.fps))
+    Settings.rtsp_port = args.port
+    headless()
+    for run in range(args.runs):
+        try:
+            report = asyncio.run(benchmark(res, args.codec, args.duration, args.ts_file, args.bitrate))
+        except PiCastException as e:
+            print("run {}: {}".format(run + 1, e), file=sys.stderr)
+            return 1
+        if args.json:
+            print(json.dumps(report))
+            continue
+        print("run {}: {} {} with {}".format(run + 1, report['mode'], report['codec'], report['decoder']))
+        for key, value in report.items():
+            if key.endswith(('_ms', '_kbps', '_percent')) or key == 'fps':
+                value = '{:.1f}'.format(value) if value is not None else '-'
+            if key not in ('mode', 'codec', 'decoder', 'negotiation_steps_ms'):
+                print("  {:16} {}".format(key, value))
+        print("  steps (peer/sink ms): {}".format(', '.join(
+            '{} {:.1f}/{:.1f}'.format(step, t['peer'], t['sink'])
+            for step, t in report['negotiation_steps_ms'].items())))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
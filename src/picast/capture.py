@@ -0,0 +1,255 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Session capture and replay.
+
+With Settings.capture_dir set, every session records the RTSP bytes in
+both directions and the RTP packets it receives to a capture file. A
+capture is a magic line followed by records of
+
+    kind (1 byte), microseconds since start (8 bytes), length (4 bytes), data
+
+in little endian, gzip compressed when the name ends in .gz. Replay
+plays the source's side of a capture into a receiver over loopback. Each
+source message waits until the receiver has sent as many messages as it
+had at that point of the capture, so the sequence is deterministic at any
+speed.
+
+    cd src
+    python3 -m picast.capture replay session.wfdcap.gz --speed 4
+    python3 -m picast.capture parse session.wfdcap.gz
+"""
+
+import argparse
+import asyncio
+import gzip
+import socket
+import struct
+import sys
+import threading
+from logging import getLogger
+from time import monotonic
+
+from .exceptions import PiCastException
+from .rtsp import RtspFramer
+
+MAGIC = b'PICAST-CAPTURE 1\n'
+RECORD = struct.Struct('<BQI')
+
+RTSP_IN = 0  # RTSP bytes from the source
+RTSP_OUT = 1  # RTSP bytes from the sink
+RTP_IN = 2  # one RTP packet from the source
+
+
+def open_capture(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, compresslevel=1)
+    return open(path, mode)
+
+
+class CaptureWriter:
+    """Appends records to a capture file; write() may be called from any thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open_capture(path, 'wb')
+        self.file.write(MAGIC)
+        self.start = monotonic()
+        self.lock = threading.Lock()
+
+    def write(self, kind, data):
+        stamp = int((monotonic() - self.start) * 1000000)
+        with self.lock:
+            if self.file is not None:
+                self.file.write(RECORD.pack(kind, stamp, len(data)))
+                self.file.write(data)
+
+    def rtsp_in(self, data):
+        self.write(RTSP_IN, data)
+
+    def rtsp_out(self, data):
+        self.write(RTSP_OUT, data)
+
+    def rtp_in(self, data):
+        self.write(RTP_IN, data)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_capture(path):
+    """Yield the (kind, seconds, data) records of a capture."""
+    with open_capture(path, 'rb') as f:
+        if f.readline() != MAGIC:
+            raise PiCastException("{} is not a capture".format(path))
+        while True:
+            head = f.read(RECORD.size)
+            if not head:
+                return
+            if len(head) < RECORD.size:
+                raise PiCastException("{} is truncated".format(path))
+            kind, stamp, length = RECORD.unpack(head)
+            data = f.read(length)
+            if len(data) < length:
+                raise PiCastException("{} is truncated".format(path))
+            yield kind, stamp / 1000000, data
+
+
+def count_messages(framer, data):
+    framer.feed(data)
+    return sum(1 for msg in framer)
+
+
+class Replay:
+    """Plays the source side of a capture into a receiver."""
+
+    def __init__(self, records, host='127.0.0.1', port=7236, speed=1.0):
+        """speed: 1 is real time, 2 twice as fast, 0 as fast as the receiver answers."""
+        self.logger = getLogger("PiCast.replay")
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.plan = self.make_plan(records)
+        self.rtp_port = None
+        self.sink_messages = 0
+        self.sink_framer = RtspFramer()
+        self.received = None  # Event of the loop in run(), set on each sink message
+        self.stats = {'rtsp_bytes': 0, 'rtp_packets': 0, 'rtp_bytes': 0, 'sink_messages': 0, 'play_time': None}
+
+    @staticmethod
+    def make_plan(records):
+        """(seconds, kind, data, sink messages to wait for) of the records to send."""
+        plan = []
+        framer = RtspFramer()
+        sink_messages = 0
+        for kind, stamp, data in records:
+            if kind == RTSP_OUT:
+                sink_messages += count_messages(framer, data)
+            else:
+                plan.append((stamp, kind, data, sink_messages))
+        return plan
+
+    async def read_sink(self, reader):
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            self.sink_framer.feed(data)
+            for msg in self.sink_framer:
+                self.sink_messages += 1
+                if msg.is_request and msg.method == 'PLAY' and self.stats['play_time'] is None:
+                    self.stats['play_time'] = monotonic() - self.started
+                ports = msg.parameters.get('wfd_client_rtp_ports') if not msg.is_request else None
+                if ports:
+                    self.rtp_port = int(ports.split()[1])
+            self.received.set()
+
+    async def wait_sink(self, count, timeout=10):
+        while self.sink_messages < count:
+            self.received.clear()
+            try:
+                await asyncio.wait_for(self.received.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise PiCastException("Receiver sent {} messages, the capture has {}".format(
+                    self.sink_messages, count))
+
+    async def run(self):
+        self.received = asyncio.Event()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        rtp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.started = monotonic()
+        sink = asyncio.ensure_future(self.read_sink(reader))
+        try:
+            for stamp, kind, data, sink_messages in self.plan:
+                if self.speed:
+                    delay = self.started + stamp / self.speed - monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                if kind == RTSP_IN:
+                    await self.wait_sink(sink_messages)
+                    writer.write(data)
+                    await writer.drain()
+                    self.stats['rtsp_bytes'] += len(data)
+                elif kind == RTP_IN and self.rtp_port is not None:
+                    rtp.sendto(data, (self.host, self.rtp_port))
+                    self.stats['rtp_packets'] += 1
+                    self.stats['rtp_bytes'] += len(data)
+        finally:
+            self.stats['sink_messages'] = self.sink_messages
+            self.stats['duration'] = monotonic() - self.started
+            sink.cancel()
+            writer.close()
+            rtp.close()
+        return self.stats
+
+
+def parse_benchmark(records, rounds=100):
+    """RTSP messages per second through RtspFramer, both directions of the capture."""
+    chunks = [data for kind, stamp, data in records if kind in (RTSP_IN, RTSP_OUT)]
+    messages = 0
+    start = monotonic()
+    for i in range(rounds):
+        framer = RtspFramer()
+        for data in chunks:
+            messages += count_messages(framer, data)
+    elapsed = monotonic() - start
+    return messages, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m picast.capture', description='Replay or inspect a capture.')
+    commands = parser.add_subparsers(dest='command')
+    replay = commands.add_parser('replay', help='play the source side into a receiver')
+    replay.add_argument('file')
+    replay.add_argument('--host', default='127.0.0.1')
+    replay.add_argument('--port', type=int, default=7236, help='RTSP port of the receiver')
+    replay.add_argument('--speed', type=float, default=1.0, help='1: real time, 0: as fast as possible')
+    parse = commands.add_parser('parse', help='benchmark the RTSP parser with the capture')
+    parse.add_argument('file')
+    parse.add_argument('--rounds', type=int, default=100)
+    show = commands.add_parser('show', help='list the records')
+    show.add_argument('file')
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error('a command is required')
+
+    try:
+        records = list(read_capture(args.file))
+        if args.command == 'replay':
+            stats = asyncio.run(Replay(records, args.host, args.port, args.speed).run())
+            for key, value in stats.items():
+                print("{:14} {}".format(key, value))
+        elif args.command == 'parse':
+            messages, elapsed = parse_benchmark(records, args.rounds)
+            print("{} messages in {:.3f} s, {:.0f} messages/s".format(messages, elapsed, messages / elapsed))
+        else:
+            names = {RTSP_IN: 'rtsp <-', RTSP_OUT: 'rtsp ->', RTP_IN: 'rtp  <-'}
+            for kind, stamp, data in records:
+                text = data.split(b'\r\n', 1)[0].decode('UTF-8', 'replace') if kind != RTP_IN else ''
+                print("{:10.6f} {} {:6d} {}".format(stamp, names.get(kind, kind), len(data), text))
+    except (OSError, PiCastException) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Monotonic deadlines on the asyncio loop.
+
+A Deadline calls back once when its time passes. touch() only moves the
+time forward; the loop timer is rescheduled when it fires early, so
+pushing a deadline on every message costs no timer operations and nothing
+runs while waiting.
+"""
+
+
+class Deadline:
+    """Calls callback() on the loop once timeout seconds pass without touch()."""
+
+    def __init__(self, loop, timeout, callback):
+        self.loop = loop
+        self.timeout = timeout
+        self.callback = callback
+        self.when = None  # loop.time() of expiry, None when not armed
+        self.handle = None
+
+    @property
+    def armed(self):
+        return self.when is not None
+
+    def start(self, timeout=None):
+        """Arm the deadline timeout seconds from now, optionally with a new timeout."""
+        if timeout is not None:
+            self.timeout = timeout
+        self.touch()
+
+    def touch(self):
+        self.when = self.loop.time() + self.timeout
+        if self.handle is None:
+            self.handle = self.loop.call_at(self.when, self._check)
+
+    def remaining(self):
+        if self.when is None:
+            return None
+        return max(0.0, self.when - self.loop.time())
+
+    def cancel(self):
+        self.when = None
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+    def _check(self):
+        self.handle = None
+        if self.when is None:
+            return
+        if self.loop.time() < self.when:
+            self.handle = self.loop.call_at(self.when, self._check)
+            return
+        self.when = None
+        self.callback()
@@ -0,0 +1,207 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Decoder selection.
+
+The GStreamer registry is probed for decoders of each codec, which are
+ranked hardware first. The result and the highest level of each decoder
+are cached on disk, keyed by the GStreamer version and the registry file,
+so later starts and sessions skip the probe.
+Decoders that failed at runtime are ranked last for Settings.decoder_retry
+seconds of this process; failures are not written to the cache, and none
+is recorded while another pipeline holds the decoder, as a busy hardware
+decoder fails without being broken.
+"""
+
+import glob
+import json
+import os
+import re
+import threading
+from logging import getLogger
+from time import monotonic
+
+import gi  # GObject Introspection
+
+gi.require_version('Gst', '1.0')  # noqa: E402 # isort:skip
+from gi.repository import Gst  # noqa: E402 # isort:skip
+
+from .settings import Settings  # noqa: E402
+
+# known decoders, in order of preference within hardware and software ones
+PREFERRED = {
+    'h264': ['v4l2h264dec', 'v4l2slh264dec', 'omxh264dec', 'vah264dec', 'vaapih264dec', 'nvh264dec',
+             'avdec_h264', 'openh264dec'],
+    'h265': ['v4l2h265dec', 'v4l2slh265dec', 'omxh265dec', 'vah265dec', 'vaapih265dec', 'nvh265dec',
+             'avdec_h265', 'libde265dec'],
+    'aac': ['fdkaacdec', 'avdec_aac', 'faad'],
+    'ac3': ['a52dec', 'avdec_ac3'],
+    'lpcm': ['dvdlpcmdec'],
+}
+
+HARDWARE_PREFIXES = ('v4l2', 'omx', 'va', 'nv', 'msdk')
+
+CAPS = {
+    'h264': 'video/x-h264',
+    'h265': 'video/x-h265',
+    'aac': 'audio/mpeg, mpegversion=(int)4',
+    'ac3': 'audio/x-ac3',
+    'lpcm': 'audio/x-private-ts-lpcm',
+}
+
+_lock = threading.Lock()
+_cache = None
+_failed = {}  # decoder: monotonic time of its last failure
+_users = {}  # decoder: pipelines holding it
+
+
+def registry_key():
+    """Identifies the GStreamer installation; changes when plugins are added or removed."""
+    path = os.environ.get('GST_REGISTRY_1_0') or os.environ.get('GST_REGISTRY')
+    if path is None:
+        cache_home = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+        found = sorted(glob.glob(os.path.join(cache_home, 'gstreamer-1.0', 'registry.*.bin')))
+        path = found[0] if found else None
+    try:
+        st = os.stat(path) if path is not None else None
+    except OSError:
+        st = None
+    if st is None:
+        return Gst.version_string()
+    return '{} {} {} {}'.format(Gst.version_string(), path, int(st.st_mtime), st.st_size)
+
+
+def is_hardware(factory):
+    klass = factory.get_metadata(Gst.ELEMENT_METADATA_KLASS) or ''
+    return 'Hardware' in klass or factory.get_name().startswith(HARDWARE_PREFIXES)
+
+
+def probe(codec):
+    """Decoder factory names that accept the codec, hardware first."""
+    caps = Gst.Caps.from_string(CAPS[codec])
+    media = Gst.ELEMENT_FACTORY_TYPE_MEDIA_AUDIO if CAPS[codec].startswith('audio/') \
+        else Gst.ELEMENT_FACTORY_TYPE_MEDIA_VIDEO
+    factories = Gst.ElementFactory.list_get_elements(Gst.ELEMENT_FACTORY_TYPE_DECODER | media, Gst.Rank.NONE)
+    factories = Gst.ElementFactory.list_filter(factories, caps, Gst.PadDirection.SINK, False)
+    preferred = PREFERRED[codec]
+
+    def order(factory):
+        name = factory.get_name()
+        known = preferred.index(name) if name in preferred else len(preferred)
+        return not is_hardware(factory), known, -factory.get_rank(), name
+
+    return [f.get_name() for f in sorted(factories, key=order)]
+
+
+def max_level(codec, name):
+    """Highest level the decoder declares on its sink pad template, or None when it does not say."""
+    factory = Gst.ElementFactory.find(name)
+    if factory is None:
+        return None
+    levels = []
+    for template in factory.get_static_pad_templates():
+        if template.direction != Gst.PadDirection.SINK:
+            continue
+        for structure in template.get_caps().to_string().split(';'):
+            if not structure.strip().startswith(CAPS[codec]):
+                continue
+            match = re.search(r'level=\(string\)(\{[^}]*\}|[0-9.]+)', structure)
+            if match:
+                levels += re.findall(r'[0-9]+(?:\.[0-9]+)?', match.group(1))
+    if not levels:
+        return None
+    return max(levels, key=lambda level: tuple(int(n) for n in level.split('.')))
+
+
+def _load():
+    global _cache
+    if _cache is not None:
+        return _cache
+    key = registry_key()
+    try:
+        with open(Settings.decoder_cache) as f:
+            cache = json.load(f)
+        if cache.get('key') != key:
+            cache = None
+    except (OSError, ValueError):
+        cache = None
+    if cache is None:
+        cache = {'key': key, 'decoders': {}}
+    _cache = cache
+    return cache
+
+
+def _save(cache):
+    try:
+        os.makedirs(os.path.dirname(Settings.decoder_cache), exist_ok=True)
+        with open(Settings.decoder_cache, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        getLogger("PiCast.decoder").debug("Can not write decoder cache: {}".format(e))
+
+
+def get_decoders(codec):
+    """Ranked decoder names for a codec of CAPS; Settings.decoder, when set, goes first for video."""
+    with _lock:
+        cache = _load()
+        decoders = cache['decoders'].get(codec)
+        if decoders is None:
+            decoders = probe(codec)
+            cache['decoders'][codec] = decoders
+            _save(cache)
+            getLogger("PiCast.decoder").info("{} decoders: {}".format(codec, ', '.join(decoders) or 'none'))
+        failed = [name for name, when in _failed.items() if monotonic() - when < Settings.decoder_retry]
+    ranked = [d for d in decoders if d not in failed] + [d for d in decoders if d in failed]
+    if Settings.decoder is not None and Settings.decoder in ranked and CAPS[codec].startswith('video/'):
+        ranked.remove(Settings.decoder)
+        ranked.insert(0, Settings.decoder)
+    return ranked
+
+
+def get_level(codec, name):
+    """max_level() of a decoder, from the cache."""
+    with _lock:
+        cache = _load()
+        levels = cache.setdefault('levels', {})
+        if name not in levels:
+            levels[name] = max_level(codec, name)
+            _save(cache)
+        return levels[name]
+
+
+def mark_failed(name):
+    """Rank a decoder that did not work last for a while; False when it was busy and is not ranked down."""
+    with _lock:
+        if _users.get(name, 0) > 0:
+            return False
+        _failed[name] = monotonic()
+        return True
+
+
+def hold_decoder(name):
+    """Count a pipeline using the decoder, so failures are not recorded while it is busy; see release_decoder()."""
+    with _lock:
+        _users[name] = _users.get(name, 0) + 1
+
+
+def release_decoder(name):
+    with _lock:
+        if _users.get(name, 0) > 1:
+            _users[name] -= 1
+        else:
+            _users.pop(name, None)
@@ -0,0 +1,382 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+    Copyright (C) 2018 Hsun-Wei Cho
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+DHCP-Server für die P2P-Gruppe
+
+Runs in process on a UDP socket bound to the group interface and hands out
+addresses from a pool starting at Settings.peeraddress; a client gets the
+same address again while the server remembers it. Lease events go to a
+callback, so the session manager knows which client has which address.
+
+Binding port 67 to an interface needs root, or CAP_NET_BIND_SERVICE and
+CAP_NET_RAW.
+"""
+
+import asyncio
+import ipaddress
+import socket
+import struct
+import threading
+from logging import getLogger
+
+from .deadline import Deadline
+from .exceptions import PiCastException
+from .settings import Settings
+
+BOOTREQUEST = 1
+BOOTREPLY = 2
+MAGIC_COOKIE = b'\x63\x82\x53\x63'
+# op, htype, hlen, hops, xid, secs, flags, ciaddr, yiaddr, siaddr, giaddr, chaddr, sname, file
+HEADER = struct.Struct('!BBBB4sHH4s4s4s4s16s64s128s')
+BROADCAST_FLAG = 0x8000
+
+DHCPDISCOVER = 1
+DHCPOFFER = 2
+DHCPREQUEST = 3
+DHCPDECLINE = 4
+DHCPACK = 5
+DHCPNAK = 6
+DHCPRELEASE = 7
+DHCPINFORM = 8
+
+OPTION_PAD = 0
+OPTION_SUBNET_MASK = 1
+OPTION_HOSTNAME = 12
+OPTION_REQUESTED_ADDRESS = 50
+OPTION_LEASE_TIME = 51
+OPTION_MESSAGE_TYPE = 53
+OPTION_SERVER_ID = 54
+OPTION_END = 255
+
+ANY = '0.0.0.0'
+
+
+class DhcpMessage:
+    """A BOOTP message with DHCP options as {code: bytes}."""
+
+    __slots__ = ('op', 'xid', 'flags', 'ciaddr', 'yiaddr', 'giaddr', 'chaddr', 'options')
+
+    def __init__(self, op, xid, flags=0, ciaddr=ANY, yiaddr=ANY, giaddr=ANY, chaddr=b'', options=None):
+        self.op = op
+        self.xid = xid
+        self.flags = flags
+        self.ciaddr = ciaddr
+        self.yiaddr = yiaddr
+        self.giaddr = giaddr
+        self.chaddr = chaddr
+        self.options = options if options is not None else {}
+
+    @classmethod
+    def parse(cls, data):
+        if len(data) < HEADER.size + len(MAGIC_COOKIE) or data[HEADER.size:HEADER.size + 4] != MAGIC_COOKIE:
+            raise ValueError("not a DHCP message")
+        op, htype, hlen, hops, xid, secs, flags, ciaddr, yiaddr, siaddr, giaddr, chaddr, sname, file = \
+            HEADER.unpack_from(data)
+        options = {}
+        pos = HEADER.size + 4
+        while pos < len(data):
+            code = data[pos]
+            if code == OPTION_END:
+                break
+            if code == OPTION_PAD:
+                pos += 1
+                continue
+            if pos + 1 >= len(data) or pos + 2 + data[pos + 1] > len(data):
+                raise ValueError("truncated option {}".format(code))
+            length = data[pos + 1]
+            options[code] = options.get(code, b'') + data[pos + 2:pos + 2 + length]
+            pos += 2 + length
+        return cls(op, xid, flags, socket.inet_ntoa(ciaddr), socket.inet_ntoa(yiaddr), socket.inet_ntoa(giaddr),
+                   chaddr[:min(hlen, 16)], options)
+
+    def to_bytes(self, server_address=ANY):
+        head = HEADER.pack(self.op, 1, len(self.chaddr), 0, self.xid, 0, self.flags, socket.inet_aton(self.ciaddr),
+                           socket.inet_aton(self.yiaddr), socket.inet_aton(server_address),
+                           socket.inet_aton(self.giaddr), self.chaddr, b'', b'')
+        options = b''.join(struct.pack('!BB', code, len(value)) + value for code, value in self.options.items())
+        return head + MAGIC_COOKIE + options + bytes([OPTION_END])
+
+    @property
+    def type(self):
+        value = self.options.get(OPTION_MESSAGE_TYPE)
+        return value[0] if value else None
+
+    @property
+    def mac(self):
+        return ':'.join('{:02x}'.format(b) for b in self.chaddr)
+
+    def address_option(self, code):
+        value = self.options.get(code)
+        return socket.inet_ntoa(value) if value is not None and len(value) == 4 else None
+
+
+class Lease:
+    """An address offered or bound to a client."""
+
+    __slots__ = ('mac', 'address', 'hostname', 'bound', 'deadline')
+
+    def __init__(self, mac, address):
+        self.mac = mac
+        self.address = address
+        self.hostname = None
+        self.bound = False
+        self.deadline = None
+
+    def __repr__(self):
+        return "Lease({} {}{})".format(self.address, self.mac, ' bound' if self.bound else '')
+
+
+class LeasePool:
+    """size addresses from first on; clients get their previous address back when it is free."""
+
+    def __init__(self, first, size):
+        start = ipaddress.IPv4Address(first)
+        self.addresses = [str(start + i) for i in range(size)]
+        self.leases = {}  # mac: Lease, offered or bound
+        self.owners = {}  # address: mac of its lease
+        self.previous = {}  # mac: address it had last
+        self.declined = set()  # addresses a client found in use
+
+    def get(self, mac):
+        return self.leases.get(mac)
+
+    def offer(self, mac, requested=None):
+        """Lease for mac, reusing its lease or previous address where possible; None when the pool is used up."""
+        lease = self.leases.get(mac)
+        if lease is not None:
+            return lease
+        address = None
+        for candidate in (requested, self.previous.get(mac)):
+            if candidate in self.addresses and self.is_free(candidate):
+                address = candidate
+                break
+        if address is None:
+            # addresses nobody had before first, then ones other clients had
+            free = [a for a in self.addresses if self.is_free(a)]
+            unused = [a for a in free if a not in self.previous.values()]
+            address = (unused or free or [None])[0]
+        if address is None:
+            address = self.reclaim_offer()
+        if address is None:
+            return None
+        lease = Lease(mac, address)
+        self.leases[mac] = lease
+        self.owners[address] = mac
+        return lease
+
+    def is_free(self, address):
+        return address not in self.owners and address not in self.declined
+
+    def reclaim_offer(self):
+        """Address of an offer the client never requested."""
+        for lease in list(self.leases.values()):
+            if not lease.bound:
+                self.remove(lease)
+                return lease.address
+        return None
+
+    def remove(self, lease):
+        if self.leases.get(lease.mac) is lease:
+            del self.leases[lease.mac]
+            self.owners.pop(lease.address, None)
+            self.previous[lease.mac] = lease.address
+        if lease.deadline is not None:
+            lease.deadline.cancel()
+
+    def decline(self, lease):
+        self.remove(lease)
+        self.declined.add(lease.address)
+        self.previous.pop(lease.mac, None)
+
+
+class DhcpServer(asyncio.DatagramProtocol):
+    """DHCP on one interface, answering DISCOVER, REQUEST, DECLINE, RELEASE and INFORM.
+
+    on_lease(event, lease) is called on the event loop for the events
+    'bound', 'released', 'expired' and 'declined'. Replies are broadcast
+    unless the client already has its address, so the client does not
+    need to be in the ARP table.
+    """
+
+    def __init__(self, server_address, netmask, pool, lease_time, on_lease=None, client_port=68,
+                 broadcast='255.255.255.255'):
+        self.logger = getLogger("PiCast.dhcpd")
+        self.server_address = server_address
+        self.netmask = netmask
+        self.pool = pool
+        self.lease_time = lease_time
+        self.on_lease = on_lease
+        self.client_port = client_port
+        self.broadcast = broadcast
+        self.transport = None
+        self.handlers = {
+            DHCPDISCOVER: self.on_discover,
+            DHCPREQUEST: self.on_request,
+            DHCPDECLINE: self.on_decline,
+            DHCPRELEASE: self.on_release,
+            DHCPINFORM: self.on_inform,
+        }
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            msg = DhcpMessage.parse(data)
+        except (ValueError, struct.error) as e:
+            self.logger.debug("Ignore datagram from {}: {}".format(addr, e))
+            return
+        handler = self.handlers.get(msg.type)
+        if msg.op == BOOTREQUEST and handler is not None:
+            handler(msg)
+
+    def emit(self, event, lease):
+        self.logger.info("{} {} {}".format(event, lease.address, lease.mac))
+        if self.on_lease is not None:
+            self.on_lease(event, lease)
+
+    def on_discover(self, msg):
+        lease = self.pool.offer(msg.mac, msg.address_option(OPTION_REQUESTED_ADDRESS))
+        if lease is None:
+            self.logger.warning("No address left for {}".format(msg.mac))
+            return
+        self.reply(msg, DHCPOFFER, lease.address)
+
+    def on_request(self, msg):
+        server_id = msg.address_option(OPTION_SERVER_ID)
+        lease = self.pool.get(msg.mac)
+        if server_id is not None and server_id != self.server_address:
+            # the client took the offer of another server
+            if lease is not None and not lease.bound:
+                self.pool.remove(lease)
+            return
+        requested = msg.address_option(OPTION_REQUESTED_ADDRESS) or msg.ciaddr
+        if lease is None and server_id is None:
+            # INIT-REBOOT: the client asks for the address it had, maybe before our restart
+            lease = self.pool.offer(msg.mac, requested)
+        if lease is None or lease.address != requested:
+            self.reply(msg, DHCPNAK, ANY)
+            if lease is not None and not lease.bound:
+                self.pool.remove(lease)
+            return
+        new = not lease.bound
+        lease.bound = True
+        hostname = msg.options.get(OPTION_HOSTNAME)
+        if hostname:
+            lease.hostname = hostname.decode('UTF-8', 'replace')
+        if lease.deadline is None:
+            lease.deadline = Deadline(asyncio.get_running_loop(), self.lease_time, lambda: self.expire(lease))
+        lease.deadline.start()
+        self.reply(msg, DHCPACK, lease.address)
+        if new:
+            self.emit('bound', lease)
+
+    def on_decline(self, msg):
+        lease = self.pool.get(msg.mac)
+        if lease is not None and lease.address == msg.address_option(OPTION_REQUESTED_ADDRESS):
+            self.pool.decline(lease)
+            self.emit('declined', lease)
+
+    def on_release(self, msg):
+        lease = self.pool.get(msg.mac)
+        if lease is not None and lease.address == msg.ciaddr:
+            self.pool.remove(lease)
+            self.emit('released', lease)
+
+    def on_inform(self, msg):
+        self.reply(msg, DHCPACK, ANY, lease_time=False)
+
+    def expire(self, lease):
+        self.pool.remove(lease)
+        self.emit('expired', lease)
+
+    def reply(self, msg, kind, address, lease_time=True):
+        options = {OPTION_MESSAGE_TYPE: bytes([kind]), OPTION_SERVER_ID: socket.inet_aton(self.server_address)}
+        if kind != DHCPNAK:
+            options[OPTION_SUBNET_MASK] = socket.inet_aton(self.netmask)
+            if lease_time:
+                options[OPTION_LEASE_TIME] = struct.pack('!I', self.lease_time)
+        reply = DhcpMessage(BOOTREPLY, msg.xid, msg.flags, msg.ciaddr if kind == DHCPACK else ANY, address,
+                            msg.giaddr, msg.chaddr, options)
+        if msg.ciaddr != ANY and kind != DHCPNAK and not msg.flags & BROADCAST_FLAG:
+            destination = msg.ciaddr
+        else:
+            destination = self.broadcast
+        self.transport.sendto(reply.to_bytes(self.server_address), (destination, self.client_port))
+
+
+class Dhcpd():
+    """DHCP server daemon running in background.
+    Implementiert einen einfachen DHCP-Server
+Vergibt den verbundenen Geräten Adressen aus einem Pool
+
+    The server has its own event loop thread; on_lease(event, lease) is
+    called from it.
+    """
+
+    def __init__(self, interface, on_lease=None):
+        """Constructor accept an interface to listen."""
+        self.interface = interface
+        self.on_lease = on_lease
+        self.loop = None
+        self.thread = None
+        self.server = None
+
+    def open_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            if self.interface is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, self.interface.encode() + b'\0')
+            sock.bind(('', Settings.dhcp_port))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def start(self):
+        """Return once the socket is bound; PiCastException when it can not be."""
+        self.server = DhcpServer(Settings.myaddress, Settings.netmask,
+                                 LeasePool(Settings.peeraddress, Settings.dhcp_pool_size), Settings.dhcp_lease_time,
+                                 self.on_lease, Settings.dhcp_client_port, Settings.dhcp_broadcast)
+        try:
+            sock = self.open_socket()
+        except OSError as e:
+            raise PiCastException("Can not serve DHCP on {}: {}".format(self.interface, e))
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run, args=(sock,), name='dhcpd', daemon=True)
+        self.thread.start()
+
+    def run(self, sock):
+        asyncio.set_event_loop(self.loop)
+        transport, protocol = self.loop.run_until_complete(
+            self.loop.create_datagram_endpoint(lambda: self.server, sock=sock))
+        try:
+            self.loop.run_forever()
+        finally:
+            transport.close()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+
+    def stop(self):
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
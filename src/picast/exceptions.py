@@ -1,5 +1,3 @@
-#!/usr/bin/env python3
-
 """
 picast - a simple wireless display receiver for Raspberry Pi
 
@@ -18,37 +16,6 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from logging import DEBUG, StreamHandler, getLogger
-
-
-def setup_logger():
-    logger = getLogger("PiCast")
-    handler = StreamHandler()
-    handler.setLevel(DEBUG)
-    logger.setLevel(DEBUG)
-    logger.addHandler(handler)
-    logger.propagate = True
-
-def app_main():
-    setup_logger()
-    WifiP2PServer().start()
-    window = Gtk.Window()
-    window.set_name('PiCast')
-    window.connect('destroy', Gtk.main_quit)
-
-    def picast_target():
-        picast = PiCast(window)
-        picast.run()
-        Gtk.main_quit()
-
-    window.show_all()
-
-    thread = threading.Thread(target=picast_target)
-    thread.daemon = True
-    thread.start()
-
 
-if __name__ == '__main__':
-    Gst.init(None)
-    app_main()
-    Gtk.main()
+class PiCastException(Exception):
+    pass
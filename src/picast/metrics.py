@@ -0,0 +1,158 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Session metrics in the Prometheus text format.
+
+Metrics are samples of (name, labels, value). They are pulled from the
+sessions when scraped, from element properties, queries and counters of
+bus messages, so nothing is counted per packet or frame in Python.
+"""
+
+import asyncio
+from logging import getLogger
+
+# type and help of every metric, in output order
+FAMILIES = {
+    'picast_sessions': ('gauge', 'Active sessions'),
+    'picast_warm_pipelines': ('gauge', 'Pipelines kept ready for a returning peer'),
+    'picast_rtp_packets_received_total': ('counter', 'RTP packets pushed out of the jitter buffer'),
+    'picast_rtp_packets_lost_total': ('counter', 'RTP packets the jitter buffer gave up on'),
+    'picast_rtp_packets_late_total': ('counter', 'RTP packets that arrived after their deadline'),
+    'picast_rtp_jitter_seconds': ('gauge', 'Average interarrival jitter'),
+    'picast_rtp_received_bytes_total': ('counter', 'RTP bytes received, headers included'),
+    'picast_jitterbuffer_fill_ratio': ('gauge', 'Fill level of the jitter buffer'),
+    'picast_frames_rendered_total': ('counter', 'Frames rendered by the video sink'),
+    'picast_frames_dropped_total': ('counter', 'Frames dropped by the video sink'),
+    'picast_qos_messages_total': ('counter', 'QoS messages of the video branch'),
+    'picast_pipeline_latency_seconds': ('gauge', 'Minimum latency of the pipeline'),
+    'picast_av_offset_seconds': ('gauge', 'Audio position minus video position'),
+    'picast_idr_requests_total': ('counter', 'wfd-idr-request sent to the source'),
+    'picast_rtp_timeouts_total': ('counter', 'Periods of Settings.rtp_timeout without RTP'),
+    'picast_rtsp_deadline_seconds': ('gauge', 'Time left until the session expires without a message of the source'),
+    'picast_rtsp_rtt_seconds': ('gauge', 'Round trip of the last RTSP request of the sink'),
+    'picast_negotiation_step_seconds': ('histogram', 'Time of the M1-M7 steps, waiting for the source (part=peer) '
+                                                     'or in the sink (part=sink)'),
+}
+
+HISTOGRAM_SUFFIXES = ('_bucket', '_sum', '_count')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                          for k, v in sorted(labels.items())) + '}'
+
+
+def family(name):
+    """Metric family of a sample name; histogram samples carry a suffix."""
+    for suffix in HISTOGRAM_SUFFIXES:
+        base = name[:-len(suffix)]
+        if name.endswith(suffix) and FAMILIES.get(base, ('',))[0] == 'histogram':
+            return base
+    return name
+
+
+def render(samples):
+    """Prometheus text for samples of (name, labels, value); samples with value None are left out."""
+    by_family = {}
+    for name, labels, value in samples:
+        if value is not None:
+            by_family.setdefault(family(name), []).append((name, labels, value))
+    lines = []
+    for base in list(FAMILIES) + sorted(set(by_family) - set(FAMILIES)):
+        if base not in by_family:
+            continue
+        kind, text = FAMILIES.get(base, ('untyped', base))
+        lines.append('# HELP {} {}'.format(base, text))
+        lines.append('# TYPE {} {}'.format(base, kind))
+        for name, labels, value in by_family[base]:
+            lines.append('{}{} {}'.format(name, format_labels(labels), value))
+    return '\n'.join(lines) + '\n'
+
+
+class Histogram:
+    """Cumulative histogram of observations by label set."""
+
+    def __init__(self, name, buckets):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # label items: [bucket counts..., sum, count]
+
+    def observe(self, labels, value):
+        key = tuple(sorted(labels.items()))
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        result = []
+        for key, series in list(self.series.items()):
+            labels = dict(key)
+            for bound, count in zip(self.buckets, series):
+                result.append((self.name + '_bucket', dict(labels, le=bound), count))
+            result.append((self.name + '_bucket', dict(labels, le='+Inf'), series[-1]))
+            result.append((self.name + '_sum', labels, series[-2]))
+            result.append((self.name + '_count', labels, series[-1]))
+        return result
+
+
+# time of the negotiation steps, over all sessions of this process
+NEGOTIATION = Histogram('picast_negotiation_step_seconds',
+                        (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+
+class MetricsServer:
+    """Serves render(collect()) over HTTP at /metrics on the running event loop."""
+
+    def __init__(self, collect):
+        self.logger = getLogger("PiCast.metrics")
+        self.collect = collect
+        self.server = None
+
+    async def start(self, host, port):
+        self.server = await asyncio.start_server(self.handle, host, port, reuse_address=True)
+        self.logger.info("metrics on http://{}:{}/metrics".format(host, port))
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            method, path, *rest = head.split(b'\r\n', 1)[0].decode('latin-1').split(' ')
+            if method != 'GET':
+                status, body = '405 Method Not Allowed', ''
+            elif path.split('?')[0] != '/metrics':
+                status, body = '404 Not Found', ''
+            else:
+                status, body = '200 OK', render(self.collect())
+            body = body.encode('UTF-8')
+            writer.write('HTTP/1.0 {}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {:d}\r\n'
+                         'Connection: close\r\n\r\n'.format(status, len(body)).encode('latin-1') + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
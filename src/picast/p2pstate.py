@@ -0,0 +1,98 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Persistent P2P group and known sources.
+
+wpa_supplicant keeps a persistent group as a network block, but a plain
+'p2p_group_add persistent' creates a new one, with a new SSID and
+passphrase, on every start, so sources have to go through WPS again. The
+state file remembers the group we run and the P2P device addresses of the
+sources that joined it, so the group can be re-invoked and their
+invitations answered.
+"""
+
+import json
+import os
+import time
+from logging import getLogger
+
+from .settings import Settings
+
+
+class P2PState:
+    """Group network id, credentials and known sources, stored in Settings.p2p_state."""
+
+    def __init__(self, path=None):
+        self.logger = getLogger("PiCast.p2pstate")
+        self.path = path or Settings.p2p_state
+        self.group = None  # {'network_id', 'ssid', 'passphrase', 'go_dev_addr'}
+        self.known = {}  # P2P device address: time of the last connection
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            self.group = state.get('group')
+            self.known = dict(state.get('known', {}))
+        except (OSError, ValueError, AttributeError, TypeError):
+            self.group = None
+            self.known = {}
+
+    def save(self):
+        # holds the group passphrase, so only readable by us
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                # the mode above only applies to a new file
+                os.fchmod(fd, 0o600)
+                json.dump({'group': self.group, 'known': self.known}, f, indent=2)
+        except OSError as e:
+            self.logger.warning("Can not write P2P state: {}".format(e))
+
+    @property
+    def network_id(self):
+        return self.group['network_id'] if self.group is not None else None
+
+    def persistent_network(self, networks):
+        """Network id of the stored group if wpa_supplicant still has it, from list_networks() rows."""
+        if self.group is None:
+            return None
+        for network_id, ssid, bssid, flags in networks:
+            if network_id == self.group['network_id'] and ssid == self.group['ssid'] and 'P2P-PERSISTENT' in flags:
+                return network_id
+        return None
+
+    def set_group(self, network_id, ssid, passphrase, go_dev_addr):
+        group = {'network_id': network_id, 'ssid': ssid, 'passphrase': passphrase, 'go_dev_addr': go_dev_addr}
+        if group != self.group:
+            if self.group is not None and self.group['ssid'] != ssid:
+                # sources only have the credentials of the old group
+                self.known = {}
+            self.group = group
+            self.save()
+
+    def add_known(self, address):
+        self.known[address.lower()] = int(time.time())
+        while len(self.known) > Settings.p2p_known_max:
+            del self.known[min(self.known, key=self.known.get)]
+        self.save()
+
+    def is_known(self, address):
+        return address is not None and address.lower() in self.known
@@ -0,0 +1,515 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+    Copyright (C) 2018 Hsun-Wei Cho
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Media pipeline. This is the only control plane module that needs GObject
+introspection, and it is imported when the first session starts.
+"""
+
+import threading
+from logging import getLogger
+from time import monotonic
+
+import gi  # GObject Introspection
+
+gi.require_version('Gst', '1.0')  # noqa: E402 # isort:skip
+from gi.repository import GLib, Gst  # noqa: E402 # isort:skip
+
+from .decoder import get_decoders, get_level, hold_decoder, mark_failed, release_decoder  # noqa: E402
+from .exceptions import PiCastException  # noqa: E402
+from .settings import Settings  # noqa: E402
+from .video import SessionFormat  # noqa: E402
+
+
+class GstPlayer:
+    """
+    Nutzt GStreamer zur Dekodierung und Anzeige des H.264- oder H.265-Videostreams
+    Bevorzugt Hardware-Decoder (V4L2, OMX, VA-API), mit Rückfall auf Software-Decoder
+    """
+    elements = ('udpsrc', 'identity', 'rtpjitterbuffer', 'rtpmp2tdepay', 'tsdemux', 'queue', 'videoconvert',
+                'autovideosink', 'audioconvert', 'audioresample', 'autoaudiosink')
+    # name and parser of each video codec
+    codecs = {
+        'h264': ('H.264', 'h264parse'),
+        'h265': ('H.265', 'h265parse'),
+    }
+    # caps of the audio streams of tsdemux and their parser
+    audio_codecs = {
+        'AAC': ('audio/mpeg', 'aacparse'),
+        'LPCM': ('audio/x-private-ts-lpcm', None),
+        'AC3': ('audio/x-ac3', 'ac3parse'),
+    }
+    # rebuilds after stream errors before the pipeline is given up
+    max_recoveries = 3
+
+    @classmethod
+    def preload(cls):
+        """Initialize GStreamer and load the plugins of the pipeline ahead of the first session."""
+        Gst.init(None)
+        names = list(cls.elements)
+        for codec, (name, parse) in cls.codecs.items():
+            decoders = get_decoders(codec)
+            if decoders:
+                names += [parse, decoders[0]]
+            else:
+                getLogger("PiCast:GstPlayer").info("No {} decoder available.".format(name))
+        for codec, (caps, parse) in cls.audio_codecs.items():
+            decoders = get_decoders(codec.lower())
+            if decoders:
+                names += [parse, decoders[0]] if parse else [decoders[0]]
+        for name in names:
+            factory = Gst.ElementFactory.find(name)
+            if factory is None or factory.load() is None:
+                getLogger("PiCast:GstPlayer").warning("GStreamer element {} is not available.".format(name))
+        cls.max_levels()  # fills the level cache for the first M3
+
+    @classmethod
+    def max_levels(cls):
+        """Highest level by codec of the preferred decoders; codecs without a decoder are left out.
+
+        Both the ranking and the levels come from the decoder cache, so this is cheap for each M3.
+        """
+        Gst.init(None)
+        levels = {}
+        for codec in cls.codecs:
+            decoders = get_decoders(codec)
+            if decoders:
+                levels[codec] = get_level(codec, decoders[0]) or Settings.max_level[codec]
+        return levels
+
+    @staticmethod
+    def can_link(src_name, sink_name):
+        """True when the pad templates of two element factories have caps in common; ANY does not count."""
+        src = Gst.ElementFactory.find(src_name)
+        sink = Gst.ElementFactory.find(sink_name)
+        if src is None or sink is None:
+            return False
+        src_caps = Gst.Caps.new_empty()
+        for template in src.get_static_pad_templates():
+            if template.direction == Gst.PadDirection.SRC:
+                src_caps = src_caps.merge(template.get_caps())
+        sink_caps = Gst.Caps.new_empty()
+        for template in sink.get_static_pad_templates():
+            if template.direction == Gst.PadDirection.SINK:
+                sink_caps = sink_caps.merge(template.get_caps())
+        if src_caps.is_any() or sink_caps.is_any():
+            return False
+        return src_caps.can_intersect(sink_caps)
+
+    def __init__(self, rtp_port, on_loss=None, fmt=None, capture=None, on_rtp_timeout=None, decoder=None,
+                 window=None):
+        """on_loss(reason) is called, from any thread, when a picture was lost or damaged.
+
+        on_rtp_timeout() is called from the GLib main loop every Settings.rtp_timeout
+        seconds while no RTP packet arrives.
+
+        fmt is the SessionFormat the source selected, H.264 of unknown size by default,
+        decoder the one to start with when it is a candidate for fmt.
+        With a CaptureWriter as capture, the received RTP packets are recorded.
+        window, a Gtk window, is sized to the resolution of fmt.
+        """
+        self.logger = getLogger("PiCast:GstPlayer")
+        self.on_loss = on_loss
+        self.on_rtp_timeout = on_rtp_timeout
+        self.prepared = False
+        self.playing = False
+        self.play_time = None
+        self.ttff = None  # seconds from PLAY to the first frame at the video sink
+        self.probes = {}  # one-shot probes installed by run(), by pad
+        self.qos_count = 0
+        self.capture = capture
+        self.window = window
+        self.holding = None  # decoder this pipeline holds while above NULL
+        self.recoveries = 0  # rebuilds after stream errors since the last first frame
+        self.rtp_port = rtp_port
+        # prepare() runs in an executor, rebuilds after errors in the GLib main loop
+        self.lock = threading.RLock()
+        self.set_format(fmt or SessionFormat(), decoder)
+
+    def set_format(self, fmt, decoder=None):
+        """Build the pipeline for the format, replacing one built for another codec."""
+        with self.lock:
+            decoders = get_decoders(fmt.codec)
+            if not decoders:
+                raise PiCastException("No {} decoder available.".format(self.codecs[fmt.codec][0]))
+            if hasattr(self, 'pipeline'):
+                self.release()
+            self.format = fmt
+            self.codec = fmt.codec
+            self.decoders = decoders
+            self.build(decoder if decoder in decoders else decoders[0])
+
+    def build(self, decoder_name, convert=None):
+        """Build the pipeline; videoconvert is left out when the decoder output fits the sink, unless convert.
+
+        The source sends MPEG2-TS in RTP (payload type 33). tsdemux splits it
+        into elementary streams, each of which goes through its own bounded
+        queue, so a full audio branch never holds up the video.
+        """
+        self.decoder_name = decoder_name
+        if convert is None:
+            convert = not self.can_link(decoder_name, Settings.video_sink.split()[0])
+        self.convert = convert
+        fmt = self.format
+        jitter = Settings.jitter_profiles[Settings.jitter_profile]
+        parse = self.codecs[self.codec][1]
+        gstcommand = "udpsrc port={0:d} caps=\"application/x-rtp, media=video, clock-rate=90000, " \
+                     "encoding-name=MP2T, payload=33\" timeout={1:d} name=rtpsrc "\
+            .format(self.rtp_port, int(Settings.rtp_timeout * Gst.SECOND))
+        gstcommand += "! identity name=meter silent=true "
+        gstcommand += "! rtpjitterbuffer name=jitterbuffer do-lost=true latency={0:d} drop-on-latency={1} mode={2} "\
+            .format(jitter['latency'], 'true' if jitter['drop-on-latency'] else 'false', jitter['mode'])
+        gstcommand += "! rtpmp2tdepay name=depay ! tsdemux name=demux "
+        # video branch
+        gstcommand += "demux. ! {0} ! queue max-size-buffers=0 max-size-bytes=0 max-size-time={1:d} " \
+                      "! {2} name=parse ".format(fmt.media_type, Settings.video_queue_time * Gst.MSECOND, parse)
+        gstcommand += "! {0} ! {1} name=decoder ".format(fmt.caps(), decoder_name)
+        if convert:
+            gstcommand += "! videoconvert "
+        gstcommand += "! {0} name=videosink ".format(Settings.video_sink)
+        gstcommand += self.audio_branch(fmt)
+        self.logger.debug("pipeline: {}".format(gstcommand))
+        self.pipeline = Gst.parse_launch(gstcommand)
+        self.jitterbuffer = self.pipeline.get_by_name('jitterbuffer')
+        self.meter = self.pipeline.get_by_name('meter')
+        if self.capture is not None:
+            pad = self.pipeline.get_by_name('rtpsrc').get_static_pad('src')
+            pad.add_probe(Gst.PadProbeType.BUFFER, self.on_capture_buffer)
+        self.depay = self.pipeline.get_by_name('depay')
+        self.parse = self.pipeline.get_by_name('parse')
+        self.decoder = self.pipeline.get_by_name('decoder')
+        self.videosink = self.pipeline.get_by_name('videosink')
+        self.audiosink = self.pipeline.get_by_name('audiosink')
+        if self.audiosink is not None:
+            self.configure_audio_sink(self.audiosink)
+            if isinstance(self.audiosink, Gst.Bin):
+                self.audiosink.connect('deep-element-added', lambda bin, sub_bin, element:
+                                       self.configure_audio_sink(element))
+        self.depay.get_static_pad('sink').add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self.on_rtp_event)
+        self.bus = self.pipeline.get_bus()
+        self.bus.add_signal_watch()
+        self.bus.connect('message::eos', self.on_eos)
+        self.bus.connect('message::error', self.on_error)
+        self.bus.connect('message::warning', self.on_warning)
+        self.bus.connect('message::qos', self.on_qos)
+        self.bus.connect('message::element', self.on_element)
+
+        self.bus.enable_sync_message_emission()
+        self.bus.connect('sync-message::element', self.on_sync_message)
+        self.bus.connect('message', self.on_message)
+
+    def audio_branch(self, fmt):
+        """Audio part of the pipeline description, empty without audio or a decoder for it."""
+        if fmt.audio is None:
+            return ''
+        caps, parse = self.audio_codecs[fmt.audio[0]]
+        decoders = get_decoders(fmt.audio[0].lower())
+        if not decoders:
+            self.logger.warning("No {} decoder available, playing without sound.".format(fmt.audio[0]))
+            return ''
+        branch = "demux. ! {0} ! queue max-size-buffers=0 max-size-bytes=0 max-size-time={1:d} leaky=downstream " \
+                 "".format(caps, Settings.audio_queue_time * Gst.MSECOND)
+        if parse is not None:
+            branch += "! {0} ".format(parse)
+        branch += "! {0} name=audiodecoder ! audioconvert ! audioresample ! {1} name=audiosink".format(
+            decoders[0], Settings.audio_sink)
+        return branch
+
+    def configure_audio_sink(self, element):
+        """Small buffer, and slaved to the pipeline clock, which follows the timestamps of the stream."""
+        if element.find_property('buffer-time') is None:
+            return
+        element.set_property('buffer-time', Settings.audio_buffer_time * 1000)
+        element.set_property('latency-time', Settings.audio_latency_time * 1000)
+        element.set_property('provide-clock', False)
+        Gst.util_set_object_arg(element, 'slave-method', Settings.audio_slave_method)
+
+    def is_audio(self, element):
+        while element is not None and element != self.pipeline:
+            if element.get_name() in ('audiodecoder', 'audiosink'):
+                return True
+            element = element.get_parent()
+        return False
+
+    def av_offset(self):
+        """Position of the audio sink minus that of the video sink in ms; None without audio or before playing."""
+        if self.audiosink is None or not self.playing:
+            return None
+        ok_audio, audio = self.audiosink.query_position(Gst.Format.TIME)
+        ok_video, video = self.videosink.query_position(Gst.Format.TIME)
+        if not ok_audio or not ok_video:
+            return None
+        return (audio - video) / Gst.MSECOND
+
+    def release(self):
+        self.stop()
+        self.bus.remove_signal_watch()
+        self.bus.disable_sync_message_emission()
+
+    def fallback(self):
+        """Add videoconvert, or else replace the decoder with the next candidate; False when none is left."""
+        with self.lock:
+            if not self.convert:
+                self.logger.warning("{} failed without videoconvert, adding it".format(self.decoder_name))
+                self.rebuild(self.decoder_name, convert=True)
+                return True
+            self.drop_decoder()
+            if not mark_failed(self.decoder_name):
+                self.logger.warning("{} is busy in another pipeline".format(self.decoder_name))
+            index = self.decoders.index(self.decoder_name) + 1
+            if index >= len(self.decoders):
+                self.logger.error("No working {} decoder, {} was the last one.".format(
+                    self.codecs[self.codec][0], self.decoder_name))
+                return False
+            self.logger.warning("Decoder {} failed, falling back to {}".format(self.decoder_name, self.decoders[index]))
+            self.rebuild(self.decoders[index])
+            return True
+
+    def rebuild(self, decoder_name, convert=None):
+        with self.lock:
+            was_playing = self.playing
+            self.release()
+            self.build(decoder_name, convert)
+            self.prepare()
+            if was_playing:
+                self.run(since=self.play_time)
+
+    def on_message(self, bus, message):
+        pass
+
+    def prepare(self, fmt=None):
+        """Allocate decoder and sink ahead of PLAY, so that starting is only a state change.
+
+        With fmt, the pipeline is first rebuilt for it if its codec or audio differs, and the
+        window is sized to its resolution; the decoded size is negotiated from the stream.
+
+        A live pipeline does not preroll, so PAUSED is reached without data.
+        """
+        with self.lock:
+            if fmt is not None:
+                if (fmt.codec, fmt.audio) != (self.format.codec, self.format.audio):
+                    self.set_format(fmt)
+                else:
+                    self.format = fmt
+                self.resize_window()
+            if self.prepared:
+                return
+            if self.pipeline.set_state(Gst.State.PAUSED) == Gst.StateChangeReturn.FAILURE:
+                self.logger.error('Can not bring pipeline to PAUSED with {}.'.format(self.decoder_name))
+                self.fallback()
+                return
+            self.prepared = True
+            self.take_decoder()
+
+    def resize_window(self):
+        res = self.format.res
+        if self.window is not None and res is not None:
+            # Gtk is only used from the main loop
+            GLib.idle_add(self.window.resize, res.width, res.height)
+
+    def run(self, since=None):
+        """Start playing; time to first frame is measured from since (monotonic), default now."""
+        with self.lock:
+            if self.playing:
+                return
+            # hold back pictures until the first IDR after (re)join
+            self.add_oneshot_probe(self.parse.get_static_pad('src'), self.on_wait_idr)
+            self.play_time = since if since is not None else monotonic()
+            self.ttff = None
+            self.add_oneshot_probe(self.videosink.get_static_pad('sink'), self.on_first_frame)
+            self.playing = True
+            self.take_decoder()
+            if self.pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+                self.logger.error('Can not bring pipeline to PLAYING with {}.'.format(self.decoder_name))
+                self.fallback()
+
+    def add_oneshot_probe(self, pad, callback):
+        """Buffer probe that removes itself by returning Gst.PadProbeReturn.REMOVE."""
+        self.remove_probe(pad)
+        self.probes[pad] = pad.add_probe(Gst.PadProbeType.BUFFER, callback)
+
+    def remove_probe(self, pad):
+        probe = self.probes.pop(pad, None)
+        if probe is not None:
+            pad.remove_probe(probe)
+
+    def on_first_frame(self, pad, info):
+        self.probes.pop(pad, None)
+        self.ttff = monotonic() - self.play_time
+        self.recoveries = 0
+        self.logger.info('time to first frame: {:.1f} ms'.format(self.ttff * 1000))
+        return Gst.PadProbeReturn.REMOVE
+
+    def set_jitter_latency(self, latency):
+        """Change the jitter buffer latency (ms) of a running session."""
+        self.jitterbuffer.set_property('latency', latency)
+
+    def jitter_stats(self):
+        """Counters of the jitter buffer; percent is its current fill level."""
+        stats = self.jitterbuffer.get_property('stats')
+        result = {'percent': self.jitterbuffer.get_property('percent')}
+        for field in ('num-pushed', 'num-lost', 'num-late', 'num-duplicates', 'avg-jitter'):
+            ok, value = stats.get_uint64(field)
+            result[field.replace('num-', '').replace('-', '_')] = value if ok else None
+        return result
+
+    def stats(self):
+        """Pipeline metrics from element properties and queries; rates are left to the caller."""
+        jitter = self.jitter_stats()
+        result = {
+            'packets_received': jitter['pushed'],
+            'packets_lost': jitter['lost'],
+            'packets_late': jitter['late'],
+            'jitter': jitter['avg_jitter'] / Gst.SECOND if jitter['avg_jitter'] is not None else None,
+            'jitterbuffer_fill': jitter['percent'] / 100,
+            'qos_messages': self.qos_count,
+            'av_offset': None,
+        }
+        received = None
+        if self.meter.find_property('stats') is not None:
+            ok, received = self.meter.get_property('stats').get_uint64('num-bytes')
+            received = received if ok else None
+        result['bytes_received'] = received
+        sink = self.sink_with_stats()
+        rendered = dropped = None
+        if sink is not None:
+            stats = sink.get_property('stats')
+            ok, rendered = stats.get_uint64('rendered')
+            rendered = rendered if ok else None
+            ok, dropped = stats.get_uint64('dropped')
+            dropped = dropped if ok else None
+        result['frames_rendered'] = rendered
+        result['frames_dropped'] = dropped
+        result['latency'] = None
+        query = Gst.Query.new_latency()
+        if self.playing and self.pipeline.query(query):
+            live, min_latency, max_latency = query.parse_latency()
+            result['latency'] = min_latency / Gst.SECOND
+        offset = self.av_offset()
+        result['av_offset'] = offset / 1000 if offset is not None else None
+        return result
+
+    def sink_with_stats(self):
+        """The video sink, or the sink autovideosink picked, if it has the stats property."""
+        if self.videosink.find_property('stats') is not None:
+            return self.videosink
+        if isinstance(self.videosink, Gst.Bin):
+            for element in self.videosink.iterate_recurse():
+                if element.find_property('stats') is not None:
+                    return element
+        return None
+
+    def on_capture_buffer(self, pad, info):
+        # a Python call per packet, only installed while capturing
+        buffer = info.get_buffer()
+        self.capture.rtp_in(buffer.extract_dup(0, buffer.get_size()))
+        return Gst.PadProbeReturn.OK
+
+    def report_loss(self, reason):
+        if self.on_loss is not None:
+            self.on_loss(reason)
+
+    def on_rtp_event(self, pad, info):
+        """The jitter buffer sends a GstRTPPacketLost event for packets it gave up on."""
+        structure = info.get_event().get_structure()
+        if structure is not None and structure.get_name() == 'GstRTPPacketLost':
+            self.report_loss('RTP packet lost')
+        return Gst.PadProbeReturn.OK
+
+    def on_wait_idr(self, pad, info):
+        if info.get_buffer().has_flags(Gst.BufferFlags.DELTA_UNIT):
+            self.report_loss('waiting for first IDR')
+            return Gst.PadProbeReturn.DROP
+        self.probes.pop(pad, None)
+        self.logger.debug('first IDR received')
+        return Gst.PadProbeReturn.REMOVE
+
+    def stop(self, keep=False):
+        """Stop playing; with keep the pipeline only goes to READY, keeping its elements and socket for reuse."""
+        with self.lock:
+            for pad in list(self.probes):
+                self.remove_probe(pad)
+            self.pipeline.set_state(Gst.State.READY if keep else Gst.State.NULL)
+            if not keep:
+                self.drop_decoder()
+            self.prepared = False
+            self.playing = False
+            self.qos_count = 0
+
+    def take_decoder(self):
+        if self.holding is None:
+            self.holding = self.decoder_name
+            hold_decoder(self.holding)
+
+    def drop_decoder(self):
+        if self.holding is not None:
+            release_decoder(self.holding)
+            self.holding = None
+
+    def on_sync_message(self, bus, msg):
+        if msg.get_structure().get_name() == 'prepare-window-handle':
+            if hasattr(self, 'xid'):
+                msg.src.set_window_handle(self.xid)
+
+    def on_eos(self, bus, msg):
+        self.logger.debug('on_eos(): seeking to start of video')
+        self.pipeline.seek_simple(
+            Gst.Format.TIME,
+            Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT,
+            0
+        )
+
+    def on_error(self, bus, msg):
+        self.logger.debug('on_error():{}'.format(msg.parse_error()))
+        if self.is_audio(msg.src):
+            self.logger.warning('audio failed: {}'.format(msg.parse_error()[0]))
+        elif msg.src == self.decoder:
+            if self.playing and self.ttff is None:
+                # the decoder never produced a picture
+                self.fallback()
+            else:
+                self.report_loss('decoder error')
+        else:
+            # e.g. not-negotiated after the stream changed size; a new pipeline negotiates again
+            self.recover('{}: {}'.format(msg.src.get_name(), msg.parse_error()[0]))
+
+    def recover(self, reason):
+        with self.lock:
+            if self.recoveries >= self.max_recoveries:
+                self.logger.error('giving up after {} rebuilds: {}'.format(self.recoveries, reason))
+                return
+            self.recoveries += 1
+            self.logger.warning('rebuilding the pipeline: {}'.format(reason))
+            self.rebuild(self.decoder_name, self.convert)
+            self.report_loss(reason)
+
+    def on_warning(self, bus, msg):
+        self.logger.debug('on_warning():{}'.format(msg.parse_warning()))
+        if msg.src == self.decoder:
+            self.report_loss('decoder warning')
+
+    def on_element(self, bus, msg):
+        # udpsrc posts GstUDPSrcTimeout after each timeout period without a packet
+        if msg.get_structure().get_name() == 'GstUDPSrcTimeout' and self.on_rtp_timeout is not None:
+            self.on_rtp_timeout()
+
+    def on_qos(self, bus, msg):
+        if self.is_audio(msg.src):
+            return
+        self.qos_count += 1
+        self.report_loss('QoS from {}'.format(msg.src.get_name()))
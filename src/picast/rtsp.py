@@ -0,0 +1,257 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+RTSP message codec.
+
+RtspFramer cuts a byte stream into complete messages using the header
+terminator and Content-Length, so split, coalesced and large messages are
+all handled. Messages are serialized with rtsp_request()/rtsp_response().
+"""
+
+from time import monotonic
+
+HEADER_END = b'\r\n\r\n'
+
+
+class RtspError(Exception):
+    pass
+
+
+class RtspMessage:
+    """A parsed RTSP request or response. Header names are stored lower-cased."""
+
+    __slots__ = ('method', 'url', 'status', 'reason', 'headers', 'body', '_parameters')
+
+    def __init__(self, method=None, url=None, status=None, reason=None, headers=None, body=b''):
+        self.method = method
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers if headers is not None else {}
+        self.body = body
+        self._parameters = None
+
+    @property
+    def is_request(self):
+        return self.method is not None
+
+    @property
+    def cseq(self):
+        try:
+            return int(self.headers['cseq'])
+        except (KeyError, ValueError):
+            raise RtspError("Message without valid CSeq: {}".format(self))
+
+    def get(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    @property
+    def parameters(self):
+        """text/parameters body as a dict, parsed on first access."""
+        if self._parameters is None:
+            self._parameters = parse_parameters(self.body)
+        return self._parameters
+
+    def to_bytes(self):
+        if self.is_request:
+            return rtsp_request(self.method, self.url, self.cseq, self._extra_headers(), self.body)
+        return rtsp_response(self.cseq, self.status, self.reason, self._extra_headers(), self.body)
+
+    def _extra_headers(self):
+        return [(k, v) for k, v in self.headers.items() if k not in ('cseq', 'content-length')]
+
+    def __repr__(self):
+        if self.is_request:
+            return "RtspMessage({} {} CSeq={})".format(self.method, self.url, self.headers.get('cseq'))
+        return "RtspMessage({} {} CSeq={})".format(self.status, self.reason, self.headers.get('cseq'))
+
+
+def parse_parameters(body):
+    """Parse a text/parameters body ('name: value' per line) into a dict."""
+    params = {}
+    for line in body.decode('UTF-8', 'replace').splitlines():
+        name, sep, value = line.partition(':')
+        if sep:
+            params[name.strip()] = value.strip()
+        elif name.strip():
+            params[name.strip()] = None
+    return params
+
+
+def parse_header_params(value):
+    """Split a header such as Transport or Session into its value and ';' parameters."""
+    first, *rest = value.split(';')
+    params = {}
+    for item in rest:
+        k, sep, v = item.partition('=')
+        params[k.strip()] = v.strip() if sep else None
+    return first.strip(), params
+
+
+def _serialize(start_line, cseq, headers, body):
+    if isinstance(body, str):
+        body = body.encode('UTF-8')
+    lines = [start_line, 'CSeq: {:d}'.format(cseq)]
+    lines.extend('{}: {}'.format(k, v) for k, v in headers)
+    if body:
+        lines.append('Content-Length: {:d}'.format(len(body)))
+    lines.append('\r\n')
+    return '\r\n'.join(lines).encode('UTF-8') + body
+
+
+def rtsp_request(method, url, cseq, headers=(), body=b''):
+    """Serialize a request; Content-Length is added when there is a body."""
+    return _serialize('{} {} RTSP/1.0'.format(method, url), cseq, headers, body)
+
+
+def rtsp_response(cseq, status=200, reason='OK', headers=(), body=b''):
+    """Serialize a response; Content-Length is added when there is a body."""
+    return _serialize('RTSP/1.0 {:d} {}'.format(status, reason), cseq, headers, body)
+
+
+class RtspFramer:
+    """Incremental framer over a bytearray receive buffer.
+
+    feed() appends received bytes, next_message() returns a complete
+    RtspMessage or None when more data is needed.
+    """
+
+    def __init__(self, max_message_size=65536):
+        self.max_message_size = max_message_size
+        self.buffer = bytearray()
+        self.pos = 0
+        self._head = None  # (start_line, headers, body_start, content_length) of a message awaiting its body
+
+    def feed(self, data):
+        if self.pos and self.pos == len(self.buffer):
+            self.buffer.clear()
+            self.pos = 0
+        self.buffer += data
+
+    def __iter__(self):
+        msg = self.next_message()
+        while msg is not None:
+            yield msg
+            msg = self.next_message()
+
+    def next_message(self):
+        if self._head is None:
+            # tolerate stray CRLF between messages
+            while self.buffer.startswith(b'\r\n', self.pos):
+                self.pos += 2
+            end = self.buffer.find(HEADER_END, self.pos)
+            if end < 0:
+                if len(self.buffer) - self.pos > self.max_message_size:
+                    raise RtspError("RTSP header exceeds {} bytes".format(self.max_message_size))
+                return None
+            self._head = self._parse_head(end)
+        start_line, headers, body_start, length = self._head
+        body_end = body_start + length
+        if len(self.buffer) < body_end:
+            return None
+        self._head = None
+        body = bytes(memoryview(self.buffer)[body_start:body_end])
+        self.pos = body_end
+        if self.pos > self.max_message_size:
+            del self.buffer[:self.pos]
+            self.pos = 0
+        return self._build(start_line, headers, body)
+
+    def _parse_head(self, end):
+        text = bytes(memoryview(self.buffer)[self.pos:end]).decode('UTF-8', 'replace')
+        lines = text.split('\r\n')
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise RtspError("Bad Content-Length: {}".format(headers['content-length']))
+        if length < 0 or length > self.max_message_size:
+            raise RtspError("Bad Content-Length: {}".format(length))
+        return lines[0], headers, end + len(HEADER_END), length
+
+    @staticmethod
+    def _build(start_line, headers, body):
+        parts = start_line.split(' ', 2)
+        if start_line.startswith('RTSP/'):
+            if len(parts) < 2 or not parts[1].isdigit():
+                raise RtspError("Bad status line: {}".format(start_line))
+            return RtspMessage(status=int(parts[1]), reason=parts[2] if len(parts) > 2 else '',
+                               headers=headers, body=body)
+        if len(parts) != 3:
+            raise RtspError("Bad request line: {}".format(start_line))
+        return RtspMessage(method=parts[0], url=parts[1], headers=headers, body=body)
+
+
+class RtspConnection:
+    """Message level wrapper around an asyncio stream pair."""
+
+    def __init__(self, reader, writer, cseq=100):
+        self.reader = reader
+        self.writer = writer
+        self.framer = RtspFramer()
+        self.cseq = cseq  # next CSeq for requests originated by us
+        self.sent = {}  # send time of our requests awaiting a response, by CSeq header value
+        self.rtt = None  # seconds from our last answered request to its response
+        self.wait_time = 0.0  # seconds spent waiting for data from the peer
+        self.capture = None  # CaptureWriter recording the bytes in both directions
+
+    async def recv(self):
+        """Return the next message, or None when the peer closed the connection."""
+        msg = self.framer.next_message()
+        while msg is None:
+            start = monotonic()
+            data = await self.reader.read(4096)
+            self.wait_time += monotonic() - start
+            if not data:
+                return None
+            if self.capture is not None:
+                self.capture.rtsp_in(data)
+            self.framer.feed(data)
+            msg = self.framer.next_message()
+        if not msg.is_request:
+            sent = self.sent.pop(msg.headers.get('cseq'), None)
+            if sent is not None:
+                self.rtt = monotonic() - sent
+        return msg
+
+    async def send(self, data):
+        if self.capture is not None:
+            self.capture.rtsp_out(data)
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def next_cseq(self):
+        cseq = self.cseq
+        self.cseq += 1
+        return cseq
+
+    async def request(self, method, url, headers=(), body=b''):
+        cseq = self.next_cseq()
+        data = rtsp_request(method, url, cseq, headers, body)
+        self.sent[str(cseq)] = monotonic()
+        await self.send(data)
+        return data
+
+    async def respond(self, request, status=200, reason='OK', headers=(), body=b''):
+        data = rtsp_response(request.cseq, status, reason, headers, body)
+        await self.send(data)
+        return data
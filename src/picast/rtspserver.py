@@ -0,0 +1,653 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+    Copyright (C) 2018 Hsun-Wei Cho
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+RTSP control plane of the WFD sink.
+
+PiCast accepts connections from sources and runs an RtspSession for each of
+them on one asyncio event loop.
+"""
+
+import asyncio
+import os
+from collections import OrderedDict
+import socket
+import time
+from logging import getLogger
+from time import monotonic
+
+from .capture import CaptureWriter
+from .deadline import Deadline
+from .exceptions import PiCastException
+from .metrics import NEGOTIATION, MetricsServer
+from .rtsp import RtspConnection, RtspError, parse_header_params
+from .settings import Settings
+from .video import SessionFormat, WfdVideoParameters
+
+
+class RtspSession:
+    """One WFD source: negotiation, control loop, RTP port, pipeline and deadlines.
+
+    The session ends when the source sends nothing, not even a keepalive, for
+    its session timeout plus Settings.keepalive_grace. RTP silence of
+    Settings.rtp_timeout requests an IDR, of Settings.rtp_teardown tears the
+    session down.
+    """
+
+    def __init__(self, conn, peeraddress, rtp_port, player=None, cached=None, window=None):
+        """player is a warm GstPlayer to reuse, cached the (format, decoder) of the peer's last session.
+
+        window is the Gtk window that is sized to the mode the source selects.
+        """
+        self.logger = getLogger("PiCast.session")
+        self.conn = conn
+        self.peeraddress = peeraddress
+        self.rtp_port = rtp_port
+        self.loop = asyncio.get_running_loop()
+        self.idr_event = asyncio.Event()
+        self.idr = IdrRequester(self.loop, self.idr_event)
+        self.expired = asyncio.Event()
+        self.expiry = None  # why the session expired
+        self.rtsp_timeout = Settings.watchdog_timeout
+        self.rtsp_deadline = Deadline(self.loop, self.rtsp_timeout, self.on_rtsp_timeout)
+        self.rtp_deadline = Deadline(self.loop, Settings.rtp_teardown, self.on_rtp_teardown)
+        self.rtp_silent = None  # loop time of the last RTP timeout
+        self.rtp_timeouts = 0  # silent periods
+        self.sessionid = None
+        self.capture = None
+        if Settings.capture_dir is not None:
+            name = '{}-{}.wfdcap.gz'.format(peeraddress, time.strftime('%Y%m%d-%H%M%S'))
+            try:
+                self.capture = CaptureWriter(os.path.join(Settings.capture_dir, name))
+            except OSError as e:
+                self.logger.warning("Can not record the session: {}".format(e))
+            else:
+                conn.capture = self.capture
+                self.logger.info("Recording the session to {}".format(self.capture.path))
+        if player is not None:
+            player.on_loss = self.idr.request
+            player.on_rtp_timeout = self.report_rtp_timeout
+        self.player = player  # built by negotiate() when there is no warm one
+        self.building = None  # future of build_player() in the executor
+        self.window = window
+        self.cached = cached
+        self.finished = False  # ended by TEARDOWN or disconnect of the source
+        self.play_time = None
+        self.format = SessionFormat()
+        self.source = 'unknown'  # User-Agent of the source, labels the negotiation timings
+        self.timings = []  # (step, seconds waiting for the source, seconds in the sink)
+
+    async def cast_seq_m1(self, conn):
+        logger = getLogger("PiCast.m1")
+        req = await self.expect(conn, 'OPTIONS')
+        logger.debug("<-{}".format(req))
+        agent = req.get('User-Agent')
+        if agent:
+            self.source = agent.split()[0]
+        s_data = await conn.respond(req, headers=[("Public", "org.wfa.wfd1.0, SET_PARAMETER, GET_PARAMETER")])
+        logger.debug("->{}".format(s_data))
+
+    async def cast_seq_m2(self, conn):
+        logger = getLogger("PiCast.m2")
+        s_data = await conn.request('OPTIONS', '*', headers=[('Require', 'org.wfa.wfd1.0')])
+        logger.debug("->{}".format(s_data))
+        resp = await self.expect(conn)
+        logger.debug("<-{}".format(resp))
+
+    async def cast_seq_m3(self, conn):
+        logger = getLogger("PiCast.m3")
+        req = await self.expect(conn, 'GET_PARAMETER')
+        logger.debug("<-{}".format(req))
+        msg = "wfd_client_rtp_ports: RTP/AVP/UDP;unicast {} 0 mode=play\r\n".format(self.rtp_port)\
+              + WfdVideoParameters(Settings.display_modes, self.player.max_levels()).get_video_parameter()
+        m3resp = await conn.respond(req, headers=[('Content-Type', 'text/parameters')], body=msg)
+        logger.debug("->{}".format(m3resp))
+
+    async def cast_seq_m4(self, conn):
+        logger = getLogger("PiCast.m4")
+        req = await self.expect(conn, 'SET_PARAMETER')
+        logger.debug("<-{} {}".format(req, req.parameters))
+        self.format = SessionFormat.from_parameters(req.parameters)
+        logger.info("source selected {}".format(self.format))
+        s_data = await conn.respond(req)
+        logger.debug("->{}".format(s_data))
+
+    async def cast_seq_m5(self, conn):
+        logger = getLogger("PiCast.m5")
+        req = await self.expect(conn, 'SET_PARAMETER')
+        logger.debug("<-{} {}".format(req, req.parameters))  # wfd-triggered-method
+        s_data = await conn.respond(req)
+        logger.debug("->{}".format(s_data))
+
+    async def cast_seq_m6(self, conn):
+        logger = getLogger("PiCast.m6")
+        m6req = await conn.request('SETUP', self.presentation_url(),
+                                   headers=[('Transport',
+                                             'RTP/AVP/UDP;unicast;client_port={0:d}'.format(self.rtp_port))])
+        logger.debug("->{}".format(m6req))
+        resp = await self.expect(conn)
+        logger.debug("<-{}".format(resp))
+        transport, params = parse_header_params(resp.get('Transport', ''))
+        logger.debug("server port {}".format(params.get('server_port')))
+        session = resp.get('Session')
+        if session is None:
+            raise PiCastException("No session in SETUP response.")
+        sessionid, params = parse_header_params(session)
+        try:
+            self.rtsp_timeout = int(params['timeout']) + Settings.keepalive_grace
+        except (KeyError, TypeError, ValueError):
+            self.rtsp_timeout = Settings.watchdog_timeout
+        return sessionid
+
+    async def cast_seq_m7(self, conn, sessionid):
+        logger = getLogger("PiCast.m7")
+        self.play_time = monotonic()
+        m7req = await conn.request('PLAY', self.presentation_url(),
+                                   headers=[('Session', sessionid)])
+        logger.debug("->{}".format(m7req))
+        resp = await self.expect(conn)
+        logger.debug("<-{}".format(resp))
+
+    def presentation_url(self):
+        return self.format.presentation_url or 'rtsp://{0:s}/wfd1.0/streamid=0'.format(self.peeraddress)
+
+    async def expect(self, conn, method=None):
+        """Receive the next message during negotiation, checking it is what the sequence expects."""
+        msg = await conn.recv()
+        if msg is None:
+            raise PiCastException("Source closed connection during negotiation.")
+        if method is None:
+            if msg.is_request or msg.status != 200:
+                raise PiCastException("Unexpected reply from source: {}".format(msg))
+        elif msg.method != method:
+            raise PiCastException("Expected {} from source but got {}".format(method, msg))
+        return msg
+
+    async def send_idr_request(self, conn):
+        logger = getLogger("PiCast.daemon.idr")
+        idrreq = await conn.request("SET_PARAMETER", "rtsp://localhost/wfd1.0",
+                                    headers=[('Content-Type', 'text/parameters')], body='wfd-idr-request\r\n')
+        logger.debug("idreq: {}".format(idrreq))
+
+    def metrics(self):
+        """Samples of (name, labels, value) of this session."""
+        labels = {'peer': self.peeraddress, 'port': self.rtp_port}
+        stats = self.player.stats() if self.player is not None else {}  # still being built
+        names = (
+            ('picast_rtp_packets_received_total', 'packets_received'),
+            ('picast_rtp_packets_lost_total', 'packets_lost'),
+            ('picast_rtp_packets_late_total', 'packets_late'),
+            ('picast_rtp_jitter_seconds', 'jitter'),
+            ('picast_rtp_received_bytes_total', 'bytes_received'),
+            ('picast_jitterbuffer_fill_ratio', 'jitterbuffer_fill'),
+            ('picast_frames_rendered_total', 'frames_rendered'),
+            ('picast_frames_dropped_total', 'frames_dropped'),
+            ('picast_qos_messages_total', 'qos_messages'),
+            ('picast_pipeline_latency_seconds', 'latency'),
+            ('picast_av_offset_seconds', 'av_offset'),
+        )
+        samples = [(name, labels, stats.get(key)) for name, key in names]
+        samples += [
+            ('picast_idr_requests_total', labels, self.idr.count),
+            ('picast_rtp_timeouts_total', labels, self.rtp_timeouts),
+            ('picast_rtsp_deadline_seconds', labels, self.rtsp_deadline.remaining()),
+            ('picast_rtsp_rtt_seconds', labels, self.conn.rtt),
+        ]
+        return samples
+
+    def expire(self, reason):
+        self.expiry = reason
+        self.expired.set()
+
+    def on_rtsp_timeout(self):
+        self.expire("no message from the source for {} s".format(self.rtsp_timeout))
+
+    def report_rtp_timeout(self):
+        try:
+            self.loop.call_soon_threadsafe(self.on_rtp_timeout)
+        except RuntimeError:
+            pass  # session already finished
+
+    def on_rtp_timeout(self):
+        """udpsrc saw no packet for Settings.rtp_timeout; repeats while the silence lasts."""
+        now = self.loop.time()
+        if self.rtp_silent is None or now - self.rtp_silent > 1.5 * Settings.rtp_timeout:
+            self.rtp_timeouts += 1
+            self.logger.warning("no RTP for {} s, requesting an IDR".format(Settings.rtp_timeout))
+            self.idr.request('no RTP')
+            if Settings.rtp_teardown is not None:
+                self.rtp_deadline.start(max(0, Settings.rtp_teardown - Settings.rtp_timeout))
+        self.rtp_silent = now
+
+    def on_rtp_teardown(self):
+        if self.loop.time() - self.rtp_silent > 1.5 * Settings.rtp_timeout:
+            self.logger.info("RTP recovered")
+            return
+        self.expire("no RTP for {} s".format(Settings.rtp_teardown))
+
+    async def negotiate(self, conn):
+        logger = getLogger("Picast.daemon")
+        logger.debug("---- Start negotiation ----")
+        self.timings = []
+        loop = asyncio.get_running_loop()
+        warming = None
+        if self.player is None:
+            # loading GStreamer and parsing the pipeline block, build it while M1 and M2 are in flight
+            self.building = loop.run_in_executor(None, self.build_player)
+        elif self.cached is not None:
+            # a returning peer most likely selects its last format again, prepare for it during M1-M4
+            warming = loop.run_in_executor(None, self.player.prepare)
+        await self.timed('m1', self.cast_seq_m1(conn))
+        await self.timed('m2', self.cast_seq_m2(conn))
+        if self.building is not None:
+            self.player = await self.timed('build', self.building)
+            if self.cached is not None:
+                warming = loop.run_in_executor(None, self.player.prepare)
+        await self.timed('m3', self.cast_seq_m3(conn))
+        await self.timed('m4', self.cast_seq_m4(conn))
+        if warming is not None:
+            await self.timed('warm', warming)
+        # bring the pipeline up while the remaining round trips are in flight
+        prepare = loop.run_in_executor(None, self.player.prepare, self.format)
+        await self.timed('m5', self.cast_seq_m5(conn))
+        self.sessionid = await self.timed('m6', self.cast_seq_m6(conn))
+        await self.timed('prepare', prepare)
+        await self.timed('m7', self.cast_seq_m7(conn, self.sessionid))
+        logger.debug("---- Negotiation successful ----")
+        logger.info("negotiation with {} in {:.1f} ms (peer/sink): {}".format(
+            self.source, sum(peer + own for step, peer, own in self.timings) * 1000,
+            ', '.join('{} {:.1f}/{:.1f}'.format(step, peer * 1000, own * 1000) for step, peer, own in self.timings)))
+
+    def build_player(self):
+        """Build the player of the session; runs in an executor."""
+        from .player import GstPlayer  # loads GObject introspection with the first session
+        fmt, decoder = self.cached if self.cached is not None else (None, None)
+        return GstPlayer(self.rtp_port, on_loss=self.idr.request, fmt=fmt, capture=self.capture,
+                         on_rtp_timeout=self.report_rtp_timeout, decoder=decoder, window=self.window)
+
+    def stop_player(self):
+        """Stop the player, or the one still being built when the session ended early."""
+        if self.player is not None:
+            self.player.stop()
+        elif self.building is not None:
+            self.building.add_done_callback(stop_built_player)
+
+    async def timed(self, step, awaitable):
+        """Await a negotiation step, splitting its time into waiting for the source and work of the sink."""
+        start = monotonic()
+        waited = self.conn.wait_time
+        result = await awaitable
+        total = monotonic() - start
+        peer = self.conn.wait_time - waited
+        self.timings.append((step, peer, total - peer))
+        NEGOTIATION.observe({'step': step, 'part': 'peer', 'source': self.source}, peer)
+        NEGOTIATION.observe({'step': step, 'part': 'sink', 'source': self.source}, total - peer)
+        return result
+
+    async def rtspsrv(self, conn, idr_event):
+        """Serve the established session until TEARDOWN or disconnect.
+
+        Sleeps until either the source sends a message, an IDR request is
+        triggered or a deadline expires; there is no polling.
+        """
+        logger = getLogger("PiCast.rtspsrv")
+        recv_task = None
+        idr_task = None
+        expired_task = asyncio.ensure_future(self.expired.wait())
+        self.rtsp_deadline.start(self.rtsp_timeout)
+        try:
+            while True:
+                if recv_task is None:
+                    recv_task = asyncio.ensure_future(conn.recv())
+                if idr_task is None:
+                    idr_task = asyncio.ensure_future(idr_event.wait())
+                done, pending = await asyncio.wait({recv_task, idr_task, expired_task},
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if expired_task in done:
+                    logger.warning("session expired: {}".format(self.expiry))
+                    if self.rtsp_deadline.armed:
+                        # the source is still there, tell it
+                        await conn.request('TEARDOWN', self.presentation_url(), headers=[('Session', self.sessionid)])
+                    break
+                if idr_task in done:
+                    idr_task = None
+                    idr_event.clear()
+                    await self.send_idr_request(conn)
+                if recv_task not in done:
+                    continue
+                msg = recv_task.result()
+                recv_task = None
+                logger.debug("<-{}".format(msg))
+                self.rtsp_deadline.touch()
+                if msg is not None and msg.is_request:
+                    resp = await conn.respond(msg)
+                    logger.debug("->{}".format(resp))
+                if msg is None or msg.parameters.get('wfd_trigger_method') == 'TEARDOWN':
+                    self.finished = True
+                    break
+                elif 'wfd_video_formats' in msg.parameters or 'wfd2_video_formats' in msg.parameters:
+                    logger.info('start player')
+                    self.format = SessionFormat.from_parameters(msg.parameters, self.format)
+                    # building a pipeline for another codec takes long, keep the loop serving meanwhile
+                    await asyncio.get_running_loop().run_in_executor(None, self.player.prepare, self.format)
+                    self.player.run()
+        finally:
+            for task in (recv_task, idr_task, expired_task):
+                if task is not None:
+                    task.cancel()
+
+    async def run(self):
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: IdrTrigger(self.idr), local_addr=('127.0.0.1', 0))
+        try:
+            addr, idrsockport = transport.get_extra_info('sockname')
+            self.idrsockport = str(idrsockport)
+            await self.negotiate(self.conn)
+            self.player.run(since=self.play_time)
+            await self.rtspsrv(self.conn, self.idr_event)
+        finally:
+            transport.close()
+            self.idr.cancel()
+            self.rtsp_deadline.cancel()
+            self.rtp_deadline.cancel()
+            if self.capture is not None:
+                self.capture.close()
+
+
+def stop_built_player(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().stop()
+
+
+class RtpPortPool:
+    """RTP ports handed out to sessions; each session gets an even port and the odd one above it for RTCP."""
+
+    def __init__(self, base, count):
+        self.free = [base + 2 * i for i in range(count)]
+
+    def acquire(self):
+        if not self.free:
+            return None
+        return self.free.pop(0)
+
+    def release(self, port):
+        self.free.append(port)
+        self.free.sort()
+
+
+class PiCast:
+    """
+    Implementiert den RTSP-Server
+    Führt die Miracast-Protokollaushandlung durch
+    Verarbeitet laufende Kontrollanfragen
+
+    RTSP-Protokollablauf
+Die Miracast-Verbindung erfolgt über eine spezifische RTSP-Aushandlungssequenz:
+
+M1: Client sendet OPTIONS, Server antwortet mit unterstützten Methoden
+M2: Server sendet REQUIRE mit WFD-Unterstützungsanforderung
+M3: Client sendet GET_PARAMETER, Server antwortet mit unterstützten Videoformaten
+M4: Client sendet SET_PARAMETER mit gewähltem Format, Server bestätigt
+M5: Client sendet TRIGGERED-METHOD, Server bestätigt
+M6: Server initiiert SETUP für den Stream und erhält Session-ID
+M7: Server sendet PLAY, um die Übertragung zu starten
+    """
+    def __init__(self, window):
+        self.logger = getLogger("PiCast")
+        self.window = window
+        self.sessions = {}
+        self.ports = RtpPortPool(Settings.rtp_port, Settings.max_sessions)
+        self.cache = SessionCache(Settings.session_cache_size, self.ports.release)
+        self.leases = {}  # address: MAC address of the DHCP clients
+        self.loop = None  # event loop of serve()
+
+    def on_lease(self, event, lease):
+        """Lease events of the DHCP server, from its thread; handled on the event loop."""
+        args = (event, lease.address, lease.mac, lease.hostname)
+        loop = self.loop
+        if loop is None:
+            # not serving yet, nothing else uses the leases
+            self.update_lease(*args)
+            return
+        try:
+            loop.call_soon_threadsafe(self.update_lease, *args)
+        except RuntimeError:
+            pass  # serve() has finished
+
+    def update_lease(self, event, address, mac, hostname):
+        if event == 'bound':
+            self.leases[address] = mac
+            self.logger.info("Source {} has {}, expecting it on {}:{}".format(
+                hostname or mac, address, Settings.myaddress, Settings.rtsp_port))
+        elif event in ('released', 'expired') and self.leases.get(address) == mac:
+            del self.leases[address]
+            self.logger.debug("Source {} gave up {}".format(hostname or mac, address))
+
+    async def reject(self, conn):
+        msg = await conn.recv()
+        if msg is not None and msg.is_request:
+            await conn.respond(msg, 503, 'Service Unavailable')
+
+    async def handle_connection(self, reader, writer):
+        logger = getLogger("PiCast.daemon")
+        sock = writer.get_extra_info('socket')
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        peeraddress = writer.get_extra_info('peername')[0]
+        conn = RtspConnection(reader, writer)
+        key = peer_key(peeraddress, self.leases)
+        player = None
+        warm = self.cache.take_warm(key) if Settings.capture_dir is None else None
+        if warm is not None:
+            player, rtp_port = warm
+        else:
+            rtp_port = self.ports.acquire()
+            if rtp_port is None and self.cache.drop_warm():
+                rtp_port = self.ports.acquire()
+        session = None
+        try:
+            if rtp_port is None:
+                logger.info("Reject {}: {} sessions already active.".format(peeraddress, len(self.sessions)))
+                await self.reject(conn)
+                return
+            logger.info("Session from {} on RTP port {}{}".format(peeraddress, rtp_port,
+                                                                  ', warm' if player is not None else ''))
+            session = RtspSession(conn, peeraddress, rtp_port, player, self.cache.get(key), self.window)
+            self.sessions[rtp_port] = session
+            await session.run()
+        except (PiCastException, RtspError, ConnectionError) as e:
+            logger.error("Session from {} aborted: {}".format(peeraddress, e))
+        finally:
+            if rtp_port is not None:
+                self.sessions.pop(rtp_port, None)
+                if session is not None and session.finished:
+                    self.cache.put(key, session.format, session.player.decoder_name)
+                    self.cache.keep_warm(key, session.player, rtp_port)
+                else:
+                    if session is not None:
+                        session.stop_player()
+                    elif player is not None:
+                        player.stop()
+                    self.ports.release(rtp_port)
+            writer.close()
+
+    def metrics(self):
+        """Samples of (name, labels, value) of all sessions; see picast.metrics.render()."""
+        samples = [('picast_sessions', {}, len(self.sessions)), ('picast_warm_pipelines', {}, len(self.cache.warm))]
+        for session in list(self.sessions.values()):
+            samples += session.metrics()
+        return samples + NEGOTIATION.samples()
+
+    async def serve(self):
+        metrics = MetricsServer(self.metrics)
+        if Settings.metrics_port is not None:
+            try:
+                await metrics.start(Settings.metrics_address, Settings.metrics_port)
+            except OSError as e:
+                self.logger.warning("Can not serve metrics: {}".format(e))
+        server = await asyncio.start_server(self.handle_connection, Settings.myaddress, Settings.rtsp_port,
+                                            reuse_address=True)
+        self.loop = asyncio.get_running_loop()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.loop = None
+            metrics.close()
+            while self.cache.drop_warm():
+                pass
+
+    def run(self):
+        asyncio.run(self.serve())
+
+
+class IdrTrigger(asyncio.DatagramProtocol):
+    """Loopback endpoint; any datagram received on it triggers a wfd-idr-request."""
+
+    def __init__(self, requester):
+        self.requester = requester
+
+    def datagram_received(self, data, addr):
+        self.requester.request('external trigger')
+
+
+def peer_key(address, leases=None):
+    """MAC address of a peer from our DHCP leases or the ARP table, or the address itself.
+
+    The DHCP address of a P2P client may change between connections, its MAC does not.
+    """
+    if leases and address in leases:
+        return leases[address]
+    try:
+        with open('/proc/net/arp') as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if len(fields) > 3 and fields[0] == address and fields[3] != '00:00:00:00:00:00':
+                    return fields[3]
+    except OSError:
+        pass
+    return address
+
+
+class SessionCache:
+    """What recent peers negotiated, and the pipeline of their last session kept warm for a while.
+
+    A returning peer gets its last decoder and format built, and prepared
+    while it negotiates. A warm pipeline is parked in READY with its RTP
+    port and socket for Settings.warm_time seconds, so the peer skips
+    building the pipeline altogether. release(port) gives a port back to
+    the pool when a warm pipeline is dropped.
+    """
+
+    def __init__(self, size, release):
+        self.logger = getLogger("PiCast.cache")
+        self.size = size
+        self.release = release
+        self.entries = OrderedDict()  # peer: (format, decoder), least recently used first
+        self.warm = OrderedDict()  # peer: (player, rtp port, expiry timer), oldest first
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, fmt, decoder):
+        self.entries[key] = (fmt, decoder)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def keep_warm(self, key, player, rtp_port):
+        if not Settings.warm_time:
+            player.stop()
+            self.release(rtp_port)
+            return
+        player.stop(keep=True)
+        self.drop_warm(key)
+        timer = asyncio.get_running_loop().call_later(Settings.warm_time, self.drop_warm, key)
+        self.warm[key] = (player, rtp_port, timer)
+        self.logger.debug("keeping the pipeline of {} on port {} warm".format(key, rtp_port))
+
+    def take_warm(self, key):
+        """(player, rtp port) kept for the peer, or None."""
+        warm = self.warm.pop(key, None)
+        if warm is None:
+            return None
+        player, rtp_port, timer = warm
+        timer.cancel()
+        return player, rtp_port
+
+    def drop_warm(self, key=None):
+        """Stop a warm pipeline, the oldest one without key; False when there is none."""
+        if key is None:
+            if not self.warm:
+                return False
+            key = next(iter(self.warm))
+        warm = self.take_warm(key)
+        if warm is None:
+            return False
+        player, rtp_port = warm
+        player.stop()
+        self.release(rtp_port)
+        return True
+
+
+class IdrRequester:
+    """Coalesce loss reports into rate limited wfd-idr-request.
+
+    request() may be called from any thread, e.g. GStreamer streaming threads.
+    Reports arriving within Settings.idr_coalesce become one request, and two
+    requests are at least Settings.idr_min_interval apart.
+    """
+
+    def __init__(self, loop, event):
+        self.logger = getLogger("PiCast.idr")
+        self.loop = loop
+        self.event = event
+        self.reasons = []
+        self.handle = None
+        self.last = None
+        self.count = 0  # requests fired
+
+    def request(self, reason):
+        try:
+            self.loop.call_soon_threadsafe(self._schedule, reason)
+        except RuntimeError:
+            pass  # session already finished
+
+    def _schedule(self, reason):
+        self.reasons.append(reason)
+        if self.handle is not None:
+            return
+        delay = Settings.idr_coalesce
+        if self.last is not None:
+            delay = max(delay, self.last + Settings.idr_min_interval - self.loop.time())
+        self.handle = self.loop.call_later(delay, self._fire)
+
+    def _fire(self):
+        self.logger.debug("request IDR: {} ({} reports)".format(self.reasons[0], len(self.reasons)))
+        self.handle = None
+        self.reasons = []
+        self.last = self.loop.time()
+        self.count += 1
+        self.event.set()
+
+    def cancel(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
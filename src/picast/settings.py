@@ -0,0 +1,82 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+    Copyright (C) 2018 Hsun-Wei Cho
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+
+"""
+Definition statischer Attribute
+"""
+class Settings:
+    wp_device_name = 'picast'
+    wp_device_type = "7-0050F204-1"
+    wp_group_name = 'persistent'
+    pin = '12345678'
+    timeout = 300  # seconds the WPS PIN stays armed
+    rtsp_port = 7236
+    rtp_port = 1028  # first port of the per-session RTP port pool
+    max_sessions = 2
+    session_cache_size = 32  # peers whose last format and decoder are remembered
+    warm_time = 60  # seconds a pipeline stays ready for its peer to return after TEARDOWN, 0: never
+    watchdog_timeout = 70  # seconds without RTSP from the source, when it advertises no session timeout
+    keepalive_grace = 10  # seconds past the session timeout of the source before the session is torn down
+    rtp_timeout = 5  # seconds without RTP before an IDR is requested
+    rtp_teardown = 30  # seconds without RTP before the session is torn down, None: never
+    idr_min_interval = 1.0  # seconds between two wfd-idr-request
+    idr_coalesce = 0.05  # loss events within this window become one request
+    myaddress = '192.168.173.1'
+    peeraddress = '192.168.173.80'
+    netmask = '255.255.255.0'
+    # DHCP for the P2P group: peeraddress is the first of dhcp_pool_size addresses
+    dhcp_pool_size = 8
+    dhcp_lease_time = 300
+    dhcp_port = 67
+    dhcp_client_port = 68
+    dhcp_broadcast = '255.255.255.255'
+    wpa_ctrl_dir = '/var/run/wpa_supplicant'
+    wpa_interface = None  # None: first control socket, as wpa_cli does
+    p2p_group_timeout = 10  # seconds to wait for P2P-GROUP-STARTED
+    startup_report = None  # path to write the startup timing report as JSON
+    capture_dir = None  # record every session to a capture file in this directory, see picast.capture
+    # Prometheus endpoint on http://metrics_address:metrics_port/metrics; None disables it
+    metrics_address = '127.0.0.1'
+    metrics_port = 9236
+    # rtpjitterbuffer: latency in ms, drop packets that arrive later than that, timestamp mode
+    jitter_profiles = {
+        'presentation': {'latency': 50, 'drop-on-latency': True, 'mode': 'slave'},
+        'video': {'latency': 200, 'drop-on-latency': False, 'mode': 'slave'},
+    }
+    jitter_profile = 'video'
+    decoder = None  # force a decoder element, otherwise the best available one is used
+    video_sink = 'autovideosink'
+    audio_sink = 'autoaudiosink'
+    # buffer and period of the audio sink in ms; small values keep the latency low at the risk of dropouts
+    audio_buffer_time = 60
+    audio_latency_time = 10
+    audio_slave_method = 'skew'  # how the audio sink follows the pipeline clock: 'skew', 'resample' or 'none'
+    # limits of the queues behind the MPEG2-TS demuxer, in ms; the audio queue drops old data when full
+    video_queue_time = 200
+    audio_queue_time = 100
+    # levels advertised for decoders that do not declare one
+    max_level = {'h264': '4.2', 'h265': '4.1'}
+    # (width, height, refresh) of the display, the preferred mode first; filled in at startup
+    display_modes = ()
+    decoder_cache = os.path.expanduser('~/.cache/picast/decoders.json')
+    decoder_retry = 600  # seconds a decoder that failed at runtime is ranked last, not kept across runs
+    # persistent P2P group and the sources that joined it, see picast.p2pstate
+    p2p_state = os.path.expanduser('~/.local/share/picast/p2p.json')
+    p2p_known_max = 64
@@ -0,0 +1,175 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Startup orchestrator.
+
+Bring-up steps are declared with their dependencies and every step runs in
+its own thread as soon as the steps it depends on have finished. Each phase
+is timed, and a report is logged when everything is done.
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from logging import getLogger
+from time import monotonic
+
+
+class Phase:
+
+    __slots__ = ('name', 'func', 'after', 'start', 'end', 'error', 'thread')
+
+    def __init__(self, name, func=None, after=()):
+        self.name = name
+        self.func = func
+        self.after = tuple(after)
+        self.start = None
+        self.end = None
+        self.error = None
+        self.thread = None
+
+    @property
+    def finished(self):
+        return self.end is not None
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+
+class Startup:
+    """Run bring-up steps concurrently, respecting their dependencies.
+
+    on_done(startup) is called from the thread that finishes the last step.
+    The report is also written to report_path as JSON when given.
+    """
+
+    def __init__(self, on_done=None, report_path=None):
+        self.logger = getLogger("PiCast.startup")
+        self.on_done = on_done
+        self.report_path = report_path
+        self.t0 = monotonic()
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.done = threading.Event()
+
+    def add(self, name, func, after=()):
+        for dep in after:
+            if dep not in self.phases:
+                raise ValueError("Unknown startup phase {}".format(dep))
+        self.phases[name] = Phase(name, func, after)
+
+    def start(self):
+        with self.lock:
+            ready = self._ready()
+        if not ready and self._all_finished():
+            self._finish()
+        for phase in ready:
+            self._launch(phase)
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    @contextmanager
+    def measure(self, name):
+        """Time a step that has to run in the calling thread, such as window creation."""
+        phase = Phase(name)
+        phase.thread = threading.current_thread().name
+        phase.start = monotonic()
+        try:
+            yield
+        except Exception as e:
+            phase.error = e
+            raise
+        finally:
+            phase.end = monotonic()
+            with self.lock:
+                self.phases[name] = phase
+
+    @property
+    def failed(self):
+        return [p for p in self.phases.values() if p.failed]
+
+    def _ready(self):
+        ready = []
+        for phase in self.phases.values():
+            if phase.start is not None or phase.func is None:
+                continue
+            deps = [self.phases[d] for d in phase.after]
+            if any(d.failed for d in deps):
+                phase.start = phase.end = monotonic()
+                phase.error = "skipped, {} failed".format(', '.join(d.name for d in deps if d.failed))
+            elif all(d.finished for d in deps):
+                phase.start = monotonic()
+                ready.append(phase)
+        return ready
+
+    def _launch(self, phase):
+        thread = threading.Thread(target=self._run, args=(phase,), name='startup-{}'.format(phase.name),
+                                  daemon=True)
+        phase.thread = thread.name
+        thread.start()
+
+    def _run(self, phase):
+        try:
+            phase.func()
+        except Exception as e:
+            self.logger.error("Startup phase {} failed: {}".format(phase.name, e))
+            phase.error = e
+        with self.lock:
+            phase.end = monotonic()
+            ready = self._ready()
+            finished = self._all_finished()
+        for p in ready:
+            self._launch(p)
+        if finished:
+            self._finish()
+
+    def _all_finished(self):
+        return all(p.finished for p in self.phases.values() if p.func is not None)
+
+    def _finish(self):
+        if self.done.is_set():
+            return
+        self.done.set()
+        self.log_report(self.report_path)
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def report(self):
+        """Per phase start offset and duration in seconds, ordered by start."""
+        phases = sorted((p for p in self.phases.values() if p.start is not None), key=lambda p: p.start)
+        return [{
+            'phase': p.name,
+            'start': round(p.start - self.t0, 4),
+            'duration': round(p.end - p.start, 4) if p.end is not None else None,
+            'thread': p.thread,
+            'error': str(p.error) if p.error is not None else None,
+        } for p in phases]
+
+    def log_report(self, path=None):
+        report = self.report()
+        total = max((r['start'] + (r['duration'] or 0) for r in report), default=0)
+        for r in report:
+            self.logger.info("startup: {:<16s} at {:7.3f}s took {:7.3f}s{}".format(
+                r['phase'], r['start'], r['duration'] or 0, ' ({})'.format(r['error']) if r['error'] else ''))
+        self.logger.info("startup: ready after {:.3f}s, phases took {:.3f}s in total".format(
+            total, sum(r['duration'] or 0 for r in report)))
+        if path is not None:
+            with open(path, 'w') as f:
+                json.dump({'total': total, 'phases': report}, f, indent=2)
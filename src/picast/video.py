@@ -0,0 +1,420 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+    Copyright (C) 2018 Hsun-Wei Cho
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+WFD video capability tables, the wfd_video_formats and wfd2_video_formats
+parameters, and the session format a source selects in M4.
+"""
+
+from .rtsp import RtspError
+
+
+# codec bits of wfd2_video_formats
+CODEC_H264 = 0x01
+CODEC_H265 = 0x02
+
+# level bits of wfd_video_formats (H.264) and wfd2_video_formats (H.265)
+H264_LEVELS = {'3.1': 0x01, '3.2': 0x02, '4': 0x04, '4.1': 0x08, '4.2': 0x10, '5': 0x20, '5.1': 0x40, '5.2': 0x80}
+H265_LEVELS = {'3.1': 0x01, '4': 0x02, '4.1': 0x04, '5': 0x08, '5.1': 0x10, '5.2': 0x20}
+
+# highest luma sample rate of each level, H.264 from its macroblock rate
+H264_SAMPLE_RATE = {'3.1': 108000 * 256, '3.2': 216000 * 256, '4': 245760 * 256, '4.1': 245760 * 256,
+                    '4.2': 522240 * 256, '5': 589824 * 256, '5.1': 983040 * 256, '5.2': 2073600 * 256}
+H265_SAMPLE_RATE = {'3.1': 33177600, '4': 66846720, '4.1': 133693440, '5': 267386880, '5.1': 534773760,
+                    '5.2': 1069547520}
+
+TABLE_CEA = 0
+TABLE_VESA = 1
+TABLE_HH = 2
+
+
+class Res:
+    """One mode of a WFD resolution table; immutable, ordered by score."""
+
+    __slots__ = ('id', 'width', 'height', 'refresh', 'progressive', 'h264level', 'h265level', 'table',
+                 'score', 'sample_rate', 'key')
+
+    def __init__(self, id, width, height, refresh, progressive=True, h264level='3.1', h265level='3.1',
+                 table=TABLE_CEA):
+        init = super().__setattr__
+        init('id', id)
+        init('width', width)
+        init('height', height)
+        init('refresh', refresh)
+        init('progressive', progressive)
+        init('h264level', h264level)
+        init('h265level', h265level)
+        init('table', table)
+        init('score', width * height * refresh * (2 if progressive else 1))
+        # luma samples per second; an interlaced refresh counts fields
+        init('sample_rate', width * height * (refresh if progressive else refresh // 2))
+        init('key', (table, id, width, height, refresh, progressive))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Res is immutable")
+
+    def __repr__(self):
+        return "%s(%d,%d,%d,%d,%s)" % (type(self).__name__, self.id, self.width, self.height, self.refresh,
+                                       'p' if self.progressive else 'i')
+
+    def __str__(self):
+        return 'resolution(%d) %d x %d x %d%s' % (self.id, self.width, self.height, self.refresh,
+                                                  'p' if self.progressive else 'i')
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, Res) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __ge__(self, other):
+        return self.score >= other.score
+
+    def __gt__(self, other):
+        return self.score > other.score
+
+    def __le__(self, other):
+        return self.score <= other.score
+
+    def __lt__(self, other):
+        return self.score < other.score
+
+    def level(self, codec):
+        return self.h264level if codec == 'h264' else self.h265level
+
+    def fits_decoder(self, codec, level):
+        """True when a decoder of codec at level can decode this mode."""
+        if codec == 'h264':
+            return H264_LEVELS[self.h264level] <= H264_LEVELS[level] and self.sample_rate <= H264_SAMPLE_RATE[level]
+        return H265_LEVELS[self.h265level] <= H265_LEVELS[level] and self.sample_rate <= H265_SAMPLE_RATE[level]
+
+    def fits_display(self, display_modes):
+        """True when one of the (width, height, refresh) display modes can show this mode unscaled or smaller."""
+        if not display_modes:
+            return True
+        return any(self.width <= w and self.height <= h and self.refresh <= r + 1 for w, h, r in display_modes)
+
+
+class ResolutionCatalog:
+    """The CEA, VESA and HH tables, built once.
+
+    Modes are looked up by (table, bit) and by (width, height, refresh,
+    progressive) in constant time; the first table wins for a mode listed
+    twice.
+    """
+
+    def __init__(self, tables):
+        self.tables = tuple(tuple(Res(*row, table=table) for row in rows) for table, rows in tables)
+        self.modes = tuple(res for table in self.tables for res in table)
+        self.by_score = tuple(sorted(self.modes, reverse=True))
+        self._by_bit = {(res.table, res.id): res for res in self.modes}
+        self._by_size = {}
+        for res in self.modes:
+            self._by_size.setdefault((res.width, res.height, res.refresh, res.progressive), res)
+
+    def get(self, table, bit):
+        return self._by_bit.get((table, bit))
+
+    def find(self, width, height, refresh, progressive=True):
+        return self._by_size.get((width, height, refresh, progressive))
+
+    def from_masks(self, cea, vesa, hh):
+        """Modes of the bits set in the masks, best first."""
+        masks = (cea, vesa, hh)
+        return [res for res in self.by_score if masks[res.table] >> res.id & 1]
+
+    def select(self, codec, level, display_modes=()):
+        """Modes that the decoder and the display can show, best first."""
+        return [res for res in self.by_score if res.fits_decoder(codec, level) and res.fits_display(display_modes)]
+
+    def best_fit(self, codec, level, display_modes=()):
+        """The CEA or VESA mode to call native: the display's preferred mode if possible, else the best one."""
+        modes = [res for res in self.select(codec, level, display_modes) if res.table != TABLE_HH]
+        if display_modes:
+            width, height, refresh = display_modes[0]
+            for res in modes:
+                if (res.width, res.height) == (width, height) and abs(res.refresh - refresh) <= 1 and res.progressive:
+                    return res
+        return modes[0] if modes else self.get(TABLE_CEA, 0)
+
+
+CATALOG = ResolutionCatalog([
+    (TABLE_CEA, (
+        (0,   640,  480, 60, True),
+        (1,   720,  480, 60, True),
+        (2,   720,  480, 60, False),
+        (3,   720,  480, 50, True),
+        (4,   720,  576, 50, False),
+        (5,  1280,  720, 30, True),
+        (6,  1280,  720, 60, True, '3.2', '4'),
+        (7,  1280, 1080, 30, True, '4', '4'),
+        (8,  1920, 1080, 60, True, '4.2', '4.1'),
+        (9,  1920, 1080, 60, False, '4', '4'),
+        (10, 1280,  720, 25, True),
+        (11, 1280,  720, 50, True, '3.2', '4'),
+        (12, 1920, 1080, 25, True, '3.2', '4'),
+        (13, 1920, 1080, 50, True, '4.2', '4.1'),
+        (14, 1920, 1080, 50, False, '3.2', '4'),
+        (15, 1280,  720, 24, True),
+        (16, 1920, 1080, 24, True, '3.2', '4'),
+        (17, 3840, 2160, 30, True, '5.1', '5'),
+        (18, 3840, 2160, 60, True, '5.1', '5'),
+        (19, 4096, 2160, 30, True, '5.1', '5'),
+        (20, 4096, 2160, 60, True, '5.2', '5.1'),
+        (21, 3840, 2160, 25, True, '5.2', '5.1'),
+        (22, 3840, 2160, 50, True, '5.2', '5'),
+        (23, 4096, 2160, 25, True, '5.2', '5'),
+        (24, 4096, 2160, 50, True, '5.2', '5.1'),
+        (25, 3840, 2160, 24, True, '5.1', '5'),
+        (26, 4096, 2160, 24, True, '5.1', '5'),
+    )),
+    (TABLE_VESA, (
+        (0,   800,  600, 30, True, '3.1', '3.1'),
+        (1,   800,  600, 60, True, '3.2', '4'),
+        (2,  1024,  768, 30, True, '3.1', '3.1'),
+        (3,  1024,  768, 60, True, '3.2', '4'),
+        (4,  1152,  854, 30, True, '3.2', '4'),
+        (5,  1152,  854, 60, True, '4', '4.1'),
+        (6,  1280,  768, 30, True, '3.2', '4'),
+        (7,  1280,  768, 60, True, '4', '4.1'),
+        (8,  1280,  800, 30, True, '3.2', '4'),
+        (9,  1280,  800, 60, True, '4', '4.1'),
+        (10, 1360,  768, 30, True, '3.2', '4'),
+        (11, 1360,  768, 60, True, '4', '4.1'),
+        (12, 1366,  768, 30, True, '3.2', '4'),
+        (13, 1366,  768, 60, True, '4.2', '4.1'),
+        (14, 1280, 1024, 30, True, '3.2', '4'),
+        (15, 1280, 1024, 60, True, '4.2', '4.1'),
+        (16, 1440, 1050, 30, True, '3.2', '4'),
+        (17, 1440, 1050, 60, True, '4.2', '4.1'),
+        (18, 1440,  900, 30, True, '3.2', '4'),
+        (19, 1440,  900, 60, True, '4.2', '4.1'),
+        (20, 1600,  900, 30, True, '3.2', '4'),
+        (21, 1600,  900, 60, True, '4.2', '4.1'),
+        (22, 1600, 1200, 30, True, '4', '5'),
+        (23, 1600, 1200, 60, True, '4.2', '5.1'),
+        (24, 1680, 1024, 30, True, '3.2', '4'),
+        (25, 1680, 1024, 60, True, '4.2', '4.1'),
+        (26, 1680, 1050, 30, True, '3.2', '4'),
+        (27, 1680, 1050, 60, True, '4.2', '4.1'),
+        (28, 1920, 1200, 30, True, '4.2', '5'),
+    )),
+    (TABLE_HH, (
+        (0, 800, 400, 30),
+        (1, 800, 480, 60),
+        (2, 854, 480, 30),
+        (3, 854, 480, 60),
+        (4, 864, 480, 30),
+        (5, 864, 480, 60),
+        (6, 640, 360, 30),
+        (7, 640, 360, 60),
+        (8, 960, 540, 30),
+        (9, 960, 540, 60),
+        (10, 848, 480, 30),
+        (11, 848, 480, 60),
+    )),
+])
+
+# rendered M3 bodies by capabilities
+_bodies = {}
+
+
+def clamp_level(codec, level):
+    """The highest level of the WFD table for codec that does not exceed level."""
+    def number(level):
+        return tuple(int(n) for n in level.split('.'))
+    known = [name for name in (H264_LEVELS if codec == 'h264' else H265_LEVELS) if number(name) <= number(level)]
+    return max(known, key=number) if known else '3.1'
+
+
+class WfdVideoParameters:
+
+    catalog = CATALOG
+    resolutions_cea = CATALOG.tables[TABLE_CEA]
+    resolutions_vesa = CATALOG.tables[TABLE_VESA]
+    resolutions_hh = CATALOG.tables[TABLE_HH]
+
+    def __init__(self, display_modes=(), levels=None):
+        """display_modes: (width, height, refresh) of the display, the preferred one first; none means any.
+        levels: highest decoder level by codec, e.g. {'h264': '4.2', 'h265': '4.1'}; H.265 is offered when present.
+        """
+        self.display_modes = tuple(display_modes or ())
+        levels = levels or {'h264': '4.2'}
+        self.levels = {codec: clamp_level(codec, level) for codec, level in levels.items()}
+
+    def capabilities(self, codec):
+        """(native, level, cea, vesa, hh) for codec, limited to what display and decoder can show."""
+        levels = H264_LEVELS if codec == 'h264' else H265_LEVELS
+        masks = [0x01, 0, 0]  # 640x480p60 is mandatory
+        level = levels['3.1']
+        for res in self.catalog.select(codec, self.levels[codec], self.display_modes):
+            masks[res.table] |= 1 << res.id
+            level = max(level, levels[res.level(codec)])
+        native = self.catalog.best_fit(codec, self.levels[codec], self.display_modes)
+        return native.id << 3 | native.table, level, masks[0], masks[1], masks[2]
+
+    def get_video_parameter(self):
+        """Body of the M3 response; rendered once per display and decoder capabilities."""
+        key = (self.display_modes, tuple(sorted(self.levels.items())))
+        body = _bodies.get(key)
+        if body is None:
+            body = _bodies[key] = self.render()
+        return body
+
+    def render(self):
+        # audio_codec: LPCM:0x01, AAC:0x02, AC3:0x04
+        # audio_sampling_frequency: 44.1khz:1, 48khz:2
+        # LPCM: 44.1kHz, 16b; 48 kHZ,16b
+        # AAC: 48 kHz, 16b, 2 channels; 48kHz,16b, 4 channels, 48 kHz,16b,6 channels
+        # AAC 00000001 00  : 2 ch AAC 48kHz
+        msg = 'wfd_audio_codecs: AAC 00000001 00, LPCM 00000002 00\r\n'
+        # wfd_video_formats: <native_resolution: 0x20>, <preferred>, <profile>, <level>,
+        #                    <cea>, <vesa>, <hh>, <latency>, <min_slice>, <slice_enc>, <frame skipping support>
+        #                    <max_hres>, <max_vres>
+        # native: bit index in the table << 3 | table (CEA: 0, VESA: 1, HH: 2)
+        # preferred-display-mode-supported: 0 or 1
+        # profile: Constrained High Profile: 0x02, Constraint Baseline Profile: 0x01
+        # level: H264 level 3.1: 0x01, 3.2: 0x02, 4.0: 0x04,4.1:0x08, 4.2=0x10
+        #   3.2: 720p60,  4.1: FullHD@24, 4.2: FullHD@60
+        preferred = 0
+        profile = 0x02 | 0x01
+        native, level, cea, vesa, handheld = self.capabilities('h264')
+        msg += 'wfd_video_formats: {0:02X} {1:02X} {2:02X} {3:02X} {4:08X} {5:08X} {6:08X}' \
+               ' 00 0000 0000 00 none none\r\n'.format(native, preferred, profile, level, cea, vesa, handheld)
+        if 'h265' in self.levels:
+            # wfd2_video_formats: <native>, <preferred>, then per codec <codec>, <profile>, <level>,
+            #                     <cea>, <vesa>, <hh>, <latency>, <min_slice>, <slice_enc>, <frame skipping support>
+            # profile: Main Profile: 0x01
+            # level: H265 level 3.1: 0x01, 4: 0x02, 4.1: 0x04, 5: 0x08, 5.1: 0x10, 5.2: 0x20
+            native, level, cea, vesa, handheld = self.capabilities('h265')
+            msg += 'wfd2_video_formats: {0:02X} {1:02X} {2:02X} {3:02X} {4:02X} {5:08X} {6:08X} {7:08X}' \
+                   ' 00 0000 0000 00\r\n'.format(native, preferred, CODEC_H265, 0x01, level, cea, vesa, handheld)
+        msg += 'wfd_3d_video_formats: none\r\n' \
+               'wfd_coupled_sink: none\r\n' \
+               'wfd_display_edid: none\r\n' \
+               'wfd_connector_type: 05\r\n' \
+               'wfd_uibc_capability: none\r\n' \
+               'wfd_standby_resume_capability: none\r\n' \
+               'wfd_content_protection: none\r\n'
+        return msg
+
+
+# sampling rate and channels of the mode bits of wfd_audio_codecs
+AUDIO_MODES = {
+    'LPCM': {0x01: (44100, 2), 0x02: (48000, 2)},
+    'AAC': {0x01: (48000, 2), 0x02: (48000, 4), 0x04: (48000, 6), 0x08: (48000, 8)},
+    'AC3': {0x01: (48000, 2), 0x02: (48000, 4), 0x04: (48000, 6)},
+}
+
+H264_PROFILES = {0x01: 'constrained-baseline', 0x02: 'constrained-high'}
+H265_PROFILES = {0x01: 'main'}
+
+
+def lowest_bit(value):
+    return value & -value
+
+
+class SessionFormat:
+    """The format a source selected in M4: codec, mode, profile, level, audio and presentation URL.
+
+    audio is (codec, rate, channels), e.g. ('AAC', 48000, 2), or None.
+    Fields the source did not send are None; the codec defaults to H.264.
+    """
+
+    __slots__ = ('codec', 'res', 'profile', 'level', 'audio', 'presentation_url')
+
+    def __init__(self, codec='h264', res=None, profile=None, level=None, audio=None, presentation_url=None):
+        self.codec = codec
+        self.res = res
+        self.profile = profile
+        self.level = level
+        self.audio = audio
+        self.presentation_url = presentation_url
+
+    @classmethod
+    def from_parameters(cls, parameters, previous=None, catalog=CATALOG):
+        """Parse a SET_PARAMETER body; fields it does not carry are taken from previous.
+
+        Raises RtspError when a field is not in the form WFD defines.
+        """
+        fmt = cls() if previous is None else cls(*previous.key)
+        try:
+            fmt.parse_parameters(parameters, catalog)
+        except (ValueError, KeyError) as e:
+            raise RtspError("malformed format parameters {}: {!r}".format(parameters, e))
+        return fmt
+
+    def parse_parameters(self, parameters, catalog):
+        value = parameters.get('wfd2_video_formats')
+        fields = value.split() if value else []
+        if len(fields) >= 8:
+            # <native> <preferred> <codec> <profile> <level> <cea> <vesa> <hh> ...
+            codec = int(fields[2], 16)
+            self.codec = 'h265' if codec & CODEC_H265 else 'h264'
+            self.parse_video(catalog, fields[3:8])
+        else:
+            value = parameters.get('wfd_video_formats')
+            fields = value.split() if value else []
+            if len(fields) >= 7:
+                # <native> <preferred> <profile> <level> <cea> <vesa> <hh> ...
+                self.codec = 'h264'
+                self.parse_video(catalog, fields[2:7])
+        value = parameters.get('wfd_audio_codecs')
+        fields = value.split() if value else []
+        if len(fields) >= 2 and fields[0] in AUDIO_MODES:
+            mode = AUDIO_MODES[fields[0]].get(lowest_bit(int(fields[1], 16)))
+            if mode is not None:
+                self.audio = (fields[0],) + mode
+        value = parameters.get('wfd_presentation_URL')
+        if value:
+            self.presentation_url = value.split()[0]
+
+    def parse_video(self, catalog, fields):
+        profile, level, cea, vesa, hh = (int(field, 16) for field in fields)
+        profiles, levels = (H264_PROFILES, H264_LEVELS) if self.codec == 'h264' else (H265_PROFILES, H265_LEVELS)
+        self.profile = profiles.get(lowest_bit(profile))
+        self.level = {bit: name for name, bit in levels.items()}.get(lowest_bit(level))
+        modes = catalog.from_masks(cea, vesa, hh)
+        self.res = modes[0] if modes else None
+
+    @property
+    def key(self):
+        return self.codec, self.res, self.profile, self.level, self.audio, self.presentation_url
+
+    def __eq__(self, other):
+        return isinstance(other, SessionFormat) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        return '{} {} {} level {} audio {}'.format(self.codec, self.res, self.profile, self.level, self.audio)
+
+    @property
+    def media_type(self):
+        return 'video/x-h264' if self.codec == 'h264' else 'video/x-h265'
+
+    def caps(self):
+        """Caps of the parsed video stream; without size, as the SPS may differ from M4 or change."""
+        return self.media_type + ', stream-format=byte-stream, alignment=au'
@@ -0,0 +1,215 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+    Copyright (C) 2018 Hsun-Wei Cho
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+from logging import getLogger
+
+from .dhcpd import Dhcpd
+from .exceptions import PiCastException
+from .p2pstate import P2PState
+from .settings import Settings
+from .wpacli import WpaCli
+from .wpactrl import WpaCtrlError, WpaMonitor
+
+
+class WifiP2PServer:
+    """Wi-Fi Direct side of the sink: the P2P group, WPS PIN, DHCP server and wpa_supplicant events.
+
+    The group is persistent and re-invoked with the stored network id, so
+    sources that joined it before reconnect with their stored credentials
+    instead of WPS, and their invitations are answered. Lease events of the
+    DHCP server are passed on to the listeners registered with on_lease().
+    """
+
+    def __init__(self):
+        self.state = P2PState()
+        self.wlandev = None
+        self.dhcpd = None
+        self.lease_listeners = []
+        self.reinvoking = False  # the group is being re-invoked for an invitation
+
+    def start(self):
+        self.start_monitor()
+        self.set_p2p_interface()
+        self.start_dhcpd()
+        self.start_wps()
+
+    def start_monitor(self):
+        self.monitor = WpaMonitor(WpaCli().default_interface(), Settings.wpa_ctrl_dir)
+        self.monitor.on('AP-STA-CONNECTED', self.on_sta_connected)
+        self.monitor.on('AP-STA-DISCONNECTED', self.on_sta_disconnected)
+        self.monitor.on('P2P-GROUP-REMOVED', self.on_group_removed)
+        self.monitor.on('P2P-INVITATION-RECEIVED', self.on_invitation)
+        self.monitor.on('P2P-GROUP-STARTED', self.on_group_started)
+        try:
+            self.monitor.start()
+        except WpaCtrlError as e:
+            raise PiCastException(str(e))
+
+    def on_sta_connected(self, event):
+        getLogger("PiCast").info("Source connected: {}".format(' '.join(event.args)))
+        address = event.params.get('p2p_dev_addr') or (event.args[0] if event.args else None)
+        if address is not None and self.state.group is not None:
+            self.state.add_known(address)
+
+    def on_sta_disconnected(self, event):
+        getLogger("PiCast").info("Source disconnected: {}".format(' '.join(event.args)))
+
+    def on_group_removed(self, event):
+        getLogger("PiCast").warning("P2P group removed: {}".format(' '.join(event.args)))
+        if event.args and event.args[0] == self.wlandev:
+            self.wlandev = None
+            # its socket is bound to the interface that is gone
+            if self.dhcpd is not None:
+                self.dhcpd.stop()
+                self.dhcpd = None
+
+    def on_invitation(self, event):
+        """A source asks to use a persistent group; only known sources of our group are answered."""
+        logger = getLogger("PiCast")
+        peer = event.params.get('sa')
+        persistent = event.params.get('persistent')
+        if persistent is None or not persistent.isdigit() or int(persistent) != self.state.network_id \
+                or not self.state.is_known(peer):
+            logger.info("Ignore invitation from {} for group {}".format(peer, persistent))
+            return
+        logger.info("Invitation from known source {}".format(peer))
+        try:
+            if self.wlandev is not None:
+                WpaCli().p2p_invite(peer, group=self.wlandev)
+            else:
+                self.reinvoking = True
+                WpaCli().p2p_invite(peer, persistent=self.state.network_id)
+        except PiCastException as e:
+            self.reinvoking = False
+            logger.warning("Can not answer invitation of {}: {}".format(peer, e))
+
+    def on_group_started(self, event):
+        if not self.reinvoking or not event.args:
+            return
+        self.reinvoking = False
+        self.configure_group(event)
+        try:
+            if self.dhcpd is not None:
+                self.dhcpd.stop()
+            self.start_dhcpd()
+            # the PIN went away with the old group interface
+            self.start_wps()
+        except PiCastException as e:
+            getLogger("PiCast").error("Can not bring up the re-invoked group: {}".format(e))
+
+    def start_wps(self):
+        wpacli = WpaCli()
+        wpacli.set_wps_pin(self.wlandev, Settings.pin, Settings.timeout)
+
+    def start_dhcpd(self):
+        self.dhcpd = Dhcpd(self.wlandev, on_lease=self.dispatch_lease)
+        self.dhcpd.start()
+
+    def on_lease(self, callback):
+        """Call callback(event, lease) from the DHCP thread for every lease event."""
+        self.lease_listeners.append(callback)
+
+    def dispatch_lease(self, event, lease):
+        for callback in list(self.lease_listeners):
+            try:
+                callback(event, lease)
+            except Exception:
+                getLogger("PiCast").exception("Lease listener failed")
+
+    def wfd_devinfo(self, port):
+        type = 0b01  # PRIMARY_SINK
+        session = 0b01 << 4
+        wsd = 0b01 << 6
+        pc = 0  # P2P
+        cp_support = 0
+        ts = 0
+        devinfo = type | session | wsd | pc | cp_support | ts
+        control = port
+        max_tp = 300  # Mbps
+        return '0006{0:04x}{1:04x}{2:04x}'.format(devinfo, control, max_tp)
+
+    def wfd_bssid(self, bssid):
+        return '0006{0:012x}'.format(bssid)
+
+    def wfd_sink_info(self, status, mac):
+        return '0007{0:02x}{1:012x}'.format(status, mac)
+
+    def create_p2p_interface(self, reinvoke=True):
+        """Configure P2P and start the group; True when the stored persistent group was re-invoked."""
+        wpacli = WpaCli()
+        # one round trip for the whole configuration
+        wpacli.cmds_ok([
+            "p2p_find type=progressive",
+            "set device_name {}".format(Settings.wp_device_name),
+            "set device_type {}".format(Settings.wp_device_type),
+            "set p2p_go_ht40 1",
+            "wfd_subelem_set 0 {}".format(self.wfd_devinfo(port=Settings.rtsp_port)),
+            "wfd_subelem_set 1 {}".format(self.wfd_bssid(0)),
+            "wfd_subelem_set 6 {}".format(self.wfd_sink_info(0, 0)),
+        ])
+        network_id = self.state.persistent_network(wpacli.list_networks()) if reinvoke else None
+        if network_id is not None:
+            getLogger("PiCast").info("Re-invoke persistent group {}".format(self.state.group['ssid']))
+            wpacli.p2p_group_add("persistent={:d}".format(network_id))
+            return True
+        wpacli.p2p_group_add(Settings.wp_group_name)
+        return False
+
+    def remember_group(self, event):
+        """Store network id and credentials of a persistent group from its P2P-GROUP-STARTED."""
+        if '[PERSISTENT]' not in event.args:
+            return
+        ssid = event.params.get('ssid')
+        wpacli = WpaCli()
+        for network_id, name, bssid, flags in wpacli.list_networks():
+            if name == ssid and 'P2P-PERSISTENT' in flags:
+                self.state.set_group(network_id, ssid, event.params.get('passphrase'), event.params.get('go_dev_addr'))
+                if not wpacli.save_config():
+                    getLogger("PiCast").warning("wpa_supplicant can not save the persistent group, "
+                                                "set update_config=1 in its configuration.")
+                return
+
+    def set_p2p_interface(self):
+        logger = getLogger("PiCast")
+        wpacli = WpaCli()
+        if wpacli.check_p2p_interface():
+            logger.info("Already set a p2p interface.")
+            p2p_interface = wpacli.get_p2p_interface()
+        else:
+            started = self.monitor.expect('P2P-GROUP-STARTED')
+            reinvoked = self.create_p2p_interface()
+            event = started.wait(Settings.p2p_group_timeout)
+            if event is None and reinvoked:
+                logger.warning("Persistent group did not start, creating a new one.")
+                started = self.monitor.expect('P2P-GROUP-STARTED')
+                self.create_p2p_interface(reinvoke=False)
+                event = started.wait(Settings.p2p_group_timeout)
+            if event is None or not event.args:
+                raise PiCastException("Can not create P2P Wifi interface.")
+            self.configure_group(event)
+            return
+        self.wlandev = p2p_interface
+
+    def configure_group(self, event):
+        """Address the interface of a started group and remember the group."""
+        p2p_interface = event.args[0]
+        getLogger("PiCast").info("Start p2p interface: {}".format(p2p_interface))
+        self.remember_group(event)
+        os.system("sudo ifconfig {} {}".format(p2p_interface, Settings.myaddress))
+        self.wlandev = p2p_interface
@@ -0,0 +1,189 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+    Copyright (C) 2018 Hsun-Wei Cho
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+wpa_cli-Befehle über den Steuer-Socket von wpa_supplicant
+    Steuert die WiFi-Direct-Verbindung über das WPA-Supplicant-Subsystem
+    Methoden zum Konfigurieren und Verwalten von P2P-Verbindungen
+"""
+
+import threading
+from logging import getLogger
+
+from .exceptions import PiCastException
+from .settings import Settings
+from .wpactrl import WpaCtrl, WpaCtrlError, list_interfaces
+
+
+class WpaCli:
+    """
+    Speaks wpa_cli commands directly to the wpa_supplicant control socket.
+Verwaltet WiFi Direct-Verbindungen
+Konfiguriert P2P-Schnittstellen
+    """
+
+    # control socket connections by interface, shared by all instances
+    connections = {}
+    connections_lock = threading.Lock()
+
+    def __init__(self):
+        self.logger = getLogger("PiCast")
+
+    def default_interface(self):
+        if Settings.wpa_interface is not None:
+            return Settings.wpa_interface
+        interfaces = list_interfaces(Settings.wpa_ctrl_dir)
+        if not interfaces:
+            raise PiCastException("No wpa_supplicant control socket in {}".format(Settings.wpa_ctrl_dir))
+        return interfaces[0]
+
+    def ctrl(self, interface=None):
+        if interface is None:
+            interface = self.default_interface()
+        with WpaCli.connections_lock:
+            conn = WpaCli.connections.get(interface)
+            if conn is None:
+                try:
+                    conn = WpaCtrl(interface, Settings.wpa_ctrl_dir)
+                except WpaCtrlError as e:
+                    raise PiCastException(str(e))
+                WpaCli.connections[interface] = conn
+        return conn
+
+    def drop(self, interface, conn):
+        """Forget and close a connection that failed, so the next command connects again."""
+        with WpaCli.connections_lock:
+            if WpaCli.connections.get(interface) is conn:
+                del WpaCli.connections[interface]
+        conn.close()
+
+    def cmd(self, arg, interface=None):
+        return self.cmds([arg], interface)[0]
+
+    def cmds(self, args, interface=None):
+        """Pipeline wpa_cli style commands, returning the reply lines of each."""
+        requests = []
+        for arg in args:
+            command, sep, params = arg.partition(' ')
+            requests.append(command.upper() + sep + params)
+        if interface is None:
+            interface = self.default_interface()
+        for retry in (True, False):
+            conn = self.ctrl(interface)
+            try:
+                replies = conn.requests(requests)
+                break
+            except WpaCtrlError as e:
+                # e.g. wpa_supplicant restarted; connect once more
+                self.drop(interface, conn)
+                if not retry:
+                    raise PiCastException(str(e))
+                self.logger.debug("Reconnecting to wpa_supplicant on {}: {}".format(interface, e))
+        return [reply.splitlines() for reply in replies]
+
+    def cmds_ok(self, args, interface=None):
+        self.logger.debug("wpa_cli {}".format(args))
+        for arg, status in zip(args, self.cmds(args, interface)):
+            if 'OK' not in status:
+                raise PiCastException("Fail to {}".format(arg))
+
+    def start_p2p_find(self):
+        self.logger.debug("wpa_cli p2p_find type=progressive")
+        status = self.cmd("p2p_find type=progressive")
+        if 'OK' not in status:
+            raise PiCastException("Fail to start p2p find.")
+
+    def stop_p2p_find(self):
+        self.logger.debug("wpa_cli p2p_stop_find")
+        status = self.cmd("p2p_stop_find")
+        if 'OK' not in status:
+            raise PiCastException("Fail to stop p2p find.")
+
+    def set_device_name(self, name):
+        self.logger.debug("wpa_cli set device_name {}".format(name))
+        status = self.cmd("set device_name {}".format(name))
+        if 'OK' not in status:
+            raise PiCastException("Fail to set device name {}".format(name))
+
+    def set_device_type(self, type):
+        self.logger.debug("wpa_cli set device_type {}".format(type))
+        status = self.cmd("set device_type {}".format(type))
+        if 'OK' not in status:
+            raise PiCastException("Fail to set device type {}".format(type))
+
+    def set_p2p_go_ht40(self):
+        self.logger.debug("wpa_cli set p2p_go_ht40 1")
+        status = self.cmd("set p2p_go_ht40 1")
+        if 'OK' not in status:
+            raise PiCastException("Fail to set p2p_go_ht40")
+
+    def wfd_subelem_set(self, val):
+        self.logger.debug("wpa_cli wfd_subelem_set {}".format(val))
+        status = self.cmd("wfd_subelem_set {}".format(val))
+        if 'OK' not in status:
+            raise PiCastException("Fail to wfd_subelem_set.")
+
+    def p2p_group_add(self, name):
+        self.logger.debug("wpa_cli p2p_group_add {}".format(name))
+        self.cmd("p2p_group_add {}".format(name))
+
+    def list_networks(self):
+        """(network id, ssid, bssid, flags) of the configured networks."""
+        networks = []
+        for line in self.cmd("list_networks")[1:]:
+            fields = line.split('\t')
+            if len(fields) >= 4 and fields[0].isdigit():
+                networks.append((int(fields[0]), fields[1], fields[2], fields[3]))
+        return networks
+
+    def p2p_invite(self, peer, group=None, persistent=None):
+        """Invite peer to the running group interface, or to re-invoke the persistent network id."""
+        if group is not None:
+            arg = "p2p_invite group={} peer={}".format(group, peer)
+        else:
+            arg = "p2p_invite persistent={} peer={}".format(persistent, peer)
+        self.logger.debug("wpa_cli {}".format(arg))
+        status = self.cmd(arg)
+        if 'OK' not in status:
+            raise PiCastException("Fail to {}".format(arg))
+
+    def save_config(self):
+        self.logger.debug("wpa_cli save_config")
+        return 'OK' in self.cmd("save_config")
+
+    def set_wps_pin(self, interface, pin, timeout):
+        self.logger.debug("wpa_cli -i {} wps_pin any {} {}".format(interface, pin, timeout))
+        status = self.cmd("wps_pin any {} {}".format(pin, timeout), interface=interface)
+        return status
+
+    def get_interfaces(self):
+        selected = self.default_interface()
+        interfaces = self.cmd("interfaces")
+        return selected, interfaces
+
+    def get_p2p_interface(self):
+        sel, interfaces = self.get_interfaces()
+        for it in interfaces:
+            if it.startswith("p2p-wl"):
+                return it
+        return None
+
+    def check_p2p_interface(self):
+        if self.get_p2p_interface() is not None:
+            return True
+        return False
@@ -0,0 +1,234 @@
+"""
+picast - a simple wireless display receiver for Raspberry Pi
+
+    Copyright (C) 2019 Hiroshi Miura
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Native client for the wpa_supplicant control interface.
+
+wpa_supplicant listens on a unix datagram socket per interface
+(/var/run/wpa_supplicant/<iface>). A client binds its own socket, sends a
+command per datagram and receives the reply as one datagram, which is what
+wpa_cli does for every invocation. A connection that sent ATTACH also
+receives unsolicited event messages, which WpaMonitor dispatches.
+"""
+
+import itertools
+import os
+import shlex
+import socket
+import tempfile
+import threading
+from logging import getLogger
+
+DEFAULT_CTRL_DIR = '/var/run/wpa_supplicant'
+
+
+class WpaCtrlError(Exception):
+    pass
+
+
+class WpaCtrl:
+    """A persistent connection to the control socket of one interface."""
+
+    _counter = itertools.count()
+
+    def __init__(self, interface, ctrl_dir=DEFAULT_CTRL_DIR, timeout=5.0):
+        self.interface = interface
+        self.ctrl_path = os.path.join(ctrl_dir, interface)
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        self.local_path = os.path.join(tempfile.gettempdir(),
+                                       'picast_wpa_ctrl_{}-{}'.format(os.getpid(), next(self._counter)))
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            if os.path.exists(self.local_path):
+                os.unlink(self.local_path)
+            self.sock.bind(self.local_path)
+            self.sock.connect(self.ctrl_path)
+        except OSError as e:
+            self.close()
+            raise WpaCtrlError("Can not connect to {}: {}".format(self.ctrl_path, e))
+        self.sock.settimeout(self.timeout)
+
+    def _recv_reply(self):
+        while True:
+            try:
+                data = self.sock.recv(4096)
+            except socket.timeout:
+                raise WpaCtrlError("No reply from {}".format(self.ctrl_path))
+            except OSError as e:
+                raise WpaCtrlError("Receive from {} failed: {}".format(self.ctrl_path, e))
+            reply = data.decode('UTF-8', 'replace')
+            if not reply.startswith('<'):  # skip unsolicited event messages
+                return reply
+
+    def request(self, cmd):
+        """Send one command and return its raw reply."""
+        return self.requests([cmd])[0]
+
+    def requests(self, cmds):
+        """Pipeline commands: send them all, then collect the replies in order."""
+        with self.lock:
+            try:
+                for cmd in cmds:
+                    self.sock.send(cmd.encode('UTF-8'))
+            except OSError as e:
+                raise WpaCtrlError("Send to {} failed: {}".format(self.ctrl_path, e))
+            try:
+                return [self._recv_reply() for _ in cmds]
+            except WpaCtrlError:
+                # replies still on their way would be taken for those of the next commands,
+                # let them go to the old socket
+                self.close()
+                self.connect()
+                raise
+
+    def close(self):
+        self.sock.close()
+        try:
+            os.unlink(self.local_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def list_interfaces(ctrl_dir=DEFAULT_CTRL_DIR):
+    """Interfaces that have a control socket, in the order wpa_cli would select them."""
+    try:
+        names = sorted(os.listdir(ctrl_dir))
+    except OSError:
+        return []
+    # prefer the station interface over P2P device and group interfaces
+    return [n for n in names if not n.startswith('p2p-')] + [n for n in names if n.startswith('p2p-')]
+
+
+class WpaEvent:
+    """An unsolicited message such as '<3>P2P-GROUP-STARTED p2p-wlan0-0 GO ssid="DIRECT-xy" freq=2437'."""
+
+    __slots__ = ('level', 'name', 'args', 'params', 'text')
+
+    def __init__(self, text):
+        self.text = text
+        self.level = 0
+        if text.startswith('<'):
+            level, sep, text = text[1:].partition('>')
+            if level.isdigit():
+                self.level = int(level)
+        try:
+            words = shlex.split(text)
+        except ValueError:
+            words = text.split()
+        self.name = words[0] if words else ''
+        self.args = [w for w in words[1:] if '=' not in w]
+        self.params = dict(w.split('=', 1) for w in words[1:] if '=' in w)
+
+    def __repr__(self):
+        return "WpaEvent({})".format(self.text)
+
+
+class WpaEventWaiter:
+    """Registered before the action that triggers the event, so it can not be missed."""
+
+    def __init__(self, monitor, names):
+        self.monitor = monitor
+        self.names = names
+        self.event = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Return the event, or None on timeout."""
+        self.done.wait(timeout)
+        self.monitor.discard(self)
+        return self.event
+
+
+class WpaMonitor:
+    """Attached control connection that dispatches wpa_supplicant events from a reader thread."""
+
+    def __init__(self, interface, ctrl_dir=DEFAULT_CTRL_DIR):
+        self.logger = getLogger("PiCast.wpa_monitor")
+        self.ctrl = WpaCtrl(interface, ctrl_dir)
+        self.lock = threading.Lock()
+        self.handlers = {}
+        self.waiters = []
+        self.thread = None
+
+    def start(self):
+        if self.ctrl.request('ATTACH').strip() != 'OK':
+            raise WpaCtrlError("Can not attach to {}".format(self.ctrl.ctrl_path))
+        self.ctrl.sock.settimeout(None)
+        self.thread = threading.Thread(target=self.run, name='wpa-monitor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        try:
+            self.ctrl.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.ctrl.close()
+
+    def on(self, name, callback):
+        """Call callback(event) from the reader thread for every event called name."""
+        with self.lock:
+            self.handlers.setdefault(name, []).append(callback)
+
+    def expect(self, *names):
+        waiter = WpaEventWaiter(self, names)
+        with self.lock:
+            self.waiters.append(waiter)
+        return waiter
+
+    def wait_for(self, names, timeout):
+        return self.expect(*names).wait(timeout)
+
+    def discard(self, waiter):
+        with self.lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def run(self):
+        while True:
+            try:
+                data = self.ctrl.sock.recv(4096)
+            except OSError:
+                break
+            if not data:
+                break
+            text = data.decode('UTF-8', 'replace')
+            if text.startswith('<'):
+                self.dispatch(WpaEvent(text))
+
+    def dispatch(self, event):
+        self.logger.debug("{}".format(event))
+        with self.lock:
+            handlers = list(self.handlers.get(event.name, ()))
+            for waiter in self.waiters:
+                if event.name in waiter.names and waiter.event is None:
+                    waiter.event = event
+                    waiter.done.set()
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception:
+                self.logger.exception("Handler for {} failed".format(event.name))
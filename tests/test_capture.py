@@ -0,0 +1,64 @@
+import gzip
+
+import pytest
+
+from picast.capture import RTP_IN, RTSP_IN, RTSP_OUT, CaptureWriter, Replay, read_capture
+from picast.exceptions import PiCastException
+from picast.rtsp import rtsp_request, rtsp_response
+
+M1 = rtsp_request('OPTIONS', '*', 1, [('Require', 'org.wfa.wfd1.0')])
+M1_REPLY = rtsp_response(1, headers=[('Public', 'org.wfa.wfd1.0, SET_PARAMETER, GET_PARAMETER')])
+M2 = rtsp_request('OPTIONS', '*', 100, [('Require', 'org.wfa.wfd1.0')])
+
+
+def write(path, records):
+    writer = CaptureWriter(str(path))
+    for kind, data in records:
+        writer.write(kind, data)
+    writer.close()
+
+
+@pytest.mark.parametrize('name', ['session.wfdcap', 'session.wfdcap.gz'])
+def test_round_trip(tmp_path, name):
+    records = [(RTSP_IN, M1), (RTSP_OUT, M1_REPLY + M2), (RTP_IN, b'\x80\x21' + bytes(186)), (RTSP_IN, b'')]
+    write(tmp_path / name, records)
+    read = list(read_capture(str(tmp_path / name)))
+    assert [(kind, data) for kind, stamp, data in read] == records
+    stamps = [stamp for kind, stamp, data in read]
+    assert stamps == sorted(stamps) and stamps[0] >= 0
+
+
+def test_compressed(tmp_path):
+    write(tmp_path / 'session.wfdcap.gz', [(RTSP_IN, M1)])
+    with gzip.open(str(tmp_path / 'session.wfdcap.gz'), 'rb') as f:
+        assert f.read().endswith(M1)
+
+
+def test_write_after_close(tmp_path):
+    writer = CaptureWriter(str(tmp_path / 'session.wfdcap'))
+    writer.rtsp_in(M1)
+    writer.close()
+    writer.rtsp_out(M1_REPLY)
+    assert len(list(read_capture(str(tmp_path / 'session.wfdcap')))) == 1
+
+
+def test_not_a_capture(tmp_path):
+    (tmp_path / 'other').write_bytes(b'RTSP/1.0 200 OK\r\n')
+    with pytest.raises(PiCastException):
+        list(read_capture(str(tmp_path / 'other')))
+
+
+def test_truncated(tmp_path):
+    path = tmp_path / 'session.wfdcap'
+    write(path, [(RTSP_IN, M1)])
+    path.write_bytes(path.read_bytes()[:-3])
+    with pytest.raises(PiCastException):
+        list(read_capture(str(path)))
+
+
+def test_replay_plan():
+    records = [(RTSP_IN, 0.0, M1), (RTSP_OUT, 0.001, M1_REPLY + M2), (RTSP_IN, 0.002, M1_REPLY),
+               (RTP_IN, 0.5, b'rtp')]
+    replay = Replay(records)
+    assert replay.received is None
+    assert replay.plan == [(0.0, RTSP_IN, M1, 0), (0.002, RTSP_IN, M1_REPLY, 2), (0.5, RTP_IN, b'rtp', 2)]
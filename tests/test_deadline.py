@@ -0,0 +1,54 @@
+import asyncio
+
+from picast.deadline import Deadline
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_expires():
+    async def main():
+        loop = asyncio.get_running_loop()
+        fired = []
+        deadline = Deadline(loop, 0.05, lambda: fired.append(loop.time()))
+        assert not deadline.armed and deadline.remaining() is None
+        start = loop.time()
+        deadline.start()
+        assert deadline.armed and 0 < deadline.remaining() <= 0.05
+        await asyncio.sleep(0.1)
+        assert len(fired) == 1 and fired[0] - start >= 0.05
+        assert not deadline.armed
+    run(main())
+
+
+def test_touch_postpones():
+    async def main():
+        loop = asyncio.get_running_loop()
+        fired = []
+        deadline = Deadline(loop, 0.05, lambda: fired.append(loop.time()))
+        start = loop.time()
+        deadline.start()
+        for _ in range(4):
+            await asyncio.sleep(0.03)
+            deadline.touch()
+        assert not fired
+        await asyncio.sleep(0.1)
+        assert len(fired) == 1 and fired[0] - start >= 0.17
+    run(main())
+
+
+def test_cancel_and_restart():
+    async def main():
+        loop = asyncio.get_running_loop()
+        fired = []
+        deadline = Deadline(loop, 0.03, lambda: fired.append(deadline.timeout))
+        deadline.start()
+        deadline.cancel()
+        assert not deadline.armed and deadline.handle is None
+        await asyncio.sleep(0.05)
+        assert fired == []
+        deadline.start(0.01)
+        await asyncio.sleep(0.05)
+        assert fired == [0.01]
+    run(main())
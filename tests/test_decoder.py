@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+pytest.importorskip('gi')
+from picast import decoder  # noqa: E402
+from picast.settings import Settings  # noqa: E402
+
+
+@pytest.fixture
+def probed(monkeypatch, tmp_path):
+    """Decoders the registry offers, and the codecs probed so far."""
+    calls = []
+
+    def probe(codec):
+        calls.append(codec)
+        return ['v4l2h264dec', 'omxh264dec', 'avdec_h264']
+
+    monkeypatch.setattr(decoder, 'probe', probe)
+    monkeypatch.setattr(decoder, 'registry_key', lambda: 'gst 1.22')
+    monkeypatch.setattr(decoder, '_cache', None)
+    monkeypatch.setattr(decoder, '_failed', {})
+    monkeypatch.setattr(decoder, '_users', {})
+    monkeypatch.setattr(Settings, 'decoder', None)
+    monkeypatch.setattr(Settings, 'decoder_cache', str(tmp_path / 'picast' / 'decoders.json'))
+    return calls
+
+
+def test_ranking_is_cached(probed):
+    assert decoder.get_decoders('h264') == ['v4l2h264dec', 'omxh264dec', 'avdec_h264']
+    assert decoder.get_decoders('h264') == ['v4l2h264dec', 'omxh264dec', 'avdec_h264']
+    assert probed == ['h264']
+    with open(Settings.decoder_cache) as f:
+        assert json.load(f)['decoders'] == {'h264': ['v4l2h264dec', 'omxh264dec', 'avdec_h264']}
+    # a later start reads the cache instead of probing
+    decoder._cache = None
+    decoder.get_decoders('h264')
+    assert probed == ['h264']
+
+
+def test_registry_change_probes_again(probed, monkeypatch):
+    decoder.get_decoders('h264')
+    decoder._cache = None
+    monkeypatch.setattr(decoder, 'registry_key', lambda: 'gst 1.24')
+    decoder.get_decoders('h264')
+    assert probed == ['h264', 'h264']
+
+
+def test_forced_decoder(probed, monkeypatch):
+    monkeypatch.setattr(Settings, 'decoder', 'avdec_h264')
+    assert decoder.get_decoders('h264') == ['avdec_h264', 'v4l2h264dec', 'omxh264dec']
+
+
+def test_failed_decoder_ranks_last(probed, monkeypatch):
+    assert decoder.mark_failed('v4l2h264dec')
+    assert decoder.get_decoders('h264') == ['omxh264dec', 'avdec_h264', 'v4l2h264dec']
+    # failures are not kept across runs
+    with open(Settings.decoder_cache) as f:
+        assert 'failed' not in json.load(f)
+    # and only for Settings.decoder_retry
+    monkeypatch.setattr(Settings, 'decoder_retry', 0)
+    assert decoder.get_decoders('h264')[0] == 'v4l2h264dec'
+
+
+def test_busy_decoder(probed):
+    decoder.hold_decoder('v4l2h264dec')
+    decoder.hold_decoder('v4l2h264dec')
+    # the second pipeline failing to get a busy hardware decoder does not rank it down
+    assert not decoder.mark_failed('v4l2h264dec')
+    decoder.release_decoder('v4l2h264dec')
+    assert not decoder.mark_failed('v4l2h264dec')
+    assert decoder.get_decoders('h264')[0] == 'v4l2h264dec'
+    decoder.release_decoder('v4l2h264dec')
+    assert decoder._users == {}
+    assert decoder.mark_failed('v4l2h264dec')
+    assert decoder.get_decoders('h264')[-1] == 'v4l2h264dec'
+
+
+def test_corrupt_cache(probed):
+    decoder.get_decoders('h264')
+    with open(Settings.decoder_cache, 'w') as f:
+        f.write('{')
+    decoder._cache = None
+    assert decoder.get_decoders('h264') == ['v4l2h264dec', 'omxh264dec', 'avdec_h264']
+    assert probed == ['h264', 'h264']
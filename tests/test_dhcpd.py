@@ -0,0 +1,206 @@
+import asyncio
+import socket
+
+import pytest
+
+from picast.dhcpd import (ANY, BOOTREPLY, BOOTREQUEST, BROADCAST_FLAG, DHCPACK, DHCPDECLINE, DHCPDISCOVER, DHCPNAK,
+                          DHCPOFFER, DHCPRELEASE, DHCPREQUEST, OPTION_HOSTNAME, OPTION_LEASE_TIME,
+                          OPTION_MESSAGE_TYPE, OPTION_REQUESTED_ADDRESS, OPTION_SERVER_ID, OPTION_SUBNET_MASK,
+                          DhcpMessage, DhcpServer, LeasePool)
+
+SERVER = '192.168.173.1'
+MAC1 = bytes.fromhex('020000000001')
+MAC2 = bytes.fromhex('020000000002')
+
+
+class FakeTransport:
+
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((DhcpMessage.parse(data), addr))
+
+
+def request(kind, chaddr, xid=b'\x00\x00\x00\x01', ciaddr=ANY, flags=0, **options):
+    codes = {'requested': OPTION_REQUESTED_ADDRESS, 'server_id': OPTION_SERVER_ID, 'hostname': OPTION_HOSTNAME}
+    opts = {OPTION_MESSAGE_TYPE: bytes([kind])}
+    for name, value in options.items():
+        opts[codes[name]] = value.encode() if name == 'hostname' else socket.inet_aton(value)
+    return DhcpMessage(BOOTREQUEST, xid, flags, ciaddr, chaddr=chaddr, options=opts).to_bytes()
+
+
+class Client:
+    """Runs a DhcpServer on the current loop and records its replies and lease events."""
+
+    def __init__(self, size=2, lease_time=300):
+        self.events = []
+        self.transport = FakeTransport()
+        self.server = DhcpServer(SERVER, '255.255.255.0', LeasePool('192.168.173.80', size), lease_time,
+                                 lambda event, lease: self.events.append((event, lease.address, lease.mac)),
+                                 client_port=68, broadcast='192.168.173.255')
+        self.server.connection_made(self.transport)
+
+    def send(self, data):
+        del self.transport.sent[:]
+        self.server.datagram_received(data, ('0.0.0.0', 68))
+        return self.transport.sent
+
+    def bind(self, mac, hostname='source'):
+        (offer, addr), = self.send(request(DHCPDISCOVER, mac))
+        (ack, addr), = self.send(request(DHCPREQUEST, mac, requested=offer.yiaddr, server_id=SERVER,
+                                         hostname=hostname))
+        assert ack.type == DHCPACK
+        return ack.yiaddr
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_message_round_trip():
+    data = request(DHCPREQUEST, MAC1, ciaddr='192.168.173.80', requested='192.168.173.80', hostname='phone')
+    msg = DhcpMessage.parse(data)
+    assert (msg.op, msg.type, msg.mac, msg.ciaddr) == (BOOTREQUEST, DHCPREQUEST, '02:00:00:00:00:01', '192.168.173.80')
+    assert msg.address_option(OPTION_REQUESTED_ADDRESS) == '192.168.173.80'
+    assert msg.address_option(OPTION_SERVER_ID) is None
+    assert msg.options[OPTION_HOSTNAME] == b'phone'
+
+
+@pytest.mark.parametrize('data', [b'', bytes(240), request(DHCPDISCOVER, MAC1)[:-1] + b'\x0c\x05ab'])
+def test_message_malformed(data):
+    with pytest.raises(ValueError):
+        DhcpMessage.parse(data)
+
+
+def test_pool():
+    pool = LeasePool('192.168.173.80', 2)
+    first = pool.offer('a')
+    assert first.address == '192.168.173.80'
+    assert pool.offer('a') is first
+    second = pool.offer('b', requested='192.168.173.80')
+    assert second.address == '192.168.173.81'
+    first.bound = second.bound = True
+    assert pool.offer('c') is None
+    pool.remove(second)
+    assert pool.offer('c').address == '192.168.173.81'
+    # an unrequested offer is taken over when the pool is used up
+    assert pool.offer('d').address == '192.168.173.81'
+    assert pool.get('c') is None
+
+
+def test_pool_previous_address():
+    pool = LeasePool('192.168.173.80', 3)
+    pool.remove(pool.offer('a'))
+    assert pool.offer('b').address == '192.168.173.81'
+    assert pool.offer('a').address == '192.168.173.80'
+
+
+def test_pool_decline():
+    pool = LeasePool('192.168.173.80', 2)
+    pool.decline(pool.offer('a'))
+    assert not pool.is_free('192.168.173.80')
+    assert pool.offer('a').address == '192.168.173.81'
+
+
+def test_discover_request_ack():
+    async def main():
+        client = Client()
+        (offer, addr), = client.send(request(DHCPDISCOVER, MAC1))
+        assert (offer.op, offer.type, offer.yiaddr) == (BOOTREPLY, DHCPOFFER, '192.168.173.80')
+        assert addr == ('192.168.173.255', 68)
+        assert offer.address_option(OPTION_SERVER_ID) == SERVER
+        assert offer.address_option(OPTION_SUBNET_MASK) == '255.255.255.0'
+        assert offer.options[OPTION_LEASE_TIME] == (300).to_bytes(4, 'big')
+        assert client.events == []
+        (ack, addr), = client.send(request(DHCPREQUEST, MAC1, requested=offer.yiaddr, server_id=SERVER,
+                                           hostname='phone'))
+        assert (ack.type, ack.yiaddr, ack.chaddr) == (DHCPACK, '192.168.173.80', MAC1)
+        assert client.events == [('bound', '192.168.173.80', '02:00:00:00:00:01')]
+        assert client.server.pool.get('02:00:00:00:00:01').hostname == 'phone'
+        # renewal is unicast unless the client asks for broadcast, and is not a new lease
+        (ack, addr), = client.send(request(DHCPREQUEST, MAC1, ciaddr='192.168.173.80'))
+        assert ack.type == DHCPACK and addr == ('192.168.173.80', 68)
+        (ack, addr), = client.send(request(DHCPREQUEST, MAC1, ciaddr='192.168.173.80', flags=BROADCAST_FLAG))
+        assert addr == ('192.168.173.255', 68)
+        assert len(client.events) == 1
+    run(main())
+
+
+def test_request_nak():
+    async def main():
+        client = Client()
+        client.send(request(DHCPDISCOVER, MAC1))
+        (nak, addr), = client.send(request(DHCPREQUEST, MAC1, requested='192.168.173.81', server_id=SERVER))
+        assert nak.type == DHCPNAK and nak.yiaddr == ANY
+        assert client.server.pool.get('02:00:00:00:00:01') is None
+        # INIT-REBOOT for an address outside the pool
+        (nak, addr), = client.send(request(DHCPREQUEST, MAC2, requested='10.0.0.5'))
+        assert nak.type == DHCPNAK
+        assert client.events == []
+    run(main())
+
+
+def test_request_init_reboot():
+    async def main():
+        client = Client()
+        (ack, addr), = client.send(request(DHCPREQUEST, MAC1, requested='192.168.173.81'))
+        assert (ack.type, ack.yiaddr) == (DHCPACK, '192.168.173.81')
+        assert client.events == [('bound', '192.168.173.81', '02:00:00:00:00:01')]
+    run(main())
+
+
+def test_request_for_other_server():
+    async def main():
+        client = Client()
+        client.send(request(DHCPDISCOVER, MAC1))
+        assert client.send(request(DHCPREQUEST, MAC1, requested='192.168.173.80', server_id='192.168.173.2')) == []
+        assert client.server.pool.get('02:00:00:00:00:01') is None
+    run(main())
+
+
+def test_pool_exhausted():
+    async def main():
+        client = Client(size=1)
+        client.bind(MAC1)
+        assert client.send(request(DHCPDISCOVER, MAC2)) == []
+    run(main())
+
+
+def test_release_and_decline():
+    async def main():
+        client = Client()
+        address = client.bind(MAC1)
+        assert client.send(request(DHCPRELEASE, MAC1, ciaddr=address)) == []
+        assert client.events[-1] == ('released', address, '02:00:00:00:00:01')
+        address = client.bind(MAC1)
+        client.send(request(DHCPDECLINE, MAC1, requested=address))
+        assert client.events[-1] == ('declined', address, '02:00:00:00:00:01')
+        assert client.bind(MAC1) != address
+    run(main())
+
+
+def test_expiry():
+    async def main():
+        client = Client(lease_time=1)
+        address = client.bind(MAC1)
+        await asyncio.sleep(0.6)
+        client.send(request(DHCPREQUEST, MAC1, ciaddr=address))
+        await asyncio.sleep(0.6)
+        assert client.events == [('bound', address, '02:00:00:00:00:01')]
+        await asyncio.sleep(0.5)
+        assert client.events[-1] == ('expired', address, '02:00:00:00:00:01')
+        assert client.server.pool.get('02:00:00:00:00:01') is None
+        (nak, addr), = client.send(request(DHCPREQUEST, MAC2, requested='192.168.173.80', server_id=SERVER))
+        assert nak.type == DHCPNAK
+    run(main())
+
+
+def test_ignores_garbage_and_replies():
+    async def main():
+        client = Client()
+        assert client.send(b'\x01\x02') == []
+        reply = DhcpMessage(BOOTREPLY, b'\x00\x00\x00\x01', chaddr=MAC1,
+                            options={OPTION_MESSAGE_TYPE: bytes([DHCPDISCOVER])}).to_bytes()
+        assert client.send(reply) == []
+    run(main())
@@ -0,0 +1,89 @@
+import asyncio
+import socket
+
+from picast.metrics import Histogram, MetricsServer, family, format_labels, render
+
+
+def test_format_labels():
+    assert format_labels({}) == ''
+    assert format_labels({'port': 1028, 'peer': 'a"b\\c'}) == '{peer="a\\"b\\\\c",port="1028"}'
+
+
+def test_render():
+    text = render([
+        ('picast_rtp_packets_lost_total', {'peer': 'a'}, 2),
+        ('picast_sessions', {}, 1),
+        ('picast_rtp_jitter_seconds', {'peer': 'a'}, None),
+        ('picast_rtp_packets_lost_total', {'peer': 'b'}, 0),
+        ('picast_custom', {}, 5),
+    ])
+    assert text.splitlines() == [
+        '# HELP picast_sessions Active sessions',
+        '# TYPE picast_sessions gauge',
+        'picast_sessions 1',
+        '# HELP picast_rtp_packets_lost_total RTP packets the jitter buffer gave up on',
+        '# TYPE picast_rtp_packets_lost_total counter',
+        'picast_rtp_packets_lost_total{peer="a"} 2',
+        'picast_rtp_packets_lost_total{peer="b"} 0',
+        '# HELP picast_custom picast_custom',
+        '# TYPE picast_custom untyped',
+        'picast_custom 5',
+    ]
+    assert text.endswith('\n')
+
+
+def test_histogram():
+    histogram = Histogram('picast_negotiation_step_seconds', (0.1, 0.01, 1))
+    histogram.observe({'step': 'm1'}, 0.05)
+    histogram.observe({'step': 'm1'}, 2)
+    histogram.observe({'step': 'm3'}, 0.001)
+    samples = {(name, tuple(sorted(labels.items()))): value for name, labels, value in histogram.samples()}
+    m1 = (('step', 'm1'),)
+    assert samples[('picast_negotiation_step_seconds_bucket', (('le', 0.01),) + m1)] == 0
+    assert samples[('picast_negotiation_step_seconds_bucket', (('le', 0.1),) + m1)] == 1
+    assert samples[('picast_negotiation_step_seconds_bucket', (('le', 1),) + m1)] == 1
+    assert samples[('picast_negotiation_step_seconds_bucket', (('le', '+Inf'),) + m1)] == 2
+    assert samples[('picast_negotiation_step_seconds_sum', m1)] == 2.05
+    assert samples[('picast_negotiation_step_seconds_count', m1)] == 2
+    assert samples[('picast_negotiation_step_seconds_count', (('step', 'm3'),))] == 1
+
+
+def test_histogram_render():
+    histogram = Histogram('picast_negotiation_step_seconds', (0.1,))
+    histogram.observe({'step': 'm1'}, 0.05)
+    assert family('picast_negotiation_step_seconds_bucket') == 'picast_negotiation_step_seconds'
+    assert family('picast_rtp_packets_lost_total') == 'picast_rtp_packets_lost_total'
+    lines = render(histogram.samples()).splitlines()
+    assert lines[1] == '# TYPE picast_negotiation_step_seconds histogram'
+    assert lines[2:] == [
+        'picast_negotiation_step_seconds_bucket{le="0.1",step="m1"} 1',
+        'picast_negotiation_step_seconds_bucket{le="+Inf",step="m1"} 1',
+        'picast_negotiation_step_seconds_sum{step="m1"} 0.05',
+        'picast_negotiation_step_seconds_count{step="m1"} 1',
+    ]
+
+
+def test_metrics_server():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    async def get(path, method='GET'):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write('{} {} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(method, path).encode())
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        return response.decode()
+
+    async def main():
+        server = MetricsServer(lambda: [('picast_sessions', {}, 1)])
+        await server.start('127.0.0.1', port)
+        try:
+            response = await get('/metrics')
+            assert response.startswith('HTTP/1.0 200 OK\r\n')
+            assert response.endswith('\r\n\r\n' + render([('picast_sessions', {}, 1)]))
+            assert (await get('/')).startswith('HTTP/1.0 404 ')
+            assert (await get('/metrics', 'POST')).startswith('HTTP/1.0 405 ')
+        finally:
+            server.close()
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+import json
+import os
+import stat
+
+from picast.p2pstate import P2PState
+from picast.settings import Settings
+
+GROUP = ('2', 'DIRECT-xy-picast', 'secret12', 'aa:bb:cc:dd:ee:ff')
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'picast' / 'p2p.json')
+    state = P2PState(path)
+    assert state.group is None and state.network_id is None
+    state.set_group(*GROUP)
+    state.add_known('02:11:22:33:44:55')
+    # the file holds the passphrase
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    state = P2PState(path)
+    assert state.network_id == '2'
+    assert state.group['passphrase'] == 'secret12'
+    assert state.is_known('02:11:22:33:44:55') and not state.is_known(None)
+
+
+def test_existing_file_made_private(tmp_path):
+    path = tmp_path / 'p2p.json'
+    path.write_text('{}')
+    path.chmod(0o644)
+    P2PState(str(path)).set_group(*GROUP)
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+
+def test_corrupt_file(tmp_path):
+    path = tmp_path / 'p2p.json'
+    for content in ('{', '[]', json.dumps({'group': None, 'known': 'x'})):
+        path.write_text(content)
+        state = P2PState(str(path))
+        assert state.group is None and state.known == {}
+
+
+def test_new_group_forgets_sources(tmp_path):
+    state = P2PState(str(tmp_path / 'p2p.json'))
+    state.set_group(*GROUP)
+    state.add_known('02:11:22:33:44:55')
+    state.set_group('3', 'DIRECT-zz-picast', 'other123', GROUP[3])
+    assert state.known == {}
+
+
+def test_known_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings, 'p2p_known_max', 2)
+    state = P2PState(str(tmp_path / 'p2p.json'))
+    state.known = {'02:00:00:00:00:01': 1, '02:00:00:00:00:02': 2}
+    state.add_known('02:00:00:00:00:03')
+    assert sorted(state.known) == ['02:00:00:00:00:02', '02:00:00:00:00:03']
+
+
+def test_persistent_network(tmp_path):
+    state = P2PState(str(tmp_path / 'p2p.json'))
+    state.set_group(*GROUP)
+    networks = [('0', 'home', 'any', '[CURRENT]'), ('2', 'DIRECT-xy-picast', 'any', '[DISABLED][P2P-PERSISTENT]')]
+    assert state.persistent_network(networks) == '2'
+    # removed or replaced by wpa_supplicant
+    assert state.persistent_network(networks[:1]) is None
+    assert state.persistent_network([('2', 'DIRECT-xy-picast', 'any', '[DISABLED]')]) is None
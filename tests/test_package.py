@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+def imported_modules(statement):
+    """Top-level modules loaded by statement in a fresh interpreter."""
+    code = 'import sys; sys.path.insert(0, {!r}); {}; print(" ".join(sorted(sys.modules)))'.format(
+        SRC, statement)
+    return set(subprocess.check_output([sys.executable, '-c', code]).decode().split())
+
+
+def test_import_is_lazy():
+    modules = imported_modules('import picast')
+    assert 'picast.rtspserver' not in modules and 'gi' not in modules
+
+
+def test_control_plane_without_gi():
+    modules = imported_modules('import picast.rtspserver, picast.wifip2p, picast.dhcpd')
+    assert 'gi' not in modules and 'picast.player' not in modules
+
+
+def test_exports():
+    import picast
+    from picast.dhcpd import DhcpServer
+    assert picast.DhcpServer is DhcpServer
+    assert 'GstPlayer' in picast.__all__
@@ -0,0 +1,89 @@
+import pytest
+
+from picast.rtsp import RtspError, RtspFramer, parse_header_params, rtsp_request, rtsp_response
+
+M3 = rtsp_request('GET_PARAMETER', 'rtsp://localhost/wfd1.0', 2, [('Content-Type', 'text/parameters')],
+                  'wfd_video_formats\r\nwfd_audio_codecs\r\n')
+OK = rtsp_response(3, headers=[('Session', 'abc;timeout=30')])
+
+
+def messages(framer):
+    return list(framer)
+
+
+def test_split_message():
+    framer = RtspFramer()
+    for i in range(len(M3)):
+        framer.feed(M3[i:i + 1])
+        if i < len(M3) - 1:
+            assert framer.next_message() is None
+    msg = framer.next_message()
+    assert msg.is_request and msg.method == 'GET_PARAMETER'
+    assert msg.cseq == 2
+    assert msg.get('Content-Type') == 'text/parameters'
+    assert msg.parameters == {'wfd_video_formats': None, 'wfd_audio_codecs': None}
+    assert framer.next_message() is None
+
+
+def test_split_in_body():
+    framer = RtspFramer()
+    head = M3.index(b'\r\n\r\n') + 4
+    framer.feed(M3[:head + 3])
+    assert framer.next_message() is None
+    framer.feed(M3[head + 3:])
+    assert framer.next_message().body == b'wfd_video_formats\r\nwfd_audio_codecs\r\n'
+
+
+def test_coalesced_messages():
+    framer = RtspFramer()
+    framer.feed(M3 + b'\r\n' + OK + M3[:10])
+    first, second = messages(framer)
+    assert first.method == 'GET_PARAMETER'
+    assert not second.is_request and second.status == 200 and second.reason == 'OK'
+    assert parse_header_params(second.get('Session')) == ('abc', {'timeout': '30'})
+    framer.feed(M3[10:])
+    assert [msg.cseq for msg in framer] == [2]
+
+
+def test_round_trip():
+    framer = RtspFramer()
+    framer.feed(M3)
+    msg = framer.next_message()
+    framer.feed(msg.to_bytes())
+    again = framer.next_message()
+    assert (again.method, again.url, again.headers, again.body) == (msg.method, msg.url, msg.headers, msg.body)
+
+
+def test_many_messages_compact_buffer():
+    framer = RtspFramer(max_message_size=1024)
+    for _ in range(100):
+        framer.feed(OK)
+        assert framer.next_message().cseq == 3
+    assert len(framer.buffer) <= 1024 + len(OK)
+
+
+def test_header_too_long():
+    framer = RtspFramer(max_message_size=64)
+    framer.feed(b'OPTIONS * RTSP/1.0\r\n' + b'X: y\r\n' * 20)
+    with pytest.raises(RtspError):
+        framer.next_message()
+
+
+@pytest.mark.parametrize('data', [
+    b'RTSP/1.0 abc OK\r\nCSeq: 1\r\n\r\n',
+    b'GARBAGE\r\nCSeq: 1\r\n\r\n',
+    b'OPTIONS * RTSP/1.0\r\nContent-Length: x\r\n\r\n',
+    b'OPTIONS * RTSP/1.0\r\nContent-Length: -1\r\n\r\n',
+])
+def test_malformed(data):
+    framer = RtspFramer()
+    framer.feed(data)
+    with pytest.raises(RtspError):
+        framer.next_message()
+
+
+def test_missing_cseq():
+    framer = RtspFramer()
+    framer.feed(b'OPTIONS * RTSP/1.0\r\n\r\n')
+    with pytest.raises(RtspError):
+        framer.next_message().cseq
@@ -0,0 +1,433 @@
+import asyncio
+import socket
+import sys
+import threading
+import types
+
+import pytest
+
+from picast.dhcpd import Lease
+from picast.rtspserver import IdrRequester, PiCast, RtpPortPool, SessionCache
+from picast.settings import Settings
+
+M3_BODY = 'wfd_video_formats\r\nwfd_audio_codecs\r\nwfd_client_rtp_ports\r\n'
+M4_BODY = 'wfd_video_formats: 00 00 01 01 00000001 00000000 00000000 00 0000 0000 00 none none\r\n' \
+          'wfd_audio_codecs: AAC 00000001 00\r\n' \
+          'wfd_client_rtp_ports: RTP/AVP/UDP;unicast 1028 0 mode=play\r\n'
+
+
+class FakePlayer:
+
+    players = []  # every player built, in order
+
+    def __init__(self, rtp_port, on_loss=None, on_rtp_timeout=None, fmt=None, decoder=None, window=None, **kwargs):
+        self.rtp_port = rtp_port
+        self.window = window
+        self.on_loss = on_loss
+        self.on_rtp_timeout = on_rtp_timeout
+        self.fmt = fmt
+        self.decoder_name = decoder or 'avdec_h264'
+        self.kept = False  # stopped to READY for reuse
+        self.calls = []
+        self.thread = threading.current_thread()
+        self.players.append(self)
+
+    @classmethod
+    def max_levels(cls):
+        return {'h264': '4.2'}
+
+    def prepare(self, fmt=None):
+        if fmt is not None:
+            self.fmt = fmt
+        self.calls.append('prepare')
+
+    def run(self, *args, **kwargs):
+        self.calls.append('run')
+
+    def stop(self, keep=False):
+        self.kept = keep
+        self.calls.append('stop')
+
+
+class Source:
+    """The WFD source end of an RTSP connection, one message at a time."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.cseq = 0
+
+    @classmethod
+    async def connect(cls):
+        for _ in range(100):
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', Settings.rtsp_port)
+            except OSError:
+                await asyncio.sleep(0.01)
+            else:
+                return cls(reader, writer)
+        raise AssertionError('the sink does not listen')
+
+    async def recv(self):
+        """(start line, headers, body) of the next message of the sink."""
+        head = await asyncio.wait_for(self.reader.readuntil(b'\r\n\r\n'), 5)
+        lines = head.decode().split('\r\n')
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        body = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        return lines[0], headers, body.decode()
+
+    def send(self, start_line, cseq, headers=(), body=''):
+        lines = [start_line, 'CSeq: {}'.format(cseq)] + ['{}: {}'.format(k, v) for k, v in headers]
+        if body:
+            lines.append('Content-Length: {}'.format(len(body)))
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n' + body).encode())
+
+    async def request(self, method, body='', url='rtsp://localhost/wfd1.0'):
+        self.cseq += 1
+        self.send('{} {} RTSP/1.0'.format(method, url), self.cseq, body=body)
+        start_line, headers, body = await self.recv()
+        assert start_line.startswith('RTSP/1.0') and int(headers['cseq']) == self.cseq
+        return headers, body
+
+    async def respond(self, method, headers=()):
+        start_line, request_headers, body = await self.recv()
+        assert start_line.startswith(method + ' ')
+        self.send('RTSP/1.0 200 OK', request_headers['cseq'], headers)
+        return request_headers, body
+
+    async def negotiate(self, session='abc123;timeout=30'):
+        """M1-M7; returns the RTP port the sink announced."""
+        headers, body = await self.request('OPTIONS', url='*')
+        assert 'SET_PARAMETER' in headers['public']
+        await self.respond('OPTIONS')
+        headers, body = await self.request('GET_PARAMETER', M3_BODY)
+        assert 'wfd_video_formats: ' in body
+        rtp_port = int(body.split('wfd_client_rtp_ports: ')[1].split()[1])
+        await self.request('SET_PARAMETER', M4_BODY)
+        await self.request('SET_PARAMETER', 'wfd_trigger_method: SETUP\r\n')
+        headers, body = await self.respond('SETUP', [('Session', session),
+                                                     ('Transport', 'RTP/AVP/UDP;unicast;client_port=1028;'
+                                                                   'server_port=5000-5001')])
+        assert 'client_port=' in headers['transport']
+        headers, body = await self.respond('PLAY')
+        assert headers['session'] == 'abc123'
+        return rtp_port
+
+    async def closed(self):
+        """True once the sink closed the connection."""
+        while True:
+            data = await asyncio.wait_for(self.reader.read(4096), 5)
+            if not data:
+                return True
+
+    def close(self):
+        self.writer.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    # sessions import the player lazily; hand them the fake instead of the gi one
+    monkeypatch.setitem(sys.modules, 'picast.player', types.SimpleNamespace(GstPlayer=FakePlayer))
+    monkeypatch.setattr(FakePlayer, 'players', [])
+    monkeypatch.setattr(Settings, 'myaddress', '127.0.0.1')
+    monkeypatch.setattr(Settings, 'rtsp_port', free_port())
+    return PiCast(object())
+
+
+async def until(predicate):
+    for _ in range(100):
+        if predicate():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def run(sink, source):
+    """Serve with sink while the coroutine function source runs."""
+    async def main():
+        server = asyncio.ensure_future(sink.serve())
+        try:
+            return await source()
+        finally:
+            server.cancel()
+    return asyncio.run(main())
+
+
+def test_negotiation_and_teardown(sink):
+    async def source():
+        src = await Source.connect()
+        rtp_port = await src.negotiate()
+        player, = FakePlayer.players
+        assert player.rtp_port == rtp_port
+        # built in the executor, not on the event loop
+        assert player.thread is not threading.current_thread()
+        # the player sizes the window to the mode the source selected in M4
+        assert player.window is sink.window
+        assert (player.fmt.res.width, player.fmt.res.height) == (640, 480)
+        assert list(sink.sessions) == [rtp_port]
+        # keepalive of the source
+        await src.request('GET_PARAMETER')
+        src.cseq += 1
+        src.send('SET_PARAMETER rtsp://localhost/wfd1.0 RTSP/1.0', src.cseq, body='wfd_trigger_method: TEARDOWN\r\n')
+        assert await src.closed()
+        assert player.calls[-1] == 'stop'
+        assert sink.sessions == {}
+    run(sink, source)
+
+
+def test_early_close(sink):
+    async def source():
+        src = await Source.connect()
+        await src.request('OPTIONS', url='*')
+        src.close()
+        # the player built for it is stopped
+        assert await until(lambda: FakePlayer.players and FakePlayer.players[0].calls[-1:] == ['stop'])
+        # the sink serves the next source
+        src = await Source.connect()
+        await src.negotiate()
+        src.close()
+    run(sink, source)
+
+
+def test_unexpected_message(sink):
+    async def source():
+        src = await Source.connect()
+        src.send('SET_PARAMETER rtsp://localhost/wfd1.0 RTSP/1.0', 1, body='wfd_trigger_method: SETUP\r\n')
+        assert await src.closed()
+        assert sink.sessions == {}
+    run(sink, source)
+
+
+def test_concurrent_sessions(sink, monkeypatch):
+    monkeypatch.setattr(Settings, 'max_sessions', 2)
+    sink.ports = RtpPortPool(Settings.rtp_port, 2)
+
+    async def source():
+        first, second = await Source.connect(), await Source.connect()
+        ports = await asyncio.gather(first.negotiate(), second.negotiate())
+        assert sorted(ports) == [Settings.rtp_port, Settings.rtp_port + 2]
+        assert sorted(player.rtp_port for player in FakePlayer.players) == sorted(ports)
+        third = await Source.connect()
+        headers, body = await third.request('OPTIONS', url='*')
+        assert await third.closed()
+        # a source that leaves frees its port for the next one
+        first.close()
+        assert await until(lambda: len(sink.sessions) == 1)
+        third = await Source.connect()
+        assert await third.negotiate() == ports[0]
+    run(sink, source)
+
+
+def test_rtp_port_pool():
+    pool = RtpPortPool(1028, 2)
+    assert [pool.acquire(), pool.acquire(), pool.acquire()] == [1028, 1030, None]
+    pool.release(1030)
+    pool.release(1028)
+    assert pool.acquire() == 1028
+
+
+def test_idr_requester(monkeypatch):
+    monkeypatch.setattr(Settings, 'idr_coalesce', 0.02)
+    monkeypatch.setattr(Settings, 'idr_min_interval', 0.2)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        idr = IdrRequester(loop, event)
+        start = loop.time()
+        for reason in ('loss', 'loss', 'decoder error'):
+            idr.request(reason)
+        await asyncio.wait_for(event.wait(), 1)
+        assert loop.time() - start < 0.2
+        event.clear()
+        # the reports of a burst become one request
+        await asyncio.sleep(0.05)
+        assert not event.is_set()
+        # the next one waits for the minimum interval
+        idr.request('loss')
+        await asyncio.wait_for(event.wait(), 1)
+        assert loop.time() - start >= 0.2
+        event.clear()
+        idr.request('loss')
+        await asyncio.sleep(0)
+        idr.cancel()
+        await asyncio.sleep(0.3)
+        assert not event.is_set()
+    asyncio.run(main())
+
+
+def test_idr_request_on_loss(sink, monkeypatch):
+    monkeypatch.setattr(Settings, 'idr_coalesce', 0.01)
+
+    async def source():
+        src = await Source.connect()
+        await src.negotiate()
+        player, = FakePlayer.players
+        player.on_loss('loss')
+        player.on_loss('loss')
+        headers, body = await src.respond('SET_PARAMETER')
+        assert body == 'wfd-idr-request\r\n'
+        src.close()
+    run(sink, source)
+
+
+def test_keepalive_expiry(sink, monkeypatch):
+    monkeypatch.setattr(Settings, 'keepalive_grace', 0.1)
+
+    async def source():
+        src = await Source.connect()
+        await src.negotiate('abc123;timeout=0')
+        player, = FakePlayer.players
+        # keepalives hold the session
+        for _ in range(3):
+            await asyncio.sleep(0.05)
+            await src.request('GET_PARAMETER')
+        assert list(sink.sessions) == [player.rtp_port]
+        assert await src.closed()
+        assert 'stop' in player.calls
+        assert sink.sessions == {}
+    run(sink, source)
+
+
+def test_rtp_timeout(sink, monkeypatch):
+    monkeypatch.setattr(Settings, 'rtp_timeout', 0.05)
+    monkeypatch.setattr(Settings, 'rtp_teardown', 0.3)
+    monkeypatch.setattr(Settings, 'idr_coalesce', 0.01)
+
+    async def source():
+        src = await Source.connect()
+        await src.negotiate()
+        player, = FakePlayer.players
+        # udpsrc reports the silence from its streaming thread
+        player.on_rtp_timeout()
+        headers, body = await src.respond('SET_PARAMETER')
+        assert body == 'wfd-idr-request\r\n'
+        # RTP comes back: no more reports, the session stays
+        await asyncio.sleep(0.4)
+        assert list(sink.sessions) == [player.rtp_port]
+
+        async def silent():
+            while True:
+                player.on_rtp_timeout()
+                await asyncio.sleep(0.03)
+        reports = asyncio.ensure_future(silent())
+        try:
+            # the IDR request waits for Settings.idr_min_interval
+            # the source is still there, so the sink tears down through RTSP
+            headers, body = await src.respond('TEARDOWN')
+            assert headers['session'] == 'abc123'
+            assert await src.closed()
+        finally:
+            reports.cancel()
+        assert sink.sessions == {}
+    run(sink, source)
+
+
+def test_session_cache():
+    cache = SessionCache(2, None)
+    cache.put('a', 'fmt a', 'v4l2h264dec')
+    cache.put('b', 'fmt b', 'avdec_h264')
+    assert cache.get('a') == ('fmt a', 'v4l2h264dec')
+    # b is now the least recently used one
+    cache.put('c', 'fmt c', 'avdec_h264')
+    assert cache.get('b') is None
+    assert list(cache.entries) == ['a', 'c']
+
+
+def test_keep_warm(monkeypatch):
+    monkeypatch.setattr(Settings, 'warm_time', 0.05)
+
+    async def main():
+        released = []
+        cache = SessionCache(2, released.append)
+        first, second = FakePlayer(1028), FakePlayer(1030)
+        cache.keep_warm('a', first, 1028)
+        assert first.kept and first.calls == ['stop']
+        assert cache.take_warm('a') == (first, 1028)
+        assert cache.take_warm('a') is None
+        cache.keep_warm('a', first, 1028)
+        cache.keep_warm('b', second, 1030)
+        # the oldest one goes first when a port is needed
+        assert cache.drop_warm()
+        assert not first.kept and released == [1028]
+        await asyncio.sleep(0.1)
+        assert not second.kept and released == [1028, 1030]
+        assert not cache.drop_warm()
+        monkeypatch.setattr(Settings, 'warm_time', 0)
+        cache.keep_warm('a', first, 1028)
+        assert cache.warm == {} and released == [1028, 1030, 1028]
+    asyncio.run(main())
+
+
+def test_warm_reuse(sink):
+    async def teardown(src):
+        src.cseq += 1
+        src.send('SET_PARAMETER rtsp://localhost/wfd1.0 RTSP/1.0', src.cseq, body='wfd_trigger_method: TEARDOWN\r\n')
+        assert await src.closed()
+
+    async def source():
+        src = await Source.connect()
+        rtp_port = await src.negotiate()
+        await teardown(src)
+        player, = FakePlayer.players
+        assert player.kept and len(sink.cache.warm) == 1
+        assert sink.cache.get('127.0.0.1')[1] == 'avdec_h264'
+        # the peer comes back to its parked pipeline and port
+        src = await Source.connect()
+        assert await src.negotiate() == rtp_port
+        assert FakePlayer.players == [player] and sink.cache.warm == {}
+        assert await until(lambda: player.calls[-1] == 'run')
+        await teardown(src)
+    run(sink, source)
+
+
+def test_cached_format(sink, monkeypatch):
+    monkeypatch.setattr(Settings, 'warm_time', 0)
+
+    async def source():
+        src = await Source.connect()
+        await src.negotiate()
+        src.close()
+        assert await until(lambda: not sink.sessions)
+        first, = FakePlayer.players
+        assert not first.kept and sink.cache.warm == {}
+        # without a warm pipeline the next session is built for the last format and decoder
+        src = await Source.connect()
+        await src.negotiate()
+        first, second = FakePlayer.players
+        assert second.fmt.codec == 'h264' and second.decoder_name == 'avdec_h264'
+        assert second.calls[0] == 'prepare'
+        src.close()
+    run(sink, source)
+
+
+def test_lease_events(sink):
+    def from_dhcp_thread(event, mac, address):
+        lease = Lease(mac, address)
+        thread = threading.Thread(target=sink.on_lease, args=(event, lease))
+        thread.start()
+        thread.join()
+
+    async def source():
+        from_dhcp_thread('bound', '02:11:22:33:44:55', '192.168.173.80')
+        from_dhcp_thread('bound', '02:11:22:33:44:66', '192.168.173.81')
+        assert await until(lambda: len(sink.leases) == 2)
+        assert sink.leases['192.168.173.80'] == '02:11:22:33:44:55'
+        from_dhcp_thread('released', '02:11:22:33:44:55', '192.168.173.80')
+        # a stale event for an address that has moved on to another client
+        from_dhcp_thread('expired', '02:11:22:33:44:77', '192.168.173.81')
+        assert await until(lambda: '192.168.173.80' not in sink.leases)
+        assert sink.leases == {'192.168.173.81': '02:11:22:33:44:66'}
+        from_dhcp_thread('expired', '02:11:22:33:44:66', '192.168.173.81')
+        assert await until(lambda: sink.leases == {})
+    run(sink, source)
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+
+import pytest
+
+from picast.startup import Startup
+
+
+def test_dependency_order(tmp_path):
+    order = []
+    lock = threading.Lock()
+
+    def step(name, delay=0.0):
+        def run():
+            time.sleep(delay)
+            with lock:
+                order.append(name)
+        return run
+
+    done = []
+    finished = threading.Event()
+    startup = Startup(on_done=lambda startup: (done.append(startup), finished.set()),
+                      report_path=str(tmp_path / 'startup.json'))
+    startup.add('monitor', step('monitor', 0.05))
+    startup.add('interface', step('interface'), after=['monitor'])
+    startup.add('dhcpd', step('dhcpd'), after=['interface'])
+    startup.add('wps', step('wps'), after=['interface'])
+    startup.add('gstreamer', step('gstreamer'))
+    startup.add('server', step('server'), after=['gstreamer', 'interface'])
+    startup.start()
+    assert startup.wait(2)
+    # on_done comes after the report is written
+    assert finished.wait(2)
+    assert done == [startup]
+    assert order[0] == 'gstreamer'
+    assert order.index('monitor') < order.index('interface') < min(order.index('dhcpd'), order.index('wps'),
+                                                                   order.index('server'))
+    assert startup.failed == []
+
+    report = json.loads((tmp_path / 'startup.json').read_text())
+    phases = {r['phase']: r for r in report['phases']}
+    assert set(phases) == {'monitor', 'interface', 'dhcpd', 'wps', 'gstreamer', 'server'}
+    # the report is rounded to 0.1 ms
+    assert phases['interface']['start'] >= phases['monitor']['start'] + phases['monitor']['duration'] - 0.0002
+    assert phases['monitor']['duration'] >= 0.0499
+    assert phases['gstreamer']['thread'] == 'startup-gstreamer'
+    assert all(r['error'] is None for r in report['phases'])
+    assert report['total'] >= phases['monitor']['duration']
+
+
+def test_failure_skips_dependents():
+    ran = []
+
+    def fail():
+        raise RuntimeError('no wpa_supplicant')
+
+    startup = Startup()
+    startup.add('monitor', fail)
+    startup.add('interface', lambda: ran.append('interface'), after=['monitor'])
+    startup.add('dhcpd', lambda: ran.append('dhcpd'), after=['interface'])
+    startup.add('display', lambda: ran.append('display'))
+    startup.start()
+    assert startup.wait(2)
+    assert ran == ['display']
+    assert sorted(p.name for p in startup.failed) == ['dhcpd', 'interface', 'monitor']
+    report = {r['phase']: r for r in startup.report()}
+    assert report['monitor']['error'] == 'no wpa_supplicant'
+    assert report['interface']['error'] == 'skipped, monitor failed'
+    assert report['dhcpd']['error'] == 'skipped, interface failed'
+    assert report['display']['error'] is None
+
+
+def test_measure():
+    startup = Startup()
+    startup.add('gstreamer', lambda: None)
+    with startup.measure('window'):
+        time.sleep(0.01)
+    with pytest.raises(ValueError):
+        with startup.measure('display'):
+            raise ValueError('no display')
+    startup.start()
+    assert startup.wait(2)
+    report = {r['phase']: r for r in startup.report()}
+    assert report['window']['duration'] >= 0.01
+    assert report['window']['thread'] == threading.current_thread().name
+    assert report['display']['error'] == 'no display'
+
+
+def test_unknown_dependency():
+    startup = Startup()
+    with pytest.raises(ValueError):
+        startup.add('dhcpd', lambda: None, after=['interface'])
+
+
+def test_nothing_to_start():
+    done = []
+    startup = Startup(on_done=done.append)
+    startup.start()
+    assert startup.wait(0) and done == [startup]
@@ -0,0 +1,123 @@
+import pytest
+
+from picast.rtsp import RtspError, parse_parameters
+from picast.video import CATALOG, TABLE_CEA, TABLE_HH, TABLE_VESA, SessionFormat, WfdVideoParameters, clamp_level
+
+H265_1080P60 = 'wfd2_video_formats: 00 00 02 01 04 00000100 00000000 00000000 00 0000 0000 00\r\n'
+
+
+def m3_parameters(display_modes=(), levels=None):
+    body = WfdVideoParameters(display_modes, levels).get_video_parameter()
+    return parse_parameters(body.encode())
+
+
+def test_catalog():
+    res = CATALOG.find(1920, 1080, 60)
+    assert (res.table, res.id) == (TABLE_CEA, 8)
+    assert CATALOG.get(TABLE_VESA, 28).height == 1200
+    assert CATALOG.get(TABLE_HH, 0).width == 800
+    assert CATALOG.from_masks(0x101, 0, 0) == [res, CATALOG.get(TABLE_CEA, 0)]
+    assert CATALOG.find(1920, 1080, 60, progressive=False).id == 9
+    # the first table wins for a mode listed twice
+    assert CATALOG.find(1280, 720, 60).table == TABLE_CEA
+
+
+def test_catalog_tables():
+    # no mode is listed twice in a table
+    for table in CATALOG.tables:
+        assert len({(res.width, res.height, res.refresh, res.progressive) for res in table}) == len(table)
+    assert [(res.width, res.height, res.refresh) for res in CATALOG.tables[TABLE_CEA][24:]] == [
+        (4096, 2160, 50), (3840, 2160, 24), (4096, 2160, 24)]
+
+
+def test_catalog_select():
+    modes = CATALOG.select('h264', '3.2', [(1280, 720, 60)])
+    assert modes == sorted(modes, reverse=True)
+    assert all(res.width <= 1280 and res.height <= 720 and res.refresh <= 61 for res in modes)
+    assert CATALOG.best_fit('h264', '3.2', [(1280, 720, 60)]) == CATALOG.get(TABLE_CEA, 6)
+    assert CATALOG.best_fit('h264', '4.2') == CATALOG.find(1920, 1080, 60)
+
+
+def test_clamp_level():
+    assert clamp_level('h264', '5.1') == '5.1'
+    assert clamp_level('h264', '6') == '5.2'
+    assert clamp_level('h265', '4.2') == '4.1'
+    assert clamp_level('h264', '3') == '3.1'
+
+
+def test_video_parameters_round_trip():
+    fmt = SessionFormat.from_parameters(m3_parameters([(1920, 1080, 60)], {'h264': '4.2'}))
+    assert fmt.codec == 'h264'
+    assert fmt.res == CATALOG.find(1920, 1080, 60)
+    assert fmt.level == '4.2'
+    assert fmt.audio == ('AAC', 48000, 2)
+    assert fmt.presentation_url is None
+
+
+def test_video_parameters_limits():
+    params = m3_parameters([(1280, 720, 60)], {'h264': '3.2'})
+    native, preferred, profile, level, cea, vesa, hh = params['wfd_video_formats'].split()[:7]
+    assert int(native, 16) == 6 << 3 | TABLE_CEA
+    assert int(level, 16) == 0x02
+    assert int(cea, 16) & 0x01
+    assert all(res.width <= 1280 and res.height <= 720 for res in CATALOG.from_masks(
+        int(cea, 16), int(vesa, 16), int(hh, 16)))
+    assert 'wfd2_video_formats' not in params
+
+
+def test_video_parameters_decoder_limit():
+    # a 1080p display with a level 4 decoder gets no 1080p60
+    native, level, cea, vesa, hh = WfdVideoParameters([(1920, 1080, 60)], {'h264': '4'}).capabilities('h264')
+    assert not cea & 1 << 8
+    assert cea & 1 << 16
+    assert native & 0x07 != TABLE_HH
+
+
+def test_video_parameters_h265():
+    params = m3_parameters((), {'h264': '4.2', 'h265': '5.1'})
+    assert params['wfd2_video_formats'].split()[2] == '02'
+    assert SessionFormat.from_parameters(m3_parameters()).codec == 'h264'
+    fmt = SessionFormat.from_parameters(params)
+    assert fmt.codec == 'h265'
+    assert fmt.profile == 'main'
+    assert fmt.res.width == 4096
+
+
+def test_video_parameters_cached():
+    first = WfdVideoParameters([(1920, 1080, 60)]).get_video_parameter()
+    assert WfdVideoParameters([(1920, 1080, 60)]).get_video_parameter() is first
+    assert WfdVideoParameters([(1280, 720, 60)]).get_video_parameter() is not first
+
+
+def test_session_format_m4():
+    body = H265_1080P60 + 'wfd_audio_codecs: LPCM 00000002 00\r\n' \
+                          'wfd_presentation_URL: rtsp://192.168.173.80/wfd1.0/streamid=0 none\r\n'
+    fmt = SessionFormat.from_parameters(parse_parameters(body.encode()))
+    assert fmt.codec == 'h265'
+    assert fmt.res == CATALOG.find(1920, 1080, 60)
+    assert fmt.level == '4.1'
+    assert fmt.audio == ('LPCM', 48000, 2)
+    assert fmt.presentation_url == 'rtsp://192.168.173.80/wfd1.0/streamid=0'
+    assert fmt.caps().startswith('video/x-h265')
+
+
+def test_session_format_update():
+    previous = SessionFormat.from_parameters(parse_parameters(
+        (H265_1080P60 + 'wfd_audio_codecs: AAC 00000001 00\r\n').encode()))
+    fmt = SessionFormat.from_parameters({'wfd_video_formats': '00 00 01 01 00000001 00000000 00000000 00 0000 0000 '
+                                                              '00 none none'}, previous)
+    assert fmt.codec == 'h264'
+    assert fmt.res == CATALOG.get(TABLE_CEA, 0)
+    assert fmt.audio == previous.audio
+    assert fmt != previous
+    assert SessionFormat.from_parameters({}, previous) == previous
+
+
+@pytest.mark.parametrize('parameters', [
+    {'wfd_video_formats': '00 00 02 zz 00000001 00000000 00000000'},
+    {'wfd2_video_formats': '00 00 02 01 04 00000100 00000000 0000000g'},
+    {'wfd_audio_codecs': 'AAC 0000000x 00'},
+])
+def test_session_format_malformed(parameters):
+    with pytest.raises(RtspError):
+        SessionFormat.from_parameters(parameters)
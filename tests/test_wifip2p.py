@@ -0,0 +1,52 @@
+from picast.settings import Settings
+from picast.wifip2p import WifiP2PServer
+from picast.wpactrl import WpaEvent
+
+
+class FakeDhcpd:
+
+    def __init__(self):
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings, 'p2p_state', str(tmp_path / 'p2p.json'))
+    p2p = WifiP2PServer()
+    calls = []
+
+    def start_dhcpd():
+        calls.append('dhcpd')
+        p2p.dhcpd = FakeDhcpd()
+
+    def configure_group(event):
+        p2p.wlandev = event.args[0]
+
+    monkeypatch.setattr(p2p, 'start_dhcpd', start_dhcpd)
+    monkeypatch.setattr(p2p, 'start_wps', lambda: calls.append('wps'))
+    monkeypatch.setattr(p2p, 'configure_group', configure_group)
+    return p2p, calls
+
+
+def test_group_removed_stops_dhcpd(tmp_path, monkeypatch):
+    p2p, calls = server(tmp_path, monkeypatch)
+    p2p.wlandev = 'p2p-wlan0-0'
+    dhcpd = p2p.dhcpd = FakeDhcpd()
+    p2p.on_group_removed(WpaEvent('<3>P2P-GROUP-REMOVED p2p-wlan0-1 GO reason=REQUESTED'))
+    assert p2p.wlandev == 'p2p-wlan0-0' and not dhcpd.stopped
+    p2p.on_group_removed(WpaEvent('<3>P2P-GROUP-REMOVED p2p-wlan0-0 GO reason=IDLE'))
+    assert p2p.wlandev is None and p2p.dhcpd is None and dhcpd.stopped
+
+
+def test_reinvoked_group(tmp_path, monkeypatch):
+    p2p, calls = server(tmp_path, monkeypatch)
+    started = WpaEvent('<3>P2P-GROUP-STARTED p2p-wlan0-1 GO ssid="DIRECT-xy" freq=2437 [PERSISTENT]')
+    # not ours
+    p2p.on_group_started(started)
+    assert calls == []
+    p2p.reinvoking = True
+    p2p.on_group_started(started)
+    assert not p2p.reinvoking and p2p.wlandev == 'p2p-wlan0-1'
+    assert calls == ['dhcpd', 'wps']
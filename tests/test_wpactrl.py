@@ -0,0 +1,229 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+import pytest
+
+from picast.exceptions import PiCastException
+from picast.settings import Settings
+from picast.wpacli import WpaCli
+from picast.wpactrl import WpaCtrl, WpaCtrlError, WpaEvent, WpaMonitor, list_interfaces
+
+
+class FakeSupplicant:
+    """Control socket of one interface that answers like wpa_supplicant."""
+
+    def __init__(self, ctrl_dir, interface='wlan0', replies=None, delays=None):
+        self.path = os.path.join(ctrl_dir, interface)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.replies = replies or {}
+        self.delays = delays or {}  # seconds before the reply, by command
+        self.commands = []
+        self.attached = []
+        self.before_reply = []  # events sent to attached clients ahead of the next reply
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            if addr is None:
+                return  # shut down
+            cmd = data.decode()
+            self.commands.append(cmd)
+            reply = self.replies.get(cmd.split(' ')[0], 'OK\n')
+            if cmd == 'ATTACH' and reply == 'OK\n':
+                self.attached.append(addr)
+            if reply is None:
+                continue
+            for text in self.before_reply:
+                self.sock.sendto(text.encode(), addr)
+            self.before_reply = []
+            delay = self.delays.get(cmd.split(' ')[0])
+            if delay is not None:
+                threading.Timer(delay, self.reply, (reply, addr)).start()
+            else:
+                self.reply(reply, addr)
+
+    def reply(self, reply, addr):
+        try:
+            self.sock.sendto(reply.encode(), addr)
+        except OSError:
+            pass  # the client is gone
+
+    def event(self, text):
+        for addr in self.attached:
+            self.sock.sendto(text.encode(), addr)
+
+    def close(self):
+        try:
+            # wakes the reader thread, so the socket really goes away
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.thread.join()
+
+
+@pytest.fixture
+def ctrl_dir():
+    # unix socket paths are short, pytest's tmp_path may be too long
+    path = tempfile.mkdtemp(prefix='wpa')
+    yield path
+    shutil.rmtree(path)
+
+
+@pytest.fixture
+def supplicant(ctrl_dir):
+    fake = FakeSupplicant(ctrl_dir, replies={'PING': 'PONG\n', 'STATUS': 'wpa_state=COMPLETED\n', 'HANG': None,
+                                             'SLOW': 'FAIL\n'}, delays={'SLOW': 0.2})
+    yield fake
+    fake.close()
+
+
+def test_request(supplicant, ctrl_dir):
+    with WpaCtrl('wlan0', ctrl_dir) as ctrl:
+        assert ctrl.request('PING') == 'PONG\n'
+    assert supplicant.commands == ['PING']
+
+
+def test_requests_keep_order(supplicant, ctrl_dir):
+    with WpaCtrl('wlan0', ctrl_dir) as ctrl:
+        assert ctrl.requests(['PING', 'STATUS', 'PING']) == ['PONG\n', 'wpa_state=COMPLETED\n', 'PONG\n']
+
+
+def test_request_skips_events(supplicant, ctrl_dir):
+    supplicant.before_reply = ['<3>CTRL-EVENT-SCAN-STARTED ']
+    with WpaCtrl('wlan0', ctrl_dir) as ctrl:
+        assert ctrl.request('STATUS') == 'wpa_state=COMPLETED\n'
+
+
+def test_request_timeout(supplicant, ctrl_dir):
+    with WpaCtrl('wlan0', ctrl_dir, timeout=0.1) as ctrl:
+        with pytest.raises(WpaCtrlError):
+            ctrl.request('HANG')
+
+
+def test_late_reply_after_timeout(supplicant, ctrl_dir):
+    with WpaCtrl('wlan0', ctrl_dir, timeout=0.1) as ctrl:
+        with pytest.raises(WpaCtrlError):
+            ctrl.requests(['PING', 'SLOW', 'STATUS'])
+        time.sleep(0.2)
+        # the late replies of the batch do not answer the next command
+        assert ctrl.request('PING') == 'PONG\n'
+        assert ctrl.request('STATUS') == 'wpa_state=COMPLETED\n'
+
+
+def test_no_socket(ctrl_dir):
+    with pytest.raises(WpaCtrlError):
+        WpaCtrl('wlan1', ctrl_dir)
+
+
+def test_close_removes_local_socket(supplicant, ctrl_dir):
+    ctrl = WpaCtrl('wlan0', ctrl_dir)
+    ctrl.close()
+    assert not os.path.exists(ctrl.local_path)
+
+
+def test_list_interfaces(ctrl_dir):
+    for name in ('p2p-wlan0-0', 'wlan0', 'p2p-dev-wlan0'):
+        open(os.path.join(ctrl_dir, name), 'w').close()
+    assert list_interfaces(ctrl_dir) == ['wlan0', 'p2p-dev-wlan0', 'p2p-wlan0-0']
+    assert list_interfaces(os.path.join(ctrl_dir, 'missing')) == []
+
+
+def test_event():
+    event = WpaEvent('<3>P2P-GROUP-STARTED p2p-wlan0-0 GO ssid="DIRECT-xy picast" freq=2437')
+    assert event.level == 3
+    assert event.name == 'P2P-GROUP-STARTED'
+    assert event.args == ['p2p-wlan0-0', 'GO']
+    assert event.params == {'ssid': 'DIRECT-xy picast', 'freq': '2437'}
+
+
+def test_event_unbalanced_quote():
+    event = WpaEvent('<2>AP-STA-CONNECTED 02:00:00:00:00:01 p2p_dev_addr=02:00:00:00:00:02 name="x')
+    assert event.name == 'AP-STA-CONNECTED'
+    assert event.params['p2p_dev_addr'] == '02:00:00:00:00:02'
+
+
+def test_monitor(supplicant, ctrl_dir):
+    monitor = WpaMonitor('wlan0', ctrl_dir)
+    received = []
+    done = threading.Event()
+
+    def failing(event):
+        raise RuntimeError(event.name)
+
+    def handler(event):
+        received.append(event)
+        done.set()
+
+    monitor.on('AP-STA-CONNECTED', failing)
+    monitor.on('AP-STA-CONNECTED', handler)
+    monitor.start()
+    try:
+        assert supplicant.commands == ['ATTACH']
+        waiter = monitor.expect('AP-STA-CONNECTED', 'AP-STA-DISCONNECTED')
+        supplicant.event('<3>AP-STA-CONNECTED 02:00:00:00:00:01')
+        event = waiter.wait(2)
+        assert event is not None and event.args == ['02:00:00:00:00:01']
+        assert done.wait(2)
+        assert received[0].name == 'AP-STA-CONNECTED'
+        assert monitor.waiters == []
+    finally:
+        monitor.stop()
+    monitor.thread.join(2)
+    assert not monitor.thread.is_alive()
+
+
+def test_monitor_wait_timeout(supplicant, ctrl_dir):
+    monitor = WpaMonitor('wlan0', ctrl_dir)
+    monitor.start()
+    try:
+        assert monitor.wait_for(('P2P-GROUP-STARTED',), 0.05) is None
+        assert monitor.waiters == []
+    finally:
+        monitor.stop()
+
+
+def test_monitor_attach_refused(ctrl_dir):
+    fake = FakeSupplicant(ctrl_dir, replies={'ATTACH': 'FAIL\n'})
+    monitor = WpaMonitor('wlan0', ctrl_dir)
+    try:
+        with pytest.raises(WpaCtrlError):
+            monitor.start()
+    finally:
+        monitor.stop()
+        fake.close()
+
+
+def test_wpa_cli_reconnects(supplicant, ctrl_dir, monkeypatch):
+    monkeypatch.setattr(Settings, 'wpa_ctrl_dir', ctrl_dir)
+    monkeypatch.setattr(Settings, 'wpa_interface', 'wlan0')
+    monkeypatch.setattr(WpaCli, 'connections', {})
+    cli = WpaCli()
+    assert cli.cmd('ping') == ['PONG']
+    conn = WpaCli.connections['wlan0']
+    # wpa_supplicant restarts, the cached connection is stale
+    supplicant.close()
+    os.unlink(supplicant.path)
+    restarted = FakeSupplicant(ctrl_dir, replies={'PING': 'PONG\n'})
+    try:
+        assert cli.cmd('ping') == ['PONG']
+        assert WpaCli.connections['wlan0'] is not conn
+        assert not os.path.exists(conn.local_path)
+        restarted.close()
+        os.unlink(restarted.path)
+        # reconnecting is tried once
+        with pytest.raises(PiCastException):
+            cli.cmd('ping')
+        assert WpaCli.connections == {}
+    finally:
+        restarted.close()